@@ -39,19 +39,25 @@ Instructions:
 
 import os
 import logging
-import hashlib
 from concurrent.futures import ThreadPoolExecutor
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import SentenceTransformerEmbeddings
+import common_path  # puts the shared modules in common/ on sys.path
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from file_manifest import FileManifest
+from ingest_queue import CoalescingWorkQueue
+from hybrid_retrieval import BM25Index, HybridRetriever
+from reranker import CrossEncoderScorer, RerankingRetriever
+from context_assembly import ContextAssemblingRetriever
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import RetrievalQA
 from langchain_community.chat_models import ChatOpenAI
-from PyPDF2 import PdfReader
+from streaming_answer import stream_answer
+from pdf_extract import extract_pdf_pages, join_pages, chunk_metadatas
 from docx import Document
 from pptx import Presentation
 import pandas as pd
 import chardet
-import pdfplumber
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from threading import Thread
@@ -68,17 +74,31 @@ def log_message(message):
     print(f"[INFO] {message}")
     logging.info(message)
 
-# **Initialize Embedding Model**
-embedding_model = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-
-# **Initialize ChromaDB**
-vectorstore = Chroma(persist_directory="enhanced_vectorstore_db", embedding_function=embedding_model)
+# **Embedding Model, ChromaDB and BM25 Index**
+# Opened by init_stores() (see pdf_extract.PARALLEL_MIN_PAGES)
+embedding_model = None
+vectorstore = None
+# Lexical side of hybrid retrieval, kept in step with ChromaDB
+bm25_index = None
+
+def init_stores():
+    global embedding_model, vectorstore, bm25_index
+    if vectorstore is not None:
+        return
+    embedding_model = CachedEmbeddings(
+        SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2"),
+        EmbeddingCache("embedding_cache.sqlite"),
+        "all-MiniLM-L6-v2",
+    )
+    vectorstore = Chroma(persist_directory="enhanced_vectorstore_db", embedding_function=embedding_model)
+    bm25_index = BM25Index("enhanced_vectorstore_db/bm25_index.sqlite")
 
 # **Utility Functions**
 def extract_text(file_path):
-    """Extract text from various file types."""
+    """Extract text from various file types, plus PDF page start offsets (None for other types)."""
     try:
         text = ""
+        page_starts = None
         if file_path.endswith(".txt"):
             with open(file_path, "rb") as f:
                 raw_data = f.read()
@@ -87,14 +107,7 @@ def extract_text(file_path):
             with open(file_path, "r", encoding=encoding, errors="ignore") as f:
                 text = f.read()
         elif file_path.endswith(".pdf"):
-            try:
-                reader = PdfReader(file_path)
-                for page in reader.pages:
-                    text += page.extract_text() or ""
-            except Exception:
-                with pdfplumber.open(file_path) as pdf:
-                    for page in pdf.pages:
-                        text += page.extract_text() or ""
+            text, page_starts = join_pages(extract_pdf_pages(file_path))
         elif file_path.endswith(".docx"):
             doc = Document(file_path)
             for paragraph in doc.paragraphs:
@@ -114,28 +127,27 @@ def extract_text(file_path):
                             text += paragraph.text + "\n"
         else:
             raise ValueError(f"Unsupported file type: {file_path}")
-        return text
+        return text, page_starts
     except Exception as e:
         log_message(f"Error extracting text from {file_path}: {e}")
-        return ""
-
-def get_file_hash(file_path):
-    """Generate a hash for the file content."""
-    with open(file_path, "rb") as f:
-        file_data = f.read()
-    return hashlib.md5(file_data).hexdigest()
+        return "", None
 
-def process_file(file_path, vectorstore, processed_files):
+def process_file(file_path, vectorstore, file_manifest):
     """Process the file: extract text, chunk it, and store in ChromaDB."""
     try:
-        file_hash = get_file_hash(file_path)
-        if processed_files.get(file_path) == file_hash:
+        # Stat fast path first; the file is only hashed if its stat changed
+        file_state = file_manifest.check(file_path)
+        if file_state is None:
             log_message(f"No changes detected for {file_path}. Skipping.")
             return
 
-        text = extract_text(file_path)
+        text, page_starts = extract_text(file_path)
         if not text.strip():
             log_message(f"No text extracted from {file_path}. Skipping.")
+            # Drop chunks of an earlier version and record the file so restarts do not re-read it
+            vectorstore._collection.delete(where={"source": file_path})
+            bm25_index.remove_source(file_path)
+            file_manifest.record(file_path, file_state)
             return
 
         splitter = RecursiveCharacterTextSplitter(
@@ -156,45 +168,66 @@ def process_file(file_path, vectorstore, processed_files):
             ids.append(chunk_id)
             new_chunks.append(chunk)
 
-        vectorstore.add_texts(new_chunks, metadatas=[{"source": file_path}] * len(new_chunks), ids=ids)
+        metadatas = chunk_metadatas(file_path, text, new_chunks, page_starts)
+        # IDs are positional, so a file that shrank would keep its old high-index chunks
+        vectorstore._collection.delete(where={"source": file_path})
+        vectorstore.add_texts(new_chunks, metadatas=metadatas, ids=ids)
+        bm25_index.remove_source(file_path)
+        bm25_index.add(ids, new_chunks, metadatas)
         log_message(f"New chunks added to vectorstore for {file_path}.")
         vectorstore.persist()
         log_message("Persisted vectorstore.")
-        processed_files[file_path] = file_hash
+        file_manifest.record(file_path, file_state)
     except Exception as e:
         log_message(f"Error processing file {file_path}: {e}")
 
 # **Folder Monitoring**
+# Ingestion worker threads and the number of distinct files allowed to wait
+INGEST_WORKERS = 2
+INGEST_MAX_PENDING = 1000
+# A file is processed once it has had no events and no size/mtime change for this long
+INGEST_SETTLE_SECONDS = 2.0
+
 class FolderMonitorHandler(FileSystemEventHandler):
-    def __init__(self, vectorstore, processed_files):
-        self.vectorstore = vectorstore
-        self.processed_files = processed_files
+    def __init__(self, work_queue):
+        self.work_queue = work_queue
 
     def on_created(self, event):
         if not event.is_directory:
             log_message(f"New file detected: {event.src_path}")
-            process_file(event.src_path, self.vectorstore, self.processed_files)
+            self.work_queue.submit(event.src_path)
 
     def on_modified(self, event):
         if not event.is_directory:
             log_message(f"File modified: {event.src_path}")
-            process_file(event.src_path, self.vectorstore, self.processed_files)
-
-def process_existing_files(folder_path, vectorstore, processed_files):
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(file_path):
-            process_file(file_path, vectorstore, processed_files)
-
-def start_folder_monitoring(folder_path, vectorstore, processed_files):
+            self.work_queue.submit(event.src_path)
+
+def process_existing_files(folder_path, vectorstore, file_manifest, work_queue):
+    candidates, removed = file_manifest.reconcile(folder_path)
+    log_message(f"Startup scan: {len(candidates)} new or changed files, {len(removed)} removed.")
+    for file_path in removed:
+        vectorstore._collection.delete(where={"source": file_path})
+        bm25_index.remove_source(file_path)
+        file_manifest.remove(file_path)
+    for file_path in candidates:
+        work_queue.submit(file_path)
+
+def start_folder_monitoring(folder_path, vectorstore, file_manifest):
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
         log_message(f"Created folder: {folder_path}")
 
+    work_queue = CoalescingWorkQueue(
+        lambda file_path: process_file(file_path, vectorstore, file_manifest),
+        workers=INGEST_WORKERS,
+        settle_seconds=INGEST_SETTLE_SECONDS,
+        max_pending=INGEST_MAX_PENDING,
+    ).start()
+
     log_message("Processing existing files in the folder...")
-    process_existing_files(folder_path, vectorstore, processed_files)
+    process_existing_files(folder_path, vectorstore, file_manifest, work_queue)
 
-    event_handler = FolderMonitorHandler(vectorstore, processed_files)
+    event_handler = FolderMonitorHandler(work_queue)
     observer = Observer()
     observer.schedule(event_handler, folder_path, recursive=True)
 
@@ -205,11 +238,36 @@ def start_folder_monitoring(folder_path, vectorstore, processed_files):
     except KeyboardInterrupt:
         log_message("Stopping folder monitoring...")
         observer.stop()
+        work_queue.stop(wait=False)
 
 # **Agents**
+# Candidates taken from each retriever before rank fusion; the LLM still sees the top 5
+HYBRID_FETCH_K = 20
+
+# Optional cross-encoder stage: fused candidates are rescored and only the best few reach the LLM.
+# Off by default (it downloads and runs a second model); enable with RERANK=1
+RERANK = os.getenv("RERANK", "0") == "1"
+RERANK_FETCH_K = 20
+RERANK_TOP_N = 4
+reranker = CrossEncoderScorer()
+
+# Overlapping chunks of a file are merged, near-duplicates dropped and the rest chosen by MMR within the budget
+ASSEMBLE_CONTEXT = True
+CONTEXT_TOKEN_BUDGET = 1800
+
 def create_qa_agent(vectorstore):
-    retriever = vectorstore.as_retriever()
-    retriever.search_kwargs = {"k": 5}
+    dense_retriever = vectorstore.as_retriever()
+    dense_retriever.search_kwargs = {"k": HYBRID_FETCH_K}
+    retriever = HybridRetriever(
+        vector_retriever=dense_retriever, bm25_index=bm25_index,
+        k=RERANK_FETCH_K if RERANK else 5, fetch_k=HYBRID_FETCH_K
+    )
+    if RERANK:
+        retriever = RerankingRetriever(base_retriever=retriever, scorer=reranker, top_n=RERANK_TOP_N)
+    if ASSEMBLE_CONTEXT:
+        retriever = ContextAssemblingRetriever(
+            base_retriever=retriever, embeddings=embedding_model, token_budget=CONTEXT_TOKEN_BUDGET
+        )
     llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
     qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, return_source_documents=True)
     return qa_chain
@@ -236,6 +294,9 @@ def personalization_agent(answer, preference="detailed"):
         return answer.split("\n")[0]  # Return only the first line of the answer
     return answer
 
+# Print answers token by token instead of waiting for the full completion
+STREAM_ANSWERS = True
+
 def qa_loop(qa_agent):
     while True:
         print("\nYou can now ask questions (type 'exit' to quit):")
@@ -252,12 +313,22 @@ def qa_loop(qa_agent):
                     print("Hello! I'm here to assist you with your queries.")
                     continue
 
-                result = qa_agent({"query": question})
+                if STREAM_ANSWERS:
+                    # Retrieval runs first, so the fallback still applies before any LLM call
+                    result = stream_answer(qa_agent, question, header="\nAnswer:", require_sources=True)
+                else:
+                    result = qa_agent({"query": question})
 
                 if not result.get("source_documents"):
                     print("\n" + fallback_agent(question))
                     continue
 
+                if STREAM_ANSWERS:
+                    print("\nSources:")
+                    for doc in result["source_documents"]:
+                        print(f"- {doc.metadata['source']}")
+                    continue
+
                 reviewed_answer = review_agent(result["result"], result.get("source_documents", []))
                 personalized_answer = personalization_agent(reviewed_answer, preference="detailed")
                 print("\n" + personalized_answer)
@@ -269,9 +340,12 @@ def qa_loop(qa_agent):
 # **Main Script**
 if __name__ == "__main__":
     folder_to_monitor = "C:/Users/srira/Desktop/GenAi2/QA_Agents/qa_files"
-    processed_files = {}
+    file_manifest = FileManifest("enhanced_vectorstore_db/file_manifest.sqlite")
+    init_stores()
+    if not len(bm25_index):
+        log_message(f"Built BM25 index from {bm25_index.backfill(vectorstore._collection)} stored chunks.")
 
-    monitoring_thread = Thread(target=start_folder_monitoring, args=(folder_to_monitor, vectorstore, processed_files))
+    monitoring_thread = Thread(target=start_folder_monitoring, args=(folder_to_monitor, vectorstore, file_manifest))
     monitoring_thread.daemon = True
     monitoring_thread.start()
 
@@ -1,15 +1,24 @@
 import os
 import logging
-import hashlib
-import time
 from threading import Thread, Event
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import SentenceTransformerEmbeddings
+import common_path  # puts the shared modules in common/ on sys.path
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from file_manifest import FileManifest
+from chunk_manifest import ChunkManifest
+from ingest_queue import CoalescingWorkQueue
+from hybrid_retrieval import BM25Index, HybridRetriever
+from reranker import CrossEncoderScorer
+from retrieval_pipeline import HYBRID_FETCH_K, add_stages, fused_k
+from answer_cache import SemanticAnswerCache
+from streaming_answer import stream_answer
 from langchain.chains import RetrievalQA
 from langchain_community.chat_models import ChatOpenAI
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pdf_extract import page_number_at
 
 # Logging Configuration
 logging.basicConfig(
@@ -23,11 +32,47 @@ def log_message(message):
     print(f"{message}")
     logging.info(message)
 
-# Embedding Model Initialization
-embedding_model = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-
-# Vectorstore Initialization
-vectorstore = Chroma(persist_directory="vectorstore_db", embedding_function=embedding_model)
+# Models and stores are opened by init_stores() (see pdf_extract.PARALLEL_MIN_PAGES)
+embedding_model = None
+vectorstore = None
+# Chunk IDs stored per file, used to re-index only what changed
+chunk_manifest = None
+# Lexical index for hybrid retrieval, updated from the same chunk diff as the vectorstore
+bm25_index = None
+reranker = None
+answer_cache = None
+
+# Small chunks are indexed; retrieved ones are widened by neighbor expansion
+# (retrieval settings live in retrieval_pipeline, shared with batch_qa)
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+# Answers reused for near-duplicate questions; entries citing a changed file are dropped
+ANSWER_CACHE_THRESHOLD = 0.92
+ANSWER_CACHE_TTL_SECONDS = 24 * 3600
+ANSWER_CACHE_MAX_ENTRIES = 1000
+
+def init_stores(persist_directory="vectorstore_db"):
+    """Load the embedding model and open the vectorstore and its side indexes (once)."""
+    global embedding_model, vectorstore, chunk_manifest, bm25_index, reranker, answer_cache
+    if vectorstore is not None:
+        return
+    embedding_model = CachedEmbeddings(
+        SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2"),
+        EmbeddingCache("embedding_cache.sqlite"),
+        "all-MiniLM-L6-v2",
+    )
+    vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embedding_model)
+    chunk_manifest = ChunkManifest(os.path.join(persist_directory, "chunk_manifest.sqlite"))
+    bm25_index = BM25Index(os.path.join(persist_directory, "bm25_index.sqlite"))
+    reranker = CrossEncoderScorer()
+    answer_cache = SemanticAnswerCache(
+        embedding_model.embed_query,
+        os.path.join(persist_directory, "answer_cache.sqlite"),
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    )
 
 # Utility Functions
 def extract_data(file_path):
@@ -45,10 +90,8 @@ def extract_data(file_path):
             with open(file_path, "r", encoding="utf-8") as file:
                 return file.read()
         elif file_path.endswith(".pdf"):
-            from PyPDF2 import PdfReader
-            reader = PdfReader(file_path)
-            text = " ".join(page.extract_text() for page in reader.pages)
-            return text
+            from pdf_extract import extract_pdf_pages
+            return " ".join(extract_pdf_pages(file_path))
         elif file_path.endswith(".docx"):
             from docx import Document
             doc = Document(file_path)
@@ -68,118 +111,194 @@ def extract_data(file_path):
         log_message(f"Error extracting data from {file_path}: {e}")
         return ""
 
-def process_file(file_path, vectorstore, processed_files):
+def extract_text_with_pages(file_path):
+    """Extracted text plus the offset at which each PDF page starts (None for other types)."""
+    if file_path.endswith(".pdf"):
+        try:
+            from pdf_extract import extract_pdf_pages, join_pages
+            return join_pages(extract_pdf_pages(file_path), " ")
+        except Exception as e:
+            log_message(f"Error extracting data from {file_path}: {e}")
+            return "", None
+    return extract_data(file_path), None
+
+def chunk_text(file_path, text, page_starts=None):
+    """Chunks plus their metadata: ordinal, character offset and, for PDFs, page range."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, separators=["\n\n", "\n", ".", " "],
+        add_start_index=True,
+    )
+    chunks, metadatas = [], []
+    for ordinal, doc in enumerate(splitter.create_documents([text])):
+        start = doc.metadata["start_index"]
+        metadata = {"source": file_path, "chunk_index": ordinal, "start_index": start}
+        if page_starts:
+            metadata["page"] = page_number_at(page_starts, start)
+            metadata["page_end"] = page_number_at(page_starts, start + len(doc.page_content) - 1)
+        chunks.append(doc.page_content)
+        metadatas.append(metadata)
+    return chunks, metadatas
+
+def refresh_chunk_metadata(vectorstore, ids, chunks, metadatas, added):
+    """
+    Unchanged chunks keep their IDs but may have moved in the file; update
+    the ordinal and offset metadata of those whose position changed.
+    """
+    added = set(added)
+    kept = [i for i in range(len(ids)) if i not in added]
+    stale = []
+    for start in range(0, len(kept), 500):
+        batch = kept[start:start + 500]
+        stored = vectorstore._collection.get(ids=[ids[i] for i in batch], include=["metadatas"])
+        current = dict(zip(stored["ids"], stored["metadatas"]))
+        stale.extend(i for i in batch if current.get(ids[i]) != metadatas[i])
+    if stale:
+        stale_ids = [ids[i] for i in stale]
+        stale_metadatas = [metadatas[i] for i in stale]
+        vectorstore._collection.update(ids=stale_ids, metadatas=stale_metadatas)
+        bm25_index.add(stale_ids, [chunks[i] for i in stale], stale_metadatas)
+    return len(stale)
+
+def process_file(file_path, vectorstore, file_manifest):
     """Processes a file by extracting text, chunking it, and storing embeddings."""
     try:
-        # Debounce file events
-        current_time = time.time()
-        if file_path in file_event_tracker and current_time - file_event_tracker[file_path] < 2:
-            return
-        file_event_tracker[file_path] = current_time
-
         if not os.path.exists(file_path):
             log_message(f"File {file_path} does not exist. Skipping processing.")
             return
 
-        file_hash = get_file_hash(file_path)
-        if processed_files.get(file_path) == file_hash:
+        # Stat fast path first; the file is only hashed if its stat changed
+        file_state = file_manifest.check(file_path)
+        if file_state is None:
             log_message(f"No changes detected for {file_path}. Skipping.")
             return
 
-        text = extract_data(file_path)
+        text, page_starts = extract_text_with_pages(file_path)
         if not text.strip():
-            log_message(f"No valid content in {file_path}. Skipping.")
-            return
-
-        # Chunk text
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000, chunk_overlap=100, separators=["\n\n", "\n", ".", " "]
-        )
-        chunks = splitter.split_text(text)
-
-        # Add to vectorstore
-        ids = [f"{file_path}_{i}" for i in range(len(chunks))]
-        vectorstore.add_texts(chunks, metadatas=[{"source": file_path}] * len(chunks), ids=ids)
+            # An emptied (or scanned) file still goes through the diff, which drops all its old
+            # chunks, and is recorded so it is not re-extracted on every start
+            log_message(f"No valid content in {file_path}; removing any stored chunks.")
+            text, page_starts = "", None
+
+        # Chunk text, keeping each chunk's position for neighbor expansion
+        chunks, chunk_metadatas = chunk_text(file_path, text, page_starts)
+
+        # Diff against the stored chunks: embed only new ones, drop vanished ones
+        if file_path not in chunk_manifest:
+            # Clear entries written before the manifest existed
+            vectorstore._collection.delete(where={"source": file_path})
+            bm25_index.remove_source(file_path)
+        ids, added, removed = chunk_manifest.diff(file_path, chunks)
+        if removed:
+            vectorstore.delete(ids=removed)
+            bm25_index.remove(removed)
+        if added:
+            added_chunks = [chunks[i] for i in added]
+            added_ids = [ids[i] for i in added]
+            metadatas = [chunk_metadatas[i] for i in added]
+            vectorstore.add_texts(added_chunks, metadatas=metadatas, ids=added_ids)
+            bm25_index.add(added_ids, added_chunks, metadatas)
+        moved = refresh_chunk_metadata(vectorstore, ids, chunks, chunk_metadatas, added) if added or removed else 0
+        chunk_manifest.set(file_path, ids)
         vectorstore.persist()
+        if added or removed:
+            answer_cache.invalidate_source(file_path)
 
-        log_message(f"Processed and stored content from {file_path}.")
-        processed_files[file_path] = file_hash
+        log_message(f"Processed {file_path}: {len(added)} new, {len(removed)} removed, "
+                    f"{len(ids) - len(added)} unchanged chunks ({moved} moved).")
+        file_manifest.record(file_path, file_state)
     except Exception as e:
         log_message(f"Error processing {file_path}: {e}")
 
-def get_file_hash(file_path):
-    """Generates a hash for a file."""
-    with open(file_path, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
-
 def remove_file_from_vectorstore(file_path, vectorstore):
     """Removes all entries related to a file from the vectorstore."""
     try:
-        # Fetch all IDs associated with the file
-        ids_to_delete = vectorstore.collection.get(
-            where={"source": {"$eq": file_path}},
-            include=["ids"]
-        )["ids"]
-        # Flatten the list of IDs
-        ids_to_delete = [item for sublist in ids_to_delete for item in sublist]
+        ids_to_delete = chunk_manifest.remove(file_path)
         if ids_to_delete:
             vectorstore.delete(ids=ids_to_delete)
-            vectorstore.persist()
-            log_message(f"Removed data associated with {file_path} from the vectorstore.")
+            bm25_index.remove(ids_to_delete)
+        else:
+            vectorstore._collection.delete(where={"source": file_path})
+            bm25_index.remove_source(file_path)
+        vectorstore.persist()
+        answer_cache.invalidate_source(file_path)
+        log_message(f"Removed data associated with {file_path} from the vectorstore.")
     except Exception as e:
         log_message(f"Error removing {file_path} from vectorstore: {e}")
 
+def remove_file(file_path, vectorstore, file_manifest):
+    """Forgets a deleted file: its chunks and its manifest entry."""
+    remove_file_from_vectorstore(file_path, vectorstore)
+    file_manifest.remove(file_path)
+
 # Folder Monitoring
-file_event_tracker = {}
+# Ingestion worker threads and the number of distinct files allowed to wait
+INGEST_WORKERS = 2
+INGEST_MAX_PENDING = 1000
+# A file is processed once it has had no events and no size/mtime change for this long
+INGEST_SETTLE_SECONDS = 2.0
 
 class FolderMonitorHandler(FileSystemEventHandler):
     """Handles folder events (create, modify, delete)."""
-    def __init__(self, vectorstore, processed_files, activity_event):
+    def __init__(self, vectorstore, file_manifest, activity_event, work_queue):
         self.vectorstore = vectorstore
-        self.processed_files = processed_files
+        self.file_manifest = file_manifest
         self.activity_event = activity_event
+        self.work_queue = work_queue
 
     def on_created(self, event):
         if not event.is_directory:
             log_message(f"New file detected: {event.src_path}")
-            process_file(event.src_path, self.vectorstore, self.processed_files)
+            self.work_queue.submit(event.src_path)
             self.activity_event.set()
 
     def on_modified(self, event):
         if not event.is_directory:
             log_message(f"File modified: {event.src_path}")
-            process_file(event.src_path, self.vectorstore, self.processed_files)
+            self.work_queue.submit(event.src_path)
             self.activity_event.set()
 
     def on_deleted(self, event):
         if not event.is_directory:
             file_path = event.src_path
             log_message(f"File deleted: {file_path}")
-            if file_path in self.processed_files:
-                del self.processed_files[file_path]
-            remove_file_from_vectorstore(file_path, self.vectorstore)
+            # Removal runs on an ingest worker, after any in-flight processing of the file
+            self.work_queue.submit_removal(file_path)
             self.activity_event.set()
 
 def start_folder_monitoring(folder_path, vectorstore, activity_event):
-    """Starts monitoring a folder in a background thread."""
-    processed_files = {}
+    """Starts monitoring a folder; files are processed by a pool of ingest workers."""
+    file_manifest = FileManifest("vectorstore_db/file_manifest.sqlite")
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
         log_message(f"Created folder: {folder_path}")
 
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(file_path):
-            process_file(file_path, vectorstore, processed_files)
-
-    event_handler = FolderMonitorHandler(vectorstore, processed_files, activity_event)
+    work_queue = CoalescingWorkQueue(
+        lambda file_path: process_file(file_path, vectorstore, file_manifest),
+        workers=INGEST_WORKERS,
+        settle_seconds=INGEST_SETTLE_SECONDS,
+        max_pending=INGEST_MAX_PENDING,
+        remove_handler=lambda file_path: remove_file(file_path, vectorstore, file_manifest),
+    ).start()
+
+    # Reconcile the persistent manifest with the folder in one scan
+    candidates, removed = file_manifest.reconcile(folder_path)
+    log_message(f"Startup scan: {len(candidates)} new or changed files, {len(removed)} removed.")
+    for file_path in removed:
+        work_queue.submit_removal(file_path)
+    for file_path in candidates:
+        work_queue.submit(file_path)
+
+    event_handler = FolderMonitorHandler(vectorstore, file_manifest, activity_event, work_queue)
     observer = Observer()
     observer.schedule(event_handler, folder_path, recursive=True)
     log_message(f"Monitoring folder: {folder_path}")
     observer.start()
-    return observer
+    return observer, work_queue
 
 # Query Handling Functions
+# Print answers token by token instead of waiting for the full completion
+STREAM_ANSWERS = True
+
 def handle_casual_question(query):
     """Handles casual queries like greetings or small talk."""
     casual_responses = {
@@ -198,9 +317,23 @@ def list_sources(vectorstore):
         return "No sources found in the database."
     return "\n".join(f"- {source}" for source in sources)
 
+def format_sources(source_documents):
+    """Source path and snippet for the top retrieved chunks."""
+    sources = []
+    for doc in source_documents[:3]:  # Limit to top 4 sources
+        snippet = doc.page_content[:200] + "..."  # Snippet of the chunk
+        sources.append(f"{doc.metadata['source']}\n - \n{snippet}\n\n")
+    return sources
+
 def handle_database_question(query, qa_agent):
     """Handles database-related queries."""
     try:
+        # Near-duplicate questions are answered from the cache without retrieval or LLM calls
+        query_vector = answer_cache.embed(query)
+        cached = answer_cache.get(query_vector)
+        if cached:
+            return cached
+
         response = qa_agent({"query": query})
 
         # If no relevant sources are found
@@ -209,21 +342,42 @@ def handle_database_question(query, qa_agent):
 
         # Format the response and sources
         formatted_answer = response["result"]
-        sources = []
-        for doc in response["source_documents"][:3]:  # Limit to top 4 sources
-            snippet = doc.page_content[:200] + "..."  # Snippet of the chunk
-            sources.append(f"{doc.metadata['source']}\n - \n{snippet}\n\n")
+        sources = format_sources(response["source_documents"])
 
+        answer_cache.put(
+            query, query_vector, formatted_answer, sources,
+            {doc.metadata["source"] for doc in response["source_documents"]},
+        )
         return formatted_answer, sources
     except Exception as e:
         return f"Error retrieving answer: {e}", None
 
-def review_output(answer, sources):
-    """Reviews and formats the output for display."""
-    if not answer:
-        return "No relevant information found."
+def stream_database_question(query, qa_agent):
+    """
+    Streams the answer to the console as it is generated and returns the
+    sources block to print after it. Cached answers are returned whole.
+    """
+    try:
+        query_vector = answer_cache.embed(query)
+        cached = answer_cache.get(query_vector)
+        if cached:
+            return review_output(*cached)
+
+        response = stream_answer(qa_agent, query, header="\nAnswer:", require_sources=True)
+        if not response["source_documents"]:
+            return review_output("I don't know the answer to that.", None)
+
+        sources = format_sources(response["source_documents"])
+        answer_cache.put(
+            query, query_vector, response["result"], sources,
+            {doc.metadata["source"] for doc in response["source_documents"]},
+        )
+        return review_sources(sources)
+    except Exception as e:
+        return f"Error retrieving answer: {e}"
 
-    formatted_output = f"Answer:\n{answer}\n\nSources:\n"
+def review_sources(sources):
+    formatted_output = "Sources:\n"
     if sources:
         for idx, source in enumerate(sources, start=1):
             formatted_output += f"{idx}. {source}\n"
@@ -231,6 +385,13 @@ def review_output(answer, sources):
         formatted_output += "None"
     return formatted_output
 
+def review_output(answer, sources):
+    """Reviews and formats the output for display."""
+    if not answer:
+        return "No relevant information found."
+
+    return f"Answer:\n{answer}\n\n" + review_sources(sources)
+
 def query_router(query, qa_agent, vectorstore):
     """Routes queries to the appropriate handler."""
     # Handle casual questions
@@ -243,7 +404,12 @@ def query_router(query, qa_agent, vectorstore):
         sources_list = list_sources(vectorstore)
         return f"Available Sources:\n{sources_list}"
 
+    if query.lower() == "cache stats":
+        return "Answer cache:\n" + "\n".join(f"- {k}: {v}" for k, v in answer_cache.stats().items())
+
     # Handle database-related questions
+    if STREAM_ANSWERS:
+        return stream_database_question(query, qa_agent)
     answer, sources = handle_database_question(query, qa_agent)
     return review_output(answer, sources)
 
@@ -252,11 +418,21 @@ if __name__ == "__main__":
     folder_to_monitor = "C:/Users/srira/Desktop/GenAi2/QA_Agents/qa_files"
     activity_event = Event()
 
-    observer = start_folder_monitoring(folder_to_monitor, vectorstore, activity_event)
+    init_stores()
+    if not len(bm25_index):
+        log_message(f"Built BM25 index from {bm25_index.backfill(vectorstore._collection)} stored chunks.")
+    observer, work_queue = start_folder_monitoring(folder_to_monitor, vectorstore, activity_event)
 
     try:
-        retriever = vectorstore.as_retriever()
-        retriever.search_kwargs = {"k": 5}
+        dense_retriever = vectorstore.as_retriever()
+        dense_retriever.search_kwargs = {"k": HYBRID_FETCH_K}
+        retriever = HybridRetriever(
+            vector_retriever=dense_retriever, bm25_index=bm25_index, k=fused_k(), fetch_k=HYBRID_FETCH_K
+        )
+        retriever = add_stages(
+            retriever, collection=vectorstore._collection, chunk_manifest=chunk_manifest,
+            embeddings=embedding_model, scorer=reranker,
+        )
         llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
         qa_agent = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, return_source_documents=True)
 
@@ -279,3 +455,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         log_message("\nShutting down the application.")
         observer.stop()
+        work_queue.stop(wait=False)
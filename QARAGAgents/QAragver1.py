@@ -31,30 +31,43 @@ from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import SentenceTransformerEmbeddings
+import common_path  # puts the shared modules in common/ on sys.path
+from embedding_cache import EmbeddingCache, CachedEmbeddings
 from langchain.text_splitter import CharacterTextSplitter
 from langchain.chains import RetrievalQA
 from langchain_community.chat_models import ChatOpenAI
 from langchain_huggingface import HuggingFaceEmbeddings
-from PyPDF2 import PdfReader
+from pdf_extract import extract_pdf_pages, join_pages, chunk_metadatas
 from docx import Document
 from pptx import Presentation
 import pandas as pd
 import chardet
-import pdfplumber
 
-# **Initialize Embedding Model**
-embedding_model = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-
-# **Initialize ChromaDB**
-vectorstore = Chroma(persist_directory="scalable1_agent_db", embedding_function=embedding_model)
+# **Embedding Model and ChromaDB**
+# Opened by init_stores() (see pdf_extract.PARALLEL_MIN_PAGES)
+embedding_model = None
+vectorstore = None
+
+def init_stores():
+    global embedding_model, vectorstore
+    if vectorstore is not None:
+        return
+    embedding_model = CachedEmbeddings(
+        SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2"),
+        EmbeddingCache("embedding_cache.sqlite"),
+        "all-MiniLM-L6-v2",
+    )
+    vectorstore = Chroma(persist_directory="scalable1_agent_db", embedding_function=embedding_model)
 
 # **Utility Functions**
 def extract_text(file_path):
     """
     Extract text from various file types: .txt, .pdf, .docx, .csv, .xlsx, .pptx.
+    Returns the text and, for PDFs, the offset at which each page starts (else None).
     """
     try:
         text = ""
+        page_starts = None
         if file_path.endswith(".txt"):
             # Detect encoding
             with open(file_path, "rb") as f:
@@ -64,16 +77,7 @@ def extract_text(file_path):
             with open(file_path, "r", encoding=encoding, errors="ignore") as f:
                 text = f.read()
         elif file_path.endswith(".pdf"):
-            try:
-                # Try PyPDF2 first
-                reader = PdfReader(file_path)
-                for page in reader.pages:
-                    text += page.extract_text() or ""
-            except Exception:
-                # Fallback to pdfplumber
-                with pdfplumber.open(file_path) as pdf:
-                    for page in pdf.pages:
-                        text += page.extract_text() or ""
+            text, page_starts = join_pages(extract_pdf_pages(file_path))
         elif file_path.endswith(".docx"):
             doc = Document(file_path)
             for paragraph in doc.paragraphs:
@@ -93,10 +97,10 @@ def extract_text(file_path):
                             text += paragraph.text + "\n"
         else:
             raise ValueError(f"Unsupported file type: {file_path}")
-        return text
+        return text, page_starts
     except Exception as e:
         print(f"Error extracting text from {file_path}: {e}")
-        return ""
+        return "", None
 
 def process_file(file_path, vectorstore):
     """
@@ -104,7 +108,7 @@ def process_file(file_path, vectorstore):
     """
     try:
         # Extract text from the file
-        text = extract_text(file_path)
+        text, page_starts = extract_text(file_path)
         if not text.strip():
             print(f"No text extracted from {file_path}. Skipping.")
             return
@@ -114,7 +118,7 @@ def process_file(file_path, vectorstore):
         chunks = splitter.split_text(text)
 
         # Add chunks to ChromaDB
-        vectorstore.add_texts(chunks, metadatas=[{"source": file_path}] * len(chunks))
+        vectorstore.add_texts(chunks, metadatas=chunk_metadatas(file_path, text, chunks, page_starts))
         vectorstore.persist()
         print(f"File processed and stored: {file_path}")
     except Exception as e:
@@ -148,6 +152,7 @@ def create_qa_agent(vectorstore):
 # **Main Script**
 if __name__ == "__main__":
     folder_to_monitor = "C:/Users/srira/Desktop/GenAi2/QA_Agents/qa_files"
+    init_stores()
 
     # Ensure the folder exists
     if not os.path.exists(folder_to_monitor):
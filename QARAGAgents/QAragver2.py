@@ -27,19 +27,21 @@ Instructions:
 
 import os
 import logging
-import hashlib
 from concurrent.futures import ThreadPoolExecutor
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import SentenceTransformerEmbeddings
+import common_path  # puts the shared modules in common/ on sys.path
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from file_manifest import FileManifest
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import RetrievalQA
 from langchain_community.chat_models import ChatOpenAI
-from PyPDF2 import PdfReader
+from streaming_answer import stream_answer
+from pdf_extract import extract_pdf_pages, join_pages, chunk_metadatas
 from docx import Document
 from pptx import Presentation
 import pandas as pd
 import chardet
-import pdfplumber
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import time
@@ -56,17 +58,28 @@ def log_message(message):
     print(f"[INFO] {message}")
     logging.info(message)
 
-# **Initialize Embedding Model**
-embedding_model = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-
-# **Initialize ChromaDB**
-vectorstore = Chroma(persist_directory="scalable2_agent_db", embedding_function=embedding_model)
+# **Embedding Model and ChromaDB**
+# Opened by init_stores() (see pdf_extract.PARALLEL_MIN_PAGES)
+embedding_model = None
+vectorstore = None
+
+def init_stores():
+    global embedding_model, vectorstore
+    if vectorstore is not None:
+        return
+    embedding_model = CachedEmbeddings(
+        SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2"),
+        EmbeddingCache("embedding_cache.sqlite"),
+        "all-MiniLM-L6-v2",
+    )
+    vectorstore = Chroma(persist_directory="scalable2_agent_db", embedding_function=embedding_model)
 
 # **Utility Functions**
 def extract_text(file_path):
-    """Extract text from various file types."""
+    """Extract text from various file types, plus PDF page start offsets (None for other types)."""
     try:
         text = ""
+        page_starts = None
         if file_path.endswith(".txt"):
             with open(file_path, "rb") as f:
                 raw_data = f.read()
@@ -75,14 +88,7 @@ def extract_text(file_path):
             with open(file_path, "r", encoding=encoding, errors="ignore") as f:
                 text = f.read()
         elif file_path.endswith(".pdf"):
-            try:
-                reader = PdfReader(file_path)
-                for page in reader.pages:
-                    text += page.extract_text() or ""
-            except Exception:
-                with pdfplumber.open(file_path) as pdf:
-                    for page in pdf.pages:
-                        text += page.extract_text() or ""
+            text, page_starts = join_pages(extract_pdf_pages(file_path))
         elif file_path.endswith(".docx"):
             doc = Document(file_path)
             for paragraph in doc.paragraphs:
@@ -102,29 +108,26 @@ def extract_text(file_path):
                             text += paragraph.text + "\n"
         else:
             raise ValueError(f"Unsupported file type: {file_path}")
-        return text
+        return text, page_starts
     except Exception as e:
         log_message(f"Error extracting text from {file_path}: {e}")
-        return ""
-
-def get_file_hash(file_path):
-    """Generate a hash for the file content."""
-    with open(file_path, "rb") as f:
-        file_data = f.read()
-    return hashlib.md5(file_data).hexdigest()
+        return "", None
 
-def process_file(file_path, vectorstore, processed_files):
+def process_file(file_path, vectorstore, file_manifest):
     """Process the file: extract text, chunk it, and store in ChromaDB."""
     try:
-        # Check if the file content has changed using its hash
-        file_hash = get_file_hash(file_path)
-        if processed_files.get(file_path) == file_hash:
+        # Stat fast path first; the file is only hashed if its stat changed
+        file_state = file_manifest.check(file_path)
+        if file_state is None:
             log_message(f"No changes detected for {file_path}. Skipping.")
             return
 
-        text = extract_text(file_path)
+        text, page_starts = extract_text(file_path)
         if not text.strip():
             log_message(f"No text extracted from {file_path}. Skipping.")
+            # Drop chunks of an earlier version and record the file so restarts do not re-read it
+            vectorstore._collection.delete(where={"source": file_path})
+            file_manifest.record(file_path, file_state)
             return
 
         splitter = RecursiveCharacterTextSplitter(
@@ -146,41 +149,46 @@ def process_file(file_path, vectorstore, processed_files):
             ids.append(chunk_id)
             new_chunks.append(chunk)
 
-        vectorstore.add_texts(new_chunks, metadatas=[{"source": file_path}] * len(new_chunks), ids=ids)
+        metadatas = chunk_metadatas(file_path, text, new_chunks, page_starts)
+        # IDs are positional, so a file that shrank would keep its old high-index chunks
+        vectorstore._collection.delete(where={"source": file_path})
+        vectorstore.add_texts(new_chunks, metadatas=metadatas, ids=ids)
         log_message(f"New chunks added to vectorstore for {file_path}.")
         vectorstore.persist()
         log_message("Persisted vectorstore.")
 
-        # Update processed files with the current hash
-        processed_files[file_path] = file_hash
+        file_manifest.record(file_path, file_state)
     except Exception as e:
         log_message(f"Error processing file {file_path}: {e}")
 
 # **Folder Monitoring**
 class FolderMonitorHandler(FileSystemEventHandler):
     """Monitor folder for file additions and modifications."""
-    def __init__(self, vectorstore, processed_files):
+    def __init__(self, vectorstore, file_manifest):
         self.vectorstore = vectorstore
-        self.processed_files = processed_files
+        self.file_manifest = file_manifest
 
     def on_created(self, event):
         if not event.is_directory:
             log_message(f"New file detected: {event.src_path}")
-            process_file(event.src_path, self.vectorstore, self.processed_files)
+            process_file(event.src_path, self.vectorstore, self.file_manifest)
 
     def on_modified(self, event):
         if not event.is_directory:
             log_message(f"File modified: {event.src_path}")
-            process_file(event.src_path, self.vectorstore, self.processed_files)
-
-def process_existing_files(folder_path, vectorstore, processed_files):
-    """Process all existing files in the folder on startup."""
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(file_path):
-            process_file(file_path, vectorstore, processed_files)
-
-def start_folder_monitoring(folder_path, vectorstore, processed_files):
+            process_file(event.src_path, self.vectorstore, self.file_manifest)
+
+def process_existing_files(folder_path, vectorstore, file_manifest):
+    """Reconcile the manifest with the folder on startup and process only what changed."""
+    candidates, removed = file_manifest.reconcile(folder_path)
+    log_message(f"Startup scan: {len(candidates)} new or changed files, {len(removed)} removed.")
+    for file_path in removed:
+        vectorstore._collection.delete(where={"source": file_path})
+        file_manifest.remove(file_path)
+    for file_path in candidates:
+        process_file(file_path, vectorstore, file_manifest)
+
+def start_folder_monitoring(folder_path, vectorstore, file_manifest):
     """Start monitoring the specified folder."""
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
@@ -188,9 +196,9 @@ def start_folder_monitoring(folder_path, vectorstore, processed_files):
 
     # Process existing files before starting monitoring
     log_message("Processing existing files in the folder...")
-    process_existing_files(folder_path, vectorstore, processed_files)
+    process_existing_files(folder_path, vectorstore, file_manifest)
 
-    event_handler = FolderMonitorHandler(vectorstore, processed_files)
+    event_handler = FolderMonitorHandler(vectorstore, file_manifest)
     observer = Observer()
     observer.schedule(event_handler, folder_path, recursive=True)
 
@@ -211,6 +219,9 @@ def create_qa_agent(vectorstore):
     qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever, return_source_documents=True)
     return qa_chain
 
+# Print answers token by token instead of waiting for the full completion
+STREAM_ANSWERS = True
+
 def qa_loop(qa_agent):
     """Interactive QA loop."""
     print("\nYou can now ask questions (type 'exit' to quit):")
@@ -227,9 +238,13 @@ def qa_loop(qa_agent):
                 print("Hello! How can I assist you today?")
                 continue
             
-            result = qa_agent({"query": question})
-            print("\nAnswer:")
-            print(result["result"])
+            if STREAM_ANSWERS:
+                # Tokens are printed as they arrive; sources follow the answer
+                result = stream_answer(qa_agent, question, header="\nAnswer:")
+            else:
+                result = qa_agent({"query": question})
+                print("\nAnswer:")
+                print(result["result"])
             
             # Display sources only if documents are retrieved
             if result.get("source_documents"):
@@ -244,10 +259,11 @@ def qa_loop(qa_agent):
 # **Main Script**
 if __name__ == "__main__":
     folder_to_monitor = "C:/Users/srira/Desktop/GenAi2/QA_Agents/qa_files"
-    processed_files = {}  # Dictionary to store processed file hashes
+    init_stores()
+    file_manifest = FileManifest("scalable2_agent_db/file_manifest.sqlite")  # Persistent record of processed files
 
     # Start folder monitoring in the background
-    monitoring_thread = Thread(target=start_folder_monitoring, args=(folder_to_monitor, vectorstore, processed_files))
+    monitoring_thread = Thread(target=start_folder_monitoring, args=(folder_to_monitor, vectorstore, file_manifest))
     monitoring_thread.daemon = True
     monitoring_thread.start()
 
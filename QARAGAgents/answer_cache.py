@@ -0,0 +1,157 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache of final answers keyed by the question embedding.
+
+    A question whose cosine similarity to a cached question is at least
+    `threshold` gets the stored answer and sources back without retrieval or
+    an LLM call. Entries expire after `ttl_seconds`, the least recently used
+    are evicted beyond `max_entries`, and `invalidate_source` drops every
+    entry whose answer cited a file that has changed or been deleted.
+
+    Entries persist in SQLite; their normalized embeddings are also kept in
+    memory as one matrix so a lookup is a single matrix-vector product.
+    """
+    def __init__(self, embed_fn, path="answer_cache.sqlite", threshold=0.92, ttl_seconds=86400, max_entries=1000):
+        self.embed_fn = embed_fn
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.metrics = {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0, "expired": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " question TEXT NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " sources TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answer_sources ("
+            " answer_id INTEGER NOT NULL,"
+            " source TEXT NOT NULL,"
+            " PRIMARY KEY (source, answer_id))"
+        )
+        self._conn.commit()
+        self._reload()
+
+    def _reload(self):
+        rows = self._conn.execute("SELECT id, embedding, created FROM answers ORDER BY id").fetchall()
+        self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._created = np.array([row[2] for row in rows], dtype=np.float64)
+        self._matrix = (
+            np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+            if rows else np.empty((0, 0), dtype=np.float32)
+        )
+
+    def _delete(self, ids):
+        ids = [int(i) for i in ids]
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            marks = ",".join("?" * len(part))
+            self._conn.execute(f"DELETE FROM answers WHERE id IN ({marks})", part)
+            self._conn.execute(f"DELETE FROM answer_sources WHERE answer_id IN ({marks})", part)
+
+    def embed(self, question):
+        """
+        Normalized question embedding, reusable for `get` and `put`. With a
+        CachedEmbeddings `embed_fn` the retriever reuses the same forward pass.
+        """
+        vector = np.asarray(self.embed_fn(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, vector):
+        """Cached (answer, sources) for a near-duplicate question, or None."""
+        with self._lock:
+            now = time.time()
+            # Expired entries are dropped first, so they cannot shadow a live match
+            expired = self._ids[now - self._created > self.ttl_seconds]
+            if len(expired):
+                self._delete(expired)
+                self._conn.commit()
+                self._reload()
+                self.metrics["expired"] += len(expired)
+            if len(self._ids):
+                similarities = self._matrix @ vector
+                best = int(similarities.argmax())
+                if similarities[best] >= self.threshold:
+                    answer_id = int(self._ids[best])
+                    row = self._conn.execute(
+                        "SELECT answer, sources FROM answers WHERE id = ?", (answer_id,)
+                    ).fetchone()
+                    self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, answer_id))
+                    self._conn.commit()
+                    self.metrics["hits"] += 1
+                    logging.info(f"Answer cache hit (similarity {similarities[best]:.3f}). Stats: {self._stats()}")
+                    return row[0], json.loads(row[1])
+            self.metrics["misses"] += 1
+            return None
+
+    def put(self, question, vector, answer, sources, source_files):
+        """Store an answer together with the files it was built from."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (question, embedding, answer, sources, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (question, np.asarray(vector, dtype=np.float32).tobytes(), answer, json.dumps(sources), now, now),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO answer_sources (answer_id, source) VALUES (?, ?)",
+                [(cursor.lastrowid, source) for source in set(source_files)],
+            )
+            self.metrics["stores"] += 1
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT id FROM answers WHERE created < ?", (now - self.ttl_seconds,)
+            )]
+            self._delete(expired)
+            self.metrics["expired"] += len(expired)
+            overflow = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                lru = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM answers ORDER BY last_used LIMIT ?", (overflow,)
+                )]
+                self._delete(lru)
+                self.metrics["evicted"] += len(lru)
+            self._conn.commit()
+            self._reload()
+
+    def invalidate_source(self, source):
+        """Drop every cached answer that cited `source`; returns how many."""
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT answer_id FROM answer_sources WHERE source = ?", (source,)
+            )]
+            if not ids:
+                return 0
+            self._delete(ids)
+            self._conn.commit()
+            self._reload()
+            self.metrics["invalidated"] += len(ids)
+        logging.info(f"Invalidated {len(ids)} cached answers citing {source}.")
+        return len(ids)
+
+    def _stats(self):
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return dict(
+            self.metrics,
+            entries=len(self._ids),
+            hit_rate=self.metrics["hits"] / lookups if lookups else 0.0,
+        )
+
+    def stats(self):
+        with self._lock:
+            return self._stats()
@@ -0,0 +1,217 @@
+"""
+Batch question answering against a QA agent vectorstore.
+
+Reads questions from a file (.txt: one per line; .jsonl: {"id", "question"}),
+embeds them all in one batched encoder call, retrieves in parallel and runs
+LLM completions with bounded concurrency. Retrieval goes through the same
+stages as QARagver5 (see retrieval_pipeline), each of which can be switched off. Each answer is written to a JSONL
+file as soon as it is ready, with its sources and per-stage timings.
+
+    python batch_qa.py questions.txt answers.jsonl --persist-dir vectorstore_db
+    python batch_qa.py questions.txt answers.jsonl --fake-llm
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from langchain_community.vectorstores import Chroma
+from langchain_community.embeddings import SentenceTransformerEmbeddings
+from langchain.chains import RetrievalQA
+import common_path  # puts the shared modules in common/ on sys.path
+from embedding_cache import EmbeddingCache, CachedEmbeddings
+from hybrid_retrieval import BM25Index, reciprocal_rank_fusion, lexical_documents
+from chunk_manifest import ChunkManifest
+from reranker import CrossEncoderScorer
+from retrieval_pipeline import (
+    HYBRID_FETCH_K, RERANK, NEIGHBOR_WINDOW, ASSEMBLE_CONTEXT,
+    FetchedDocumentsRetriever, add_stages, fused_k,
+)
+
+logging.basicConfig(
+    filename="batch_qa.log",
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+def read_questions(path):
+    """List of (id, question) pairs."""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                questions.append((record.get("id", line_no), record["question"]))
+            else:
+                questions.append((line_no, line))
+    return questions
+
+
+def build_llm(fake=False):
+    if fake:
+        from langchain_community.llms.fake import FakeListLLM
+        return FakeListLLM(responses=["This is a fake answer for batch testing."])
+    from langchain_community.chat_models import ChatOpenAI
+    return ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+
+
+class BatchQA:
+    """
+    Three-stage pipeline: one batched embedding call, a retrieval pool and a
+    smaller LLM pool that bounds the number of concurrent completions.
+    """
+    def __init__(self, vectorstore, embedding_model, llm, bm25_index=None, retrieve_workers=8, llm_concurrency=4,
+                 chunk_manifest=None, scorer=None, rerank=RERANK, neighbor_window=NEIGHBOR_WINDOW,
+                 assemble_context=ASSEMBLE_CONTEXT):
+        self.vectorstore = vectorstore
+        self.embedding_model = embedding_model
+        self.bm25_index = bm25_index
+        self.chunk_manifest = chunk_manifest
+        self.scorer = scorer
+        self.rerank = rerank and scorer is not None
+        self.neighbor_window = neighbor_window
+        self.assemble_context = assemble_context
+        # Only the stuff-documents step of the RetrievalQA chain is used; retrieval happens here
+        self.combine_chain = RetrievalQA.from_chain_type(
+            llm=llm, retriever=vectorstore.as_retriever()
+        ).combine_documents_chain
+        self.retrieve_workers = retrieve_workers
+        self.llm_concurrency = llm_concurrency
+
+    def retrieve(self, question, vector):
+        start = time.perf_counter()
+        k = fused_k(self.rerank)
+        if self.bm25_index is None:
+            docs = self.vectorstore.similarity_search_by_vector(vector, k=k)
+        else:
+            dense = self.vectorstore.similarity_search_by_vector(vector, k=HYBRID_FETCH_K)
+            lexical = lexical_documents(self.bm25_index, question, HYBRID_FETCH_K)
+            docs = reciprocal_rank_fusion((dense, lexical), k)
+        # The query was embedded in the batch, so the shared stages start from the fetched documents
+        retriever = add_stages(
+            FetchedDocumentsRetriever(documents=docs),
+            collection=self.vectorstore._collection, chunk_manifest=self.chunk_manifest,
+            embeddings=self.embedding_model, scorer=self.scorer, rerank=self.rerank,
+            neighbor_window=self.neighbor_window, assemble_context=self.assemble_context,
+        )
+        docs = retriever.get_relevant_documents(question)
+        return docs, (time.perf_counter() - start) * 1000
+
+    def generate(self, question, docs):
+        start = time.perf_counter()
+        result = self.combine_chain({"input_documents": docs, "question": question})
+        return result["output_text"], (time.perf_counter() - start) * 1000
+
+    def run(self, questions, output_path):
+        """Answer all questions, appending results to `output_path`; returns a summary."""
+        wall_start = time.perf_counter()
+        start = time.perf_counter()
+        vectors = self.embedding_model.embed_documents([q for _, q in questions])
+        embed_ms = (time.perf_counter() - start) * 1000
+        per_question_embed_ms = embed_ms / max(len(questions), 1)
+
+        timings = {"retrieve_ms": [], "generate_ms": []}
+        failures = 0
+        write_lock = threading.Lock()
+        with open(output_path, "w", encoding="utf-8") as out, \
+                ThreadPoolExecutor(self.retrieve_workers, thread_name_prefix="batch-retrieve") as retrieve_pool, \
+                ThreadPoolExecutor(self.llm_concurrency, thread_name_prefix="batch-llm") as llm_pool:
+
+            def write(record):
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+
+            retrievals = {
+                retrieve_pool.submit(self.retrieve, question, vector): (qid, question)
+                for (qid, question), vector in zip(questions, vectors)
+            }
+            generations = {}
+            for future in as_completed(retrievals):
+                qid, question = retrievals[future]
+                try:
+                    docs, retrieve_ms = future.result()
+                except Exception as e:
+                    failures += 1
+                    write({"id": qid, "question": question, "error": f"retrieval failed: {e}"})
+                    continue
+                timings["retrieve_ms"].append(retrieve_ms)
+                generations[llm_pool.submit(self.generate, question, docs)] = (qid, question, docs, retrieve_ms)
+
+            for future in as_completed(generations):
+                qid, question, docs, retrieve_ms = generations[future]
+                try:
+                    answer, generate_ms = future.result()
+                except Exception as e:
+                    failures += 1
+                    write({"id": qid, "question": question, "error": f"generation failed: {e}"})
+                    continue
+                timings["generate_ms"].append(generate_ms)
+                write({
+                    "id": qid,
+                    "question": question,
+                    "answer": answer,
+                    "sources": [doc.metadata.get("source") for doc in docs],
+                    "timings": {
+                        "embed_ms": per_question_embed_ms,
+                        "retrieve_ms": retrieve_ms,
+                        "generate_ms": generate_ms,
+                    },
+                })
+
+        summary = {
+            "questions": len(questions),
+            "failed": failures,
+            "wall_s": time.perf_counter() - wall_start,
+            "embed_batch_ms": embed_ms,
+        }
+        for stage, values in timings.items():
+            if values:
+                summary[f"{stage}_p50"] = float(np.percentile(values, 50))
+                summary[f"{stage}_p95"] = float(np.percentile(values, 95))
+        logging.info(f"Batch QA summary: {summary}")
+        return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions in batch.")
+    parser.add_argument("questions", help=".txt (one question per line) or .jsonl with id/question")
+    parser.add_argument("output", help="JSONL output path")
+    parser.add_argument("--persist-dir", default="vectorstore_db")
+    parser.add_argument("--retrieve-workers", type=int, default=8)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--dense-only", action="store_true", help="Skip BM25 fusion even if an index exists")
+    parser.add_argument("--no-rerank", action="store_true", help="Skip the cross-encoder stage")
+    parser.add_argument("--neighbor-window", type=int, default=NEIGHBOR_WINDOW,
+                        help="Neighbors added on each side of a hit (0 to skip expansion)")
+    parser.add_argument("--no-assemble", action="store_true", help="Skip merging, dedup and MMR of the context")
+    parser.add_argument("--fake-llm", action="store_true", help="Use a local fake LLM instead of OpenAI")
+    args = parser.parse_args()
+
+    embedding_model = CachedEmbeddings(
+        SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2"),
+        EmbeddingCache("embedding_cache.sqlite"),
+        "all-MiniLM-L6-v2",
+    )
+    vectorstore = Chroma(persist_directory=args.persist_dir, embedding_function=embedding_model)
+    bm25_path = os.path.join(args.persist_dir, "bm25_index.sqlite")
+    bm25_index = BM25Index(bm25_path) if os.path.exists(bm25_path) and not args.dense_only else None
+    manifest_path = os.path.join(args.persist_dir, "chunk_manifest.sqlite")
+    chunk_manifest = ChunkManifest(manifest_path) if os.path.exists(manifest_path) else None
+
+    batch = BatchQA(
+        vectorstore, embedding_model, build_llm(args.fake_llm), bm25_index,
+        retrieve_workers=args.retrieve_workers, llm_concurrency=args.llm_concurrency,
+        chunk_manifest=chunk_manifest, scorer=CrossEncoderScorer(), rerank=RERANK and not args.no_rerank,
+        neighbor_window=args.neighbor_window, assemble_context=ASSEMBLE_CONTEXT and not args.no_assemble,
+    )
+    questions = read_questions(args.questions)
+    print(f"Answering {len(questions)} questions...")
+    summary = batch.run(questions, args.output)
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,81 @@
+import hashlib
+import sqlite3
+import threading
+
+
+class ChunkManifest:
+    """
+    Persistent record of the chunk IDs stored for each file, in chunk order.
+
+    Chunk IDs are derived from the chunk text, so diffing a file's previous
+    and current ID lists tells exactly which chunks are new and which are gone.
+    """
+    def __init__(self, path="chunk_manifest.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " file_path TEXT NOT NULL,"
+            " ordinal INTEGER NOT NULL,"
+            " chunk_id TEXT NOT NULL,"
+            " PRIMARY KEY (file_path, ordinal))"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def chunk_ids(file_path, chunks):
+        """Content-derived IDs; repeated chunks within a file get an occurrence suffix."""
+        ids = []
+        seen = {}
+        for chunk in chunks:
+            digest = hashlib.sha1(chunk.encode("utf-8")).hexdigest()[:20]
+            count = seen.get(digest, 0)
+            seen[digest] = count + 1
+            ids.append(f"{file_path}_{digest}" if count == 0 else f"{file_path}_{digest}_{count}")
+        return ids
+
+    def __contains__(self, file_path):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM chunks WHERE file_path = ? LIMIT 1", (file_path,)).fetchone()
+        return row is not None
+
+    def get(self, file_path):
+        """Stored chunk IDs for a file, in chunk order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE file_path = ? ORDER BY ordinal", (file_path,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def diff(self, file_path, chunks):
+        """
+        Compare new chunks with the stored manifest.
+
+        Returns (ids, added, removed): the IDs for `chunks`, the positions of
+        chunks that are not stored yet, and stored IDs that no longer exist.
+        """
+        ids = self.chunk_ids(file_path, chunks)
+        old_ids = self.get(file_path)
+        old = set(old_ids)
+        new = set(ids)
+        added = [i for i, chunk_id in enumerate(ids) if chunk_id not in old]
+        removed = [chunk_id for chunk_id in old_ids if chunk_id not in new]
+        return ids, added, removed
+
+    def set(self, file_path, ids):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE file_path = ?", (file_path,))
+            self._conn.executemany(
+                "INSERT INTO chunks (file_path, ordinal, chunk_id) VALUES (?, ?, ?)",
+                [(file_path, i, chunk_id) for i, chunk_id in enumerate(ids)],
+            )
+            self._conn.commit()
+
+    def remove(self, file_path):
+        """Forget a file and return the chunk IDs it had."""
+        ids = self.get(file_path)
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE file_path = ?", (file_path,))
+            self._conn.commit()
+        return ids
@@ -0,0 +1,178 @@
+import logging
+import re
+import time
+from typing import Any, List
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+WORD_PATTERN = re.compile(r"\w+")
+
+_encoding = tiktoken.get_encoding("cl100k_base") if tiktoken is not None else None
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def _overlap(left, right, min_overlap):
+    """Length of the longest suffix of `left` that is a prefix of `right`."""
+    if len(right) < min_overlap:
+        return 0
+    probe = right[:min_overlap]
+    # Earliest match of the probe that runs to the end of `left` is the longest overlap
+    pos = left.find(probe, max(0, len(left) - len(right)))
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+def _join(left, right, min_overlap):
+    """Merged text of two chunks of one file, or None if they do not overlap."""
+    if right.page_content in left.page_content:
+        return left.page_content
+    if left.page_content in right.page_content:
+        return right.page_content
+    start_left = left.metadata.get("start_index")
+    start_right = right.metadata.get("start_index")
+    if start_left is not None and start_right is not None:
+        if start_right < start_left:
+            left, right, start_left, start_right = right, left, start_right, start_left
+        end_left = start_left + len(left.page_content)
+        if start_right > end_left:
+            return None
+        return left.page_content + right.page_content[end_left - start_right:]
+    for first, second in ((left, right), (right, left)):
+        size = _overlap(first.page_content, second.page_content, min_overlap)
+        if size:
+            return first.page_content + second.page_content[size:]
+    return None
+
+
+def merge_overlapping(docs, min_overlap=20):
+    """
+    Merge chunks of the same source whose text overlaps (splitter overlap)
+    or that are adjacent by `start_index`, keeping the rank of the best chunk.
+    """
+    spans = []
+    for doc in docs:
+        merged = Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+        position = len(spans)
+        changed = True
+        while changed:
+            changed = False
+            for i, span in enumerate(spans):
+                if span.metadata.get("source") != merged.metadata.get("source"):
+                    continue
+                text = _join(span, merged, min_overlap)
+                if text is None:
+                    continue
+                starts = [s for s in (span.metadata.get("start_index"), merged.metadata.get("start_index"))
+                          if s is not None]
+                metadata = dict(span.metadata)
+                if starts:
+                    metadata["start_index"] = min(starts)
+                merged = Document(page_content=text, metadata=metadata)
+                del spans[i]
+                # The merged span takes the earlier (better) rank
+                position = min(position, i)
+                changed = True
+                break
+        spans.insert(position, merged)
+    return spans
+
+
+def _shingles(text, size=3):
+    words = WORD_PATTERN.findall(text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def drop_near_duplicates(docs, threshold=0.9):
+    """Drop documents whose word-shingle Jaccard similarity to a kept one reaches `threshold`."""
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / max(len(shingles | other), 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def mmr_select(query_vector, doc_vectors, token_counts, token_budget, mmr_lambda=0.7):
+    """
+    Indices chosen greedily by maximal marginal relevance until the token
+    budget is spent. The most relevant document is always included.
+    """
+    query = np.asarray(query_vector, dtype=np.float32)
+    vectors = np.asarray(doc_vectors, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    selected, used = [], 0
+    remaining = list(range(len(vectors)))
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = remaining[int(scores.argmax())]
+        remaining.remove(best)
+        if selected and used + token_counts[best] > token_budget:
+            continue
+        selected.append(best)
+        used += token_counts[best]
+    return selected
+
+
+class ContextAssemblingRetriever(BaseRetriever):
+    """
+    Turns retrieved chunks into the context sent to the LLM: overlapping
+    chunks of one file become a single span, near-duplicate spans are
+    dropped and the rest are chosen by MMR within `token_budget`.
+    """
+    base_retriever: BaseRetriever
+    embeddings: Any
+    token_budget: int = 1500
+    mmr_lambda: float = 0.7
+    duplicate_threshold: float = 0.9
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = self.base_retriever.get_relevant_documents(query)
+        if not docs:
+            return docs
+        start = time.perf_counter()
+        tokens_in = sum(count_tokens(doc.page_content) for doc in docs)
+
+        spans = drop_near_duplicates(merge_overlapping(docs), self.duplicate_threshold)
+        token_counts = [count_tokens(span.page_content) for span in spans]
+        if len(spans) > 1 and sum(token_counts) > self.token_budget:
+            vectors = self.embeddings.embed_documents([span.page_content for span in spans])
+            order = mmr_select(
+                self.embeddings.embed_query(query), vectors, token_counts, self.token_budget, self.mmr_lambda
+            )
+        else:
+            order = range(len(spans))
+        context = [spans[i] for i in order]
+
+        tokens_out = sum(token_counts[i] for i in order)
+        logging.info(
+            f"Context assembly: {len(docs)} chunks -> {len(context)} spans, {tokens_in} -> {tokens_out} tokens "
+            f"({tokens_in - tokens_out} saved) in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return context
@@ -0,0 +1,230 @@
+import heapq
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Words plus identifiers such as "SKU-1042", "4.2.1" or "v2/api"
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-/]\w+)*")
+SPLIT_PATTERN = re.compile(r"[.\-/]")
+SQLITE_MAX_VARIABLES = 500
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-retrieval")
+
+
+def tokenize(text):
+    """Lowercased terms; compound identifiers are indexed whole and by their parts."""
+    tokens = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(match)
+        if SPLIT_PATTERN.search(match):
+            tokens.extend(part for part in SPLIT_PATTERN.split(match) if part)
+    return tokens
+
+
+def _batches(items, size=SQLITE_MAX_VARIABLES):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index over the chunks stored in Chroma.
+
+    Postings live in SQLite keyed by term, so chunks can be added and removed
+    file by file as they are ingested, and a query only reads the posting
+    lists of its own terms.
+    """
+    def __init__(self, path="bm25_index.sqlite", k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " source TEXT,"
+            " text TEXT NOT NULL,"
+            " metadata TEXT NOT NULL,"
+            " length INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL,"
+            " chunk_id TEXT NOT NULL,"
+            " tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, chunk_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_docs_source ON docs (source)")
+        self._conn.commit()
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        self._count = count
+        self._total_length = total
+
+    def __len__(self):
+        return self._count
+
+    def _delete(self, ids):
+        for batch in _batches(ids):
+            placeholders = ",".join("?" * len(batch))
+            count, total = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE chunk_id IN ({placeholders})", batch
+            ).fetchone()
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({placeholders})", batch)
+            self._conn.execute(f"DELETE FROM docs WHERE chunk_id IN ({placeholders})", batch)
+            self._count -= count
+            self._total_length -= total
+
+    def add(self, ids, texts, metadatas=None):
+        """Index chunks, replacing any existing entries with the same IDs."""
+        metadatas = metadatas or [{} for _ in ids]
+        docs = []
+        postings = []
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            docs.append((chunk_id, metadata.get("source"), text, json.dumps(metadata), length))
+            postings.extend((term, chunk_id, tf) for term, tf in counts.items())
+        with self._lock:
+            self._delete(list(ids))
+            self._conn.executemany(
+                "INSERT INTO docs (chunk_id, source, text, metadata, length) VALUES (?, ?, ?, ?, ?)", docs
+            )
+            self._conn.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", postings)
+            self._conn.commit()
+            self._count += len(docs)
+            self._total_length += sum(doc[4] for doc in docs)
+
+    def remove(self, ids):
+        with self._lock:
+            self._delete(list(ids))
+            self._conn.commit()
+
+    def remove_source(self, source):
+        """Drop every chunk that came from `source`."""
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT chunk_id FROM docs WHERE source = ?", (source,))]
+            self._delete(ids)
+            self._conn.commit()
+
+    def backfill(self, collection, page_size=1000):
+        """Index every chunk of a Chroma collection, e.g. when the index is new."""
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            self.add(page["ids"], page["documents"], [m or {} for m in page["metadatas"]])
+            offset += len(page["ids"])
+        return offset
+
+    def search(self, query, k=20):
+        """Top-k (chunk_id, score) pairs by BM25."""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._count:
+                return []
+            avg_length = self._total_length / self._count
+            scores = {}
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, d.length FROM postings p"
+                    " JOIN docs d ON d.chunk_id = p.chunk_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (self._count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def documents(self, ids):
+        """LangChain documents for the given chunk IDs, in the same order."""
+        found = {}
+        with self._lock:
+            for batch in _batches(list(ids)):
+                placeholders = ",".join("?" * len(batch))
+                for chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT chunk_id, text, metadata FROM docs WHERE chunk_id IN ({placeholders})", batch
+                ):
+                    found[chunk_id] = Document(page_content=text, metadata=json.loads(metadata))
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+
+def _doc_key(doc):
+    # Dense hits carry no chunk ID, so match on source and content
+    return doc.metadata.get("source"), doc.page_content
+
+
+def reciprocal_rank_fusion(rankings, k=5, rrf_k=60):
+    """Merge ranked document lists; each document scores sum(1 / (rrf_k + rank))."""
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return [docs[key] for key in heapq.nlargest(k, scores, key=scores.get)]
+
+
+def lexical_documents(bm25_index, query, k=20):
+    """Top-k BM25 matches as LangChain documents."""
+    hits = bm25_index.search(query, k)
+    return bm25_index.documents([chunk_id for chunk_id, _ in hits])
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Runs dense (vectorstore) and BM25 retrieval in parallel and merges the
+    two rankings with reciprocal-rank fusion.
+
+    The dense retriever should fetch about `fetch_k` candidates; only the
+    top `k` fused documents reach the LLM, so the prompt does not grow.
+    """
+    vector_retriever: BaseRetriever
+    bm25_index: Any
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        def timed(fn, *args):
+            start = time.perf_counter()
+            result = fn(*args)
+            return result, (time.perf_counter() - start) * 1000
+
+        dense_future = _pool.submit(timed, self.vector_retriever.get_relevant_documents, query)
+        lexical_future = _pool.submit(timed, self._lexical, query)
+        dense_docs, dense_ms = dense_future.result()
+        lexical_docs, lexical_ms = lexical_future.result()
+
+        fused = reciprocal_rank_fusion((dense_docs, lexical_docs), self.k, self.rrf_k)
+
+        dense_keys = {_doc_key(d) for d in dense_docs}
+        overlap = len(dense_keys & {_doc_key(d) for d in lexical_docs})
+        from_lexical_only = sum(_doc_key(d) not in dense_keys for d in fused)
+        logging.info(
+            f"Hybrid retrieval: dense {len(dense_docs)} docs in {dense_ms:.1f} ms, "
+            f"bm25 {len(lexical_docs)} docs in {lexical_ms:.1f} ms, overlap {overlap}, "
+            f"{from_lexical_only} of top {len(fused)} from bm25 only"
+        )
+        return fused
+
+    def _lexical(self, query):
+        return lexical_documents(self.bm25_index, query, self.fetch_k)
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+
+
+def _stat_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class CoalescingWorkQueue:
+    """
+    Work queue between watchdog handlers and file processing.
+
+    Repeated events for a path that is already queued are merged into one
+    entry. An entry becomes ready once the file has had no events for
+    `settle_seconds` and its size and mtime have stopped changing. A pool of
+    worker threads drains ready entries; `submit` blocks while `max_pending`
+    distinct paths are waiting, which pushes back on the event source.
+
+    Deletions queued with `submit_removal` replace any pending entry for the
+    path and are handed to `remove_handler` without a settle period, so the
+    event source never does the removal work itself. A path is never handled
+    by two workers at once.
+    """
+    def __init__(self, handler, workers=2, settle_seconds=1.0, max_pending=1000, remove_handler=None):
+        self.handler = handler
+        self.remove_handler = remove_handler
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self.max_pending = max_pending
+        self._pending = {}
+        self._in_progress = set()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+        self.metrics = {"submitted": 0, "coalesced": 0, "processed": 0, "removed": 0, "failed": 0, "max_depth": 0}
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, wait=True):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def submit(self, path):
+        """Queue a path, merging with a pending entry for the same path."""
+        self._enqueue(path, _stat_signature(path), removal=False)
+
+    def submit_removal(self, path):
+        """Queue the removal of a deleted path, replacing a pending entry for it."""
+        if self.remove_handler is None:
+            raise ValueError("CoalescingWorkQueue was created without a remove_handler")
+        self._enqueue(path, None, removal=True)
+
+    def _enqueue(self, path, signature, removal):
+        with self._cond:
+            self.metrics["submitted"] += 1
+            if path in self._pending:
+                self.metrics["coalesced"] += 1
+            else:
+                while len(self._pending) >= self.max_pending and not self._stopped:
+                    self._cond.wait()
+            self._pending[path] = (time.monotonic(), signature, removal)
+            self.metrics["max_depth"] = max(self.metrics["max_depth"], len(self._pending))
+            self._cond.notify_all()
+
+    def depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self):
+        with self._cond:
+            return dict(self.metrics, depth=len(self._pending), in_progress=len(self._in_progress))
+
+    def _next_ready(self):
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                wait_for = self.settle_seconds
+                for path, (last_event, signature, removal) in list(self._pending.items()):
+                    if path in self._in_progress:
+                        continue
+                    if removal:
+                        del self._pending[path]
+                        self._in_progress.add(path)
+                        self._cond.notify_all()
+                        return path, True
+                    remaining = last_event + self.settle_seconds - now
+                    if remaining > 0:
+                        wait_for = min(wait_for, remaining)
+                        continue
+                    current = _stat_signature(path)
+                    if current != signature:
+                        # Still being written (or gone); check again after another quiet period
+                        self._pending[path] = (now, current, False)
+                        continue
+                    del self._pending[path]
+                    self._in_progress.add(path)
+                    self._cond.notify_all()
+                    return path, False
+                self._cond.wait(timeout=max(wait_for, 0.05))
+        return None, False
+
+    def _worker(self):
+        while True:
+            path, removal = self._next_ready()
+            if path is None:
+                return
+            try:
+                if removal:
+                    self.remove_handler(path)
+                elif os.path.exists(path):
+                    self.handler(path)
+                with self._cond:
+                    self.metrics["removed" if removal else "processed"] += 1
+            except Exception as e:
+                logging.error(f"Error processing {path} from the ingest queue: {e}")
+                with self._cond:
+                    self.metrics["failed"] += 1
+            finally:
+                with self._cond:
+                    self._in_progress.discard(path)
+                    self._cond.notify_all()
+            logging.info(f"Ingest queue stats: {self.stats()}")
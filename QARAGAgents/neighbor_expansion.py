@@ -0,0 +1,100 @@
+import logging
+import time
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def stitch_chunks(parts):
+    """
+    Join consecutive chunks of one file into a single text. With
+    `start_index` on every chunk the splitter overlap is written once;
+    otherwise the chunks are joined with newlines.
+    """
+    if any(metadata.get("start_index") is None for _, metadata in parts):
+        return "\n".join(text for text, _ in parts)
+    text, first = parts[0]
+    end = first["start_index"] + len(text)
+    for part, metadata in parts[1:]:
+        start = metadata["start_index"]
+        if start > end:
+            # The splitter strips the whitespace between chunks
+            text += " " + part
+        else:
+            text += part[end - start:]
+        end = max(end, start + len(part))
+    return text
+
+
+class NeighborExpansionRetriever(BaseRetriever):
+    """
+    Widens each retrieved chunk with its `window` neighbors on either side.
+
+    Chunks are matched precisely while small, and the surrounding text is
+    fetched only for the winners: neighbor IDs come from the chunk
+    manifest (IDs in chunk order per file) using the `chunk_index`
+    metadata, and all neighbors are read in one batched collection `get`.
+    Chunks without position metadata are passed through unchanged.
+    """
+    base_retriever: BaseRetriever
+    collection: Any
+    chunk_manifest: Any
+    window: int = 1
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        docs = self.base_retriever.get_relevant_documents(query)
+        start = time.perf_counter()
+
+        file_ids = {}
+        plans = []
+        wanted = set()
+        for doc in docs:
+            source = doc.metadata.get("source")
+            ordinal = doc.metadata.get("chunk_index")
+            if source is None or ordinal is None:
+                plans.append((doc, None))
+                continue
+            if source not in file_ids:
+                file_ids[source] = self.chunk_manifest.get(source)
+            ids = file_ids[source]
+            if ordinal >= len(ids):
+                plans.append((doc, None))
+                continue
+            low = max(0, ordinal - self.window)
+            window_ids = ids[low:ordinal + self.window + 1]
+            plans.append((doc, (window_ids, ordinal - low)))
+            wanted.update(chunk_id for i, chunk_id in enumerate(window_ids) if i != ordinal - low)
+
+        fetched = {}
+        if wanted:
+            result = self.collection.get(ids=list(wanted), include=["documents", "metadatas"])
+            for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"]):
+                fetched[chunk_id] = (text, metadata or {})
+
+        expanded = []
+        for doc, plan in plans:
+            if plan is None:
+                expanded.append(doc)
+                continue
+            window_ids, hit = plan
+            parts = [
+                (doc.page_content, doc.metadata) if i == hit else fetched.get(chunk_id)
+                for i, chunk_id in enumerate(window_ids)
+            ]
+            parts = [part for part in parts if part is not None]
+            metadata = dict(doc.metadata)
+            if parts[0][1].get("start_index") is not None:
+                metadata["start_index"] = parts[0][1]["start_index"]
+            if "page" in metadata:
+                metadata["page"] = parts[0][1].get("page", metadata["page"])
+                metadata["page_end"] = parts[-1][1].get("page_end", metadata.get("page_end"))
+            expanded.append(Document(page_content=stitch_chunks(parts), metadata=metadata))
+
+        logging.info(
+            f"Neighbor expansion: {len(docs)} chunks widened with {len(fetched)} neighbors "
+            f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return expanded
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def _chunk_key(doc):
+    # Chroma hits carry no chunk ID, so the source and content identify the chunk
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id:
+        return str(chunk_id)
+    content = f"{doc.metadata.get('source')}\0{doc.page_content}"
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class CrossEncoderScorer:
+    """
+    Scores (query, chunk) pairs with a local cross-encoder.
+
+    The model is loaded on first use, all uncached pairs of a query are
+    scored in one batched `predict` call, and scores are kept in an LRU
+    cache keyed by (query hash, chunk ID) so repeated questions and
+    overlapping candidate sets skip the forward pass.
+    """
+    def __init__(self, model_name=DEFAULT_RERANK_MODEL, batch_size=32, cache_size=10000, max_length=512):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.max_length = max_length
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    start = time.perf_counter()
+                    self._model = CrossEncoder(self.model_name, max_length=self.max_length)
+                    logging.info(f"Loaded reranker {self.model_name} in {time.perf_counter() - start:.1f} s")
+        return self._model
+
+    def score(self, query, docs):
+        """Relevance score per document, in the same order; also returns the cache hit count."""
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()
+        keys = [(query_hash, _chunk_key(doc)) for doc in docs]
+        scores = [None] * len(docs)
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            pairs = [(query, docs[i].page_content) for i in missing]
+            predicted = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            with self._cache_lock:
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = scores[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return scores, len(docs) - len(missing)
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Takes a wide candidate set from `base_retriever` and keeps the `top_n`
+    documents the cross-encoder scores highest, so the LLM gets a smaller
+    and more precise context.
+    """
+    base_retriever: BaseRetriever
+    scorer: Any
+    top_n: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        start = time.perf_counter()
+        candidates = self.base_retriever.get_relevant_documents(query)
+        retrieved = time.perf_counter()
+        if len(candidates) <= 1:
+            return candidates
+
+        scores, cached = self.scorer.score(query, candidates)
+        ranked = sorted(zip(scores, range(len(candidates))), reverse=True)[:self.top_n]
+        done = time.perf_counter()
+        logging.info(
+            f"Reranked {len(candidates)} candidates to {len(ranked)} in {(done - retrieved) * 1000:.1f} ms "
+            f"({cached} scores cached), retrieval {(retrieved - start) * 1000:.1f} ms"
+        )
+        return [candidates[i] for _, i in ranked]
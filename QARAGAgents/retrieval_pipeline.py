@@ -0,0 +1,66 @@
+import os
+from typing import List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from context_assembly import ContextAssemblingRetriever
+from neighbor_expansion import NeighborExpansionRetriever
+from reranker import RerankingRetriever
+
+# Retrieval settings of QARagver5, shared with batch_qa so both build the same context
+
+# Candidates taken from each retriever before rank fusion; the LLM sees TOP_K without reranking
+HYBRID_FETCH_K = 20
+TOP_K = 5
+
+# Optional cross-encoder stage: fused candidates are rescored and only the best few reach the LLM.
+# Off by default (it downloads and runs a second model); enable with RERANK=1
+RERANK = os.getenv("RERANK", "0") == "1"
+RERANK_FETCH_K = 20
+RERANK_TOP_N = 4
+
+# Retrieved chunks are widened with this many neighbors on each side
+NEIGHBOR_WINDOW = 1
+
+# Overlapping chunks of a file are merged, near-duplicates dropped and the rest chosen by MMR within the budget
+ASSEMBLE_CONTEXT = True
+CONTEXT_TOKEN_BUDGET = 1200
+
+
+def fused_k(rerank=RERANK):
+    """How many fused candidates the first stage should return."""
+    return RERANK_FETCH_K if rerank else TOP_K
+
+
+def add_stages(
+    retriever, *, collection=None, chunk_manifest=None, embeddings=None, scorer=None,
+    rerank=RERANK, rerank_top_n=RERANK_TOP_N, neighbor_window=NEIGHBOR_WINDOW,
+    assemble_context=ASSEMBLE_CONTEXT, token_budget=CONTEXT_TOKEN_BUDGET,
+):
+    """
+    Wrap a first-stage retriever (returning `fused_k(rerank)` candidates) in
+    the rerank -> neighbor expansion -> context assembly stages. A stage is
+    skipped when it is switched off or its store is not given.
+    """
+    if rerank and scorer is not None:
+        retriever = RerankingRetriever(base_retriever=retriever, scorer=scorer, top_n=rerank_top_n)
+    if neighbor_window and collection is not None and chunk_manifest is not None:
+        retriever = NeighborExpansionRetriever(
+            base_retriever=retriever, collection=collection,
+            chunk_manifest=chunk_manifest, window=neighbor_window,
+        )
+    if assemble_context and embeddings is not None:
+        retriever = ContextAssemblingRetriever(
+            base_retriever=retriever, embeddings=embeddings, token_budget=token_budget
+        )
+    return retriever
+
+
+class FetchedDocumentsRetriever(BaseRetriever):
+    """First stage for documents that were already retrieved, e.g. by a precomputed query vector."""
+    documents: List[Document]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.documents
@@ -0,0 +1,65 @@
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.prompts import format_document
+
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="stream-retrieve")
+
+
+def _token_text(chunk):
+    # Chat models stream message chunks, completion models stream strings
+    return chunk if isinstance(chunk, str) else getattr(chunk, "content", "")
+
+
+def stream_answer(qa_agent, question, header=None, require_sources=False, out=None):
+    """
+    Answer `question` with the retriever, prompt and LLM of a RetrievalQA
+    chain, writing tokens to `out` (stdout) as they arrive.
+
+    Retrieval runs in the background while the prompt is bound to the
+    question. `header` is printed just before the first token. With
+    `require_sources`, no LLM call is made when nothing is retrieved.
+    Returns a dict like the chain's output plus per-question timings.
+    """
+    out = out or sys.stdout
+    start = time.perf_counter()
+    retrieval = _pool.submit(qa_agent.retriever.get_relevant_documents, question)
+
+    combine = qa_agent.combine_documents_chain
+    llm_chain = combine.llm_chain
+    prompt = llm_chain.prompt.partial(question=question)
+
+    docs = retrieval.result()
+    retrieved = time.perf_counter()
+    timings = {"retrieve_ms": (retrieved - start) * 1000}
+    if require_sources and not docs:
+        timings["total_ms"] = timings["retrieve_ms"]
+        return {"query": question, "result": None, "source_documents": docs, "timings": timings}
+
+    context = combine.document_separator.join(format_document(doc, combine.document_prompt) for doc in docs)
+    prompt_value = prompt.format_prompt(**{combine.document_variable_name: context})
+
+    if header:
+        print(header, file=out)
+    tokens = []
+    first_token = None
+    for chunk in llm_chain.llm.stream(prompt_value):
+        text = _token_text(chunk)
+        if not text:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter()
+        tokens.append(text)
+        out.write(text)
+        out.flush()
+    out.write("\n")
+    done = time.perf_counter()
+
+    timings["ttft_ms"] = ((first_token or done) - start) * 1000
+    timings["total_ms"] = (done - start) * 1000
+    logging.info(
+        f"Streamed answer: retrieval {timings['retrieve_ms']:.0f} ms, first token {timings['ttft_ms']:.0f} ms, "
+        f"total {timings['total_ms']:.0f} ms, {len(docs)} sources"
+    )
+    return {"query": question, "result": "".join(tokens), "source_documents": docs, "timings": timings}
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The scripts import each other as top-level modules; run the tests the same way
+FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if FOLDER not in sys.path:
+    sys.path.insert(0, FOLDER)
+
+import common_path  # puts the shared modules in common/ on sys.path
@@ -0,0 +1,111 @@
+import hashlib
+import importlib
+import json
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_community")
+
+from langchain_core.documents import Document
+
+
+class FakeEmbeddings:
+    """Deterministic text -> vector mapping standing in for the sentence-transformer model."""
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        digest = hashlib.sha1(text.encode("utf-8")).digest()
+        return [b / 255.0 for b in digest[:8]]
+
+
+class FakeVectorStore:
+    """The parts of the Chroma store that BatchQA uses, without a database."""
+    _collection = None
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    def as_retriever(self):
+        from retrieval_pipeline import FetchedDocumentsRetriever
+        return FetchedDocumentsRetriever(documents=[])
+
+    def similarity_search_by_vector(self, vector, k=4):
+        self.queries.append(vector)
+        return self.documents[:k]
+
+
+@pytest.fixture
+def batch_qa(tmp_path, monkeypatch):
+    # batch_qa logs to batch_qa.log in the working directory
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("batch_qa")
+
+
+@pytest.fixture
+def documents():
+    return [
+        Document(page_content=f"Paragraph {i} about module reuse, approach number {i}.",
+                 metadata={"source": f"doc{i % 2}.txt", "chunk_index": i})
+        for i in range(6)
+    ]
+
+
+@pytest.mark.parametrize("assemble_context", [False, True])
+def test_run_writes_answers_with_sources_and_timings(batch_qa, documents, tmp_path, assemble_context):
+    questions_path = tmp_path / "questions.jsonl"
+    questions_path.write_text(
+        "\n".join(json.dumps({"id": f"q{i}", "question": f"What is approach {i}?"}) for i in range(5)) + "\n",
+        encoding="utf-8",
+    )
+    output_path = tmp_path / "answers.jsonl"
+    vectorstore = FakeVectorStore(documents)
+    questions = batch_qa.read_questions(str(questions_path))
+
+    batch = batch_qa.BatchQA(
+        vectorstore, FakeEmbeddings(), batch_qa.build_llm(fake=True),
+        retrieve_workers=2, llm_concurrency=2, rerank=False, neighbor_window=0,
+        assemble_context=assemble_context,
+    )
+    summary = batch.run(questions, str(output_path))
+
+    records = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+    assert sorted(record["id"] for record in records) == [f"q{i}" for i in range(5)]
+    assert len(vectorstore.queries) == 5
+    for record in records:
+        assert "error" not in record
+        assert record["question"] == f"What is approach {record['id'][1:]}?"
+        assert record["answer"] == "This is a fake answer for batch testing."
+        assert record["sources"]
+        assert set(record["sources"]) <= {"doc0.txt", "doc1.txt"}
+        assert set(record["timings"]) == {"embed_ms", "retrieve_ms", "generate_ms"}
+        assert all(value >= 0 for value in record["timings"].values())
+    assert summary["questions"] == 5
+    assert summary["failed"] == 0
+    assert "retrieve_ms_p50" in summary and "generate_ms_p95" in summary
+
+
+def test_retrieval_failure_is_recorded_per_question(batch_qa, documents, tmp_path):
+    class BrokenVectorStore(FakeVectorStore):
+        def similarity_search_by_vector(self, vector, k=4):
+            raise RuntimeError("store offline")
+
+    output_path = tmp_path / "answers.jsonl"
+    batch = batch_qa.BatchQA(
+        BrokenVectorStore(documents), FakeEmbeddings(), batch_qa.build_llm(fake=True),
+        rerank=False, neighbor_window=0, assemble_context=False,
+    )
+    summary = batch.run([(1, "Anything?"), (2, "Something else?")], str(output_path))
+
+    records = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+    assert summary["failed"] == 2
+    assert all(record["error"].startswith("retrieval failed") for record in records)
+
+
+def test_read_questions_from_text_file(batch_qa, tmp_path):
+    path = tmp_path / "questions.txt"
+    path.write_text("First question?\n\nSecond question?\n", encoding="utf-8")
+
+    assert batch_qa.read_questions(str(path)) == [(1, "First question?"), (3, "Second question?")]
@@ -17,6 +17,8 @@ from docx import Document
 from pptx import Presentation
 from bs4 import BeautifulSoup
 import xml.etree.ElementTree as ET
+import common_path  # puts the shared modules in common/ on sys.path
+from file_manifest import FileManifest
 
 # Load environment variables
 load_dotenv()
@@ -33,34 +35,21 @@ class FolderMonitorAgent(FileSystemEventHandler):
     """
     Monitor a folder and process files when added or modified.
     """
-    def __init__(self, folder_to_monitor):
+    def __init__(self, folder_to_monitor, manifest_path="file_manifest.sqlite"):
         self.folder_to_monitor = folder_to_monitor
-        self.last_processed = {}
+        self.file_manifest = FileManifest(manifest_path)
         self.last_activity_time = time.time()
 
-    def get_file_hash(self, file_path):
-        """Generate a hash for file content and modification time."""
-        try:
-            file_mod_time = os.path.getmtime(file_path)
-            with open(file_path, "rb") as f:
-                file_content = f.read()
-            hash_input = file_content + str(file_mod_time).encode()
-            return hashlib.md5(hash_input).hexdigest()
-        except Exception as e:
-            print(f"Error hashing file {file_path}: {e}")
-            return None
-
     def process_file(self, file_path):
         """Process a file: read, split, embed, and store."""
         if not os.path.exists(file_path):
             return
 
-        # Detect duplicates based on hash
-        file_hash = self.get_file_hash(file_path)
-        if file_path in self.last_processed and self.last_processed[file_path] == file_hash:
+        # Stat fast path first; the file is only hashed if its stat changed
+        file_state = self.file_manifest.check(file_path)
+        if file_state is None:
             print(f"No changes detected for: {file_path}")
             return
-        self.last_processed[file_path] = file_hash
         self.last_activity_time = time.time()
 
         print(f"Processing file: {file_path}")
@@ -75,12 +64,31 @@ class FolderMonitorAgent(FileSystemEventHandler):
 
         # Read and split content
         content = self.read_file(file_path)
+        if content is not None and not content.strip():
+            # Nothing to index; record it so it is not re-read on every start
+            print(f"No content in {file_path}")
+            self.remove_file_chunks(file_path)
+            self.file_manifest.record(file_path, file_state)
+            return
         if not content:
             print(f"Failed to read content from {file_path}")
             return
 
         chunks = self.chunk_text(content)
         self.process_chunks_multithreaded(chunks, collection, file_name)
+        self.file_manifest.record(file_path, file_state)
+
+    def remove_file_chunks(self, file_path):
+        """Delete a file's chunks, and its collection once no other file's chunks are left in it."""
+        file_name = os.path.basename(file_path)
+        collection_name = self.sanitize_collection_name(file_name.split('.')[0])
+        if collection_name not in [col.name for col in chroma_client.list_collections()]:
+            return
+        collection = chroma_client.get_collection(name=collection_name, embedding_function=embedding_fn)
+        collection.delete(where={"file_name": file_name})
+        if collection.count() == 0:
+            chroma_client.delete_collection(name=collection_name)
+            print(f"Deleted collection: {collection_name}")
 
     def sanitize_collection_name(self, name):
         """Sanitize collection name for ChromaDB."""
@@ -182,6 +190,15 @@ def start_folder_monitoring(folder_to_monitor):
         print(f"Created folder: {folder_to_monitor}")
 
     event_handler = FolderMonitorAgent(folder_to_monitor)
+
+    # Reconcile the persistent manifest with the folder in one scan
+    candidates, removed = event_handler.file_manifest.reconcile(folder_to_monitor)
+    print(f"Startup scan: {len(candidates)} new or changed files, {len(removed)} removed.")
+    for file_path in removed:
+        event_handler.remove_file_chunks(file_path)
+        event_handler.file_manifest.remove(file_path)
+    for file_path in candidates:
+        event_handler.process_file(file_path)
     observer = Observer()
     observer.schedule(event_handler, folder_to_monitor, recursive=True)
 
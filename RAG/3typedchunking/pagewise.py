@@ -3,34 +3,28 @@ import re
 from PyPDF2 import PdfReader
 import pdfplumber
 import spacy
+import common_path  # puts the shared modules in common/ on sys.path
+from chunk_store import ChunkStore, store_path
 
 
-def create_folder(base_folder, pdf_name, chunk_type):
-    # Create a directory for the PDF and the chunk type
-    folder_path = os.path.join(base_folder, pdf_name, chunk_type)
-    os.makedirs(folder_path, exist_ok=True)
-    return folder_path
-
-
-def save_chunk(folder_path, chunk_name, content):
-    # Save content to a text file
-    file_path = os.path.join(folder_path, f"{chunk_name}.txt")
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(content)
-
-
-def chunk_pdf(pdf_path, output_folder):
+def chunk_pdf(pdf_path, output_folder, export_txt=False):
+    # All chunks go to one SQLite store per PDF; export_txt also writes one .txt file per chunk
     pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    reader = PdfReader(pdf_path)
-    nlp = spacy.load("en_core_web_sm")
+    with ChunkStore(store_path(output_folder, pdf_name)) as store:
+        reader = PdfReader(pdf_path)
+        nlp = spacy.load("en_core_web_sm")
+
+        # **1. Page-Wise Chunking**
+        page_chunks = []
+        for page_num, page in enumerate(reader.pages):
+            content = page.extract_text()
+            page_chunks.append((f"page_{page_num + 1}", content))
+        store.put_many("page_chunks", page_chunks)
 
-    # **1. Page-Wise Chunking**
-    page_folder = create_folder(output_folder, pdf_name, "page_chunks")
-    for page_num, page in enumerate(reader.pages):
-        content = page.extract_text()
-        save_chunk(page_folder, f"page_{page_num + 1}", content)
+        if export_txt:
+            store.export_directory(output_folder, pdf_name, ["page_chunks"])
 
-    print(f"Chunking completed for {pdf_name}. Check the folder: {output_folder}")
+    print(f"Chunking completed for {pdf_name}. Check the store: {store.path}")
 
     # **Run the script**
 if __name__ == "__main__":
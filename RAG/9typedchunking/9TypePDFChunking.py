@@ -1,111 +1,199 @@
 import os
 import re
+from functools import cached_property
 from PyPDF2 import PdfReader
 import pdfplumber
 import spacy
 from sentence_transformers import SentenceTransformer
 from sklearn.cluster import KMeans
+import common_path  # puts the shared modules in common/ on sys.path
+from chunk_store import ChunkStore, store_path
 
+_models = {}
 
-def create_folder(base_folder, pdf_name, chunk_type):
-    # Create a directory for the PDF and the chunk type
-    folder_path = os.path.join(base_folder, pdf_name, chunk_type)
-    os.makedirs(folder_path, exist_ok=True)
-    return folder_path
 
+def load_nlp():
+    # Loading the spaCy pipeline dominates small documents, so it is loaded once per process
+    if "nlp" not in _models:
+        _models["nlp"] = spacy.load("en_core_web_sm")
+    return _models["nlp"]
 
-def save_chunk(folder_path, chunk_name, content):
-    # Save content to a text file only if it doesn't already exist
-    file_path = os.path.join(folder_path, f"{chunk_name}.txt")
-    if not os.path.exists(file_path):
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
 
+def load_embedder():
+    if "embedder" not in _models:
+        _models["embedder"] = SentenceTransformer("all-MiniLM-L6-v2")
+    return _models["embedder"]
 
-def chunk_pdf(pdf_path, output_folder):
-    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    reader = PdfReader(pdf_path)
-    nlp = spacy.load("en_core_web_sm")
 
-    # **1. Page-Wise Chunking**
-    page_folder = create_folder(output_folder, pdf_name, "page_chunks")
-    for page_num, page in enumerate(reader.pages):
-        content = page.extract_text()
-        save_chunk(page_folder, f"page_{page_num + 1}", content)
+class ParsedDocument:
+    """
+    A PDF parsed once and shared by every chunking strategy.
 
-    # **2. Paragraph-Wise Chunking**
-    paragraph_folder = create_folder(output_folder, pdf_name, "paragraph_chunks")
-    for page_num, page in enumerate(reader.pages):
-        text = page.extract_text()
+    Each view (page text, tables, images, sentences) is computed on first
+    use and memoized, so strategies that are not run cost nothing. PyPDF2
+    and pdfplumber each open the file at most once; use the object as a
+    context manager (or call `close`) to release the pdfplumber handle.
+    """
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self.name = os.path.splitext(os.path.basename(pdf_path))[0]
+        self._plumber = None
+
+    @cached_property
+    def reader(self):
+        return PdfReader(self.pdf_path)
+
+    @property
+    def plumber(self):
+        if self._plumber is None:
+            self._plumber = pdfplumber.open(self.pdf_path)
+        return self._plumber
+
+    @cached_property
+    def page_texts(self):
+        return [page.extract_text() or "" for page in self.reader.pages]
+
+    @cached_property
+    def full_text(self):
+        return "\n".join(self.page_texts)
+
+    @cached_property
+    def tables(self):
+        """Per page, the tables as lists of rows."""
+        return [page.extract_tables() for page in self.plumber.pages]
+
+    @cached_property
+    def images(self):
+        """Per page, pdfplumber's image boxes."""
+        return [page.images for page in self.plumber.pages]
+
+    @cached_property
+    def sentences(self):
+        """Per page, the spaCy sentence texts."""
+        return [[sentence.text for sentence in doc.sents] for doc in load_nlp().pipe(self.page_texts)]
+
+    def close(self):
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Each strategy yields (chunk_name, content) pairs from the parsed document
+
+# **1. Page-Wise Chunking**
+def page_chunks(doc):
+    for page_num, text in enumerate(doc.page_texts):
+        yield f"page_{page_num + 1}", text
+
+
+# **2. Paragraph-Wise Chunking**
+def paragraph_chunks(doc):
+    for page_num, text in enumerate(doc.page_texts):
         paragraphs = re.split(r'\n\s*\n', text)
         for i, paragraph in enumerate(paragraphs):
-            save_chunk(paragraph_folder, f"page_{page_num + 1}_paragraph_{i + 1}", paragraph)
-
-    # **3. Sentence-Wise Chunking**
-    sentence_folder = create_folder(output_folder, pdf_name, "sentence_chunks")
-    for page_num, page in enumerate(reader.pages):
-        text = page.extract_text()
-        doc = nlp(text)
-        for i, sentence in enumerate(doc.sents):
-            save_chunk(sentence_folder, f"page_{page_num + 1}_sentence_{i + 1}", sentence.text)
-
-    # **4. Table-Based Chunking**
-    table_folder = create_folder(output_folder, pdf_name, "table_chunks")
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages):
-            tables = page.extract_tables()
-            for table_num, table in enumerate(tables):
-                # Handle None values in the table
-                table_text = "\n".join(["\t".join(cell if cell is not None else "" for cell in row) for row in table])
-                save_chunk(table_folder, f"page_{page_num + 1}_table_{table_num + 1}", table_text)
-
-    # **5. Fixed-Size Chunking**
-    fixed_chunk_folder = create_folder(output_folder, pdf_name, "fixed_size_chunks")
-    for page_num, page in enumerate(reader.pages):
-        text = page.extract_text()
+            yield f"page_{page_num + 1}_paragraph_{i + 1}", paragraph
+
+
+# **3. Sentence-Wise Chunking**
+def sentence_chunks(doc):
+    for page_num, sentences in enumerate(doc.sentences):
+        for i, sentence in enumerate(sentences):
+            yield f"page_{page_num + 1}_sentence_{i + 1}", sentence
+
+
+# **4. Table-Based Chunking**
+def table_chunks(doc):
+    for page_num, tables in enumerate(doc.tables):
+        for table_num, table in enumerate(tables):
+            # Handle None values in the table
+            table_text = "\n".join(["\t".join(cell if cell is not None else "" for cell in row) for row in table])
+            yield f"page_{page_num + 1}_table_{table_num + 1}", table_text
+
+
+# **5. Fixed-Size Chunking**
+def fixed_size_chunks(doc, chunk_size=100):
+    for page_num, text in enumerate(doc.page_texts):
         words = text.split()
-        chunk_size = 100
         for i in range(0, len(words), chunk_size):
-            chunk_text = " ".join(words[i:i + chunk_size])
-            save_chunk(fixed_chunk_folder, f"page_{page_num + 1}_chunk_{i // chunk_size + 1}", chunk_text)
-
-    # **6. Keyword-Based Chunking**
-    keyword_folder = create_folder(output_folder, pdf_name, "keyword_chunks")
-    keywords = ["Introduction", "Conclusion", "References"]
-    for page_num, page in enumerate(reader.pages):
-        text = page.extract_text()
+            yield f"page_{page_num + 1}_chunk_{i // chunk_size + 1}", " ".join(words[i:i + chunk_size])
+
+
+# **6. Keyword-Based Chunking**
+def keyword_chunks(doc, keywords=("Introduction", "Conclusion", "References")):
+    for page_num, text in enumerate(doc.page_texts):
         for keyword in keywords:
             if keyword in text:
-                chunk = text.split(keyword, 1)[1]
-                save_chunk(keyword_folder, f"page_{page_num + 1}_keyword_{keyword}", chunk)
+                yield f"page_{page_num + 1}_keyword_{keyword}", text.split(keyword, 1)[1]
+
 
-    # **7. Section-Wise Chunking**
-    section_folder = create_folder(output_folder, pdf_name, "section_chunks")
-    full_text = "\n".join([page.extract_text() for page in reader.pages])
-    sections = re.split(r'(Chapter \d+|Section \d+)', full_text)
+# **7. Section-Wise Chunking**
+def section_chunks(doc):
+    sections = re.split(r'(Chapter \d+|Section \d+)', doc.full_text)
     for i, section in enumerate(sections):
-        save_chunk(section_folder, f"section_{i + 1}", section.strip())
+        yield f"section_{i + 1}", section.strip()
 
-    # **8. Semantic Chunking**
-    semantic_folder = create_folder(output_folder, pdf_name, "semantic_chunks")
+
+# **8. Semantic Chunking**
+def semantic_chunks(doc, n_clusters=3):
     sentences = []
-    for page in reader.pages:
-        sentences.extend(page.extract_text().split("."))
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = model.encode(sentences)
-    kmeans = KMeans(n_clusters=3).fit(embeddings)
-    for cluster_id in range(3):
+    for text in doc.page_texts:
+        sentences.extend(text.split("."))
+    if not sentences:
+        # No extractable pages; KMeans cannot fit zero clusters
+        return
+    n_clusters = min(n_clusters, len(sentences))
+    embeddings = load_embedder().encode(sentences)
+    kmeans = KMeans(n_clusters=n_clusters).fit(embeddings)
+    for cluster_id in range(n_clusters):
         cluster_sentences = [sentences[i] for i in range(len(sentences)) if kmeans.labels_[i] == cluster_id]
-        save_chunk(semantic_folder, f"cluster_{cluster_id + 1}", "\n".join(cluster_sentences))
-
-    # **9. Visual Element-Based Chunking**
-    visual_folder = create_folder(output_folder, pdf_name, "visual_chunks")
-    doc = pdfplumber.open(pdf_path)
-    for page_num, page in enumerate(doc.pages):
-        images = page.images
-        save_chunk(visual_folder, f"page_{page_num + 1}_visual_info", str(images))
-
-    print(f"Chunking completed for {pdf_name}. Check the folder: {output_folder}")
+        yield f"cluster_{cluster_id + 1}", "\n".join(cluster_sentences)
+
+
+# **9. Visual Element-Based Chunking**
+def visual_chunks(doc):
+    for page_num, images in enumerate(doc.images):
+        yield f"page_{page_num + 1}_visual_info", str(images)
+
+
+# Strategy name (also its export folder) -> strategy, in the order they run
+STRATEGIES = {
+    "page_chunks": page_chunks,
+    "paragraph_chunks": paragraph_chunks,
+    "sentence_chunks": sentence_chunks,
+    "table_chunks": table_chunks,
+    "fixed_size_chunks": fixed_size_chunks,
+    "keyword_chunks": keyword_chunks,
+    "section_chunks": section_chunks,
+    "semantic_chunks": semantic_chunks,
+    "visual_chunks": visual_chunks,
+}
+
+
+def chunk_pdf(pdf_path, output_folder, strategies=None, export_txt=False):
+    """
+    Run the chosen strategies (default: all nine) over a single parse of the
+    PDF and store the chunks in <output_folder>/<pdf_name>/chunks.sqlite.
+    `export_txt` also writes the one-file-per-chunk folder layout.
+    """
+    strategies = list(STRATEGIES) if strategies is None else list(strategies)
+    unknown = [name for name in strategies if name not in STRATEGIES]
+    if unknown:
+        raise ValueError(f"Unknown chunking strategies: {unknown}. Choose from {list(STRATEGIES)}")
+
+    with ParsedDocument(pdf_path) as doc, ChunkStore(store_path(output_folder, doc.name)) as store:
+        for name in strategies:
+            # Existing chunks are kept, as the text files were never overwritten
+            store.put_many(name, STRATEGIES[name](doc), overwrite=False)
+        if export_txt:
+            store.export_directory(output_folder, doc.name, strategies)
+
+    print(f"Chunking completed for {doc.name}. Check the store: {store.path}")
 
 
 # **Run the script**
@@ -116,5 +204,5 @@ if __name__ == "__main__":
     # Ensure output folder exists
     os.makedirs(output_folder, exist_ok=True)
 
-    # Chunk the PDF
+    # Chunk the PDF; pass strategies=[...] to run only some of them
     chunk_pdf(pdf_path, output_folder)
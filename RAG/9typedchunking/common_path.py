@@ -0,0 +1,7 @@
+"""Makes the modules shared by the script folders (in common/) importable; import it before them."""
+import os
+import sys
+
+COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "common"))
+if COMMON_DIR not in sys.path:
+    sys.path.insert(0, COMMON_DIR)
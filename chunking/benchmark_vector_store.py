@@ -0,0 +1,104 @@
+"""
+Compare query latency of the NumPy exact-search store with chromadb.PersistentClient
+on the same vectors.
+
+    python benchmark_vector_store.py --rows 200000 --queries 200
+    python benchmark_vector_store.py --from-db Chroma_db --collection andhra
+
+Vectors are random unit vectors of MiniLM's dimension unless an existing
+Chroma collection is given. Recall@k is measured against exact search.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import chromadb
+from numpy_store import NumpyClient
+
+CHROMA_MAX_BATCH = 5000
+
+
+def load_vectors(args):
+    if args.from_db:
+        collection = chromadb.PersistentClient(path=args.from_db).get_collection(args.collection)
+        data = collection.get(include=["embeddings", "documents"])
+        return data["ids"], np.asarray(data["embeddings"], dtype=np.float32), data["documents"]
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.normal(size=(args.rows, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"row_{i}" for i in range(args.rows)]
+    return ids, vectors, [f"document {i}" for i in range(args.rows)]
+
+
+def fill(collection, ids, vectors, documents):
+    start = time.perf_counter()
+    for i in range(0, len(ids), CHROMA_MAX_BATCH):
+        collection.add(
+            ids=ids[i:i + CHROMA_MAX_BATCH],
+            embeddings=vectors[i:i + CHROMA_MAX_BATCH].tolist(),
+            documents=documents[i:i + CHROMA_MAX_BATCH],
+            metadatas=[{"source": "benchmark"}] * len(ids[i:i + CHROMA_MAX_BATCH]),
+        )
+    return time.perf_counter() - start
+
+
+def measure(collection, queries, k):
+    latencies = []
+    hits = []
+    for query in queries:
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=["documents", "distances"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits.append(result["ids"][0])
+    return np.array(latencies), hits
+
+
+def recall(hits, truth):
+    return np.mean([len(set(h) & set(t)) / len(t) for h, t in zip(hits, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--from-db", default=None)
+    parser.add_argument("--collection", default=None)
+    args = parser.parse_args()
+
+    ids, vectors, documents = load_vectors(args)
+    rng = np.random.default_rng(args.seed + 1)
+    noise = rng.normal(scale=0.01, size=(args.queries, vectors.shape[1])).astype(np.float32)
+    queries = vectors[rng.choice(len(vectors), size=args.queries)] + noise
+    distances = (vectors ** 2).sum(axis=1)[None, :] - 2 * queries @ vectors.T
+    truth = [[ids[j] for j in np.argsort(row)[:args.k]] for row in distances]
+    print(f"{len(ids)} vectors of dimension {vectors.shape[1]}, {args.queries} queries, k={args.k}\n")
+
+    workdir = tempfile.mkdtemp(prefix="vector_store_bench_")
+    try:
+        stores = {
+            "chroma": lambda: chromadb.PersistentClient(path=os.path.join(workdir, "chroma")),
+            "numpy-float32": lambda: NumpyClient(os.path.join(workdir, "numpy32"), dtype="float32"),
+            "numpy-int8": lambda: NumpyClient(os.path.join(workdir, "numpy8"), dtype="int8"),
+        }
+        print(f"{'backend':<15}{'load s':>9}{'open ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'recall':>9}")
+        for name, make_client in stores.items():
+            load_s = fill(make_client().get_or_create_collection("bench"), ids, vectors, documents)
+            # Reopen to measure cold-open cost, as a fresh query process would see it
+            start = time.perf_counter()
+            collection = make_client().get_collection("bench")
+            open_ms = (time.perf_counter() - start) * 1000
+            measure(collection, queries[:5], args.k)  # warm-up
+            latencies, hits = measure(collection, queries, args.k)
+            print(f"{name:<15}{load_s:>9.1f}{open_ms:>9.1f}{np.percentile(latencies, 50):>9.2f}"
+                  f"{np.percentile(latencies, 95):>9.2f}{recall(hits, truth):>9.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,13 @@
 import os
-import re
+import hashlib
 import time
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from PyPDF2 import PdfReader
-from docx import Document
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
-import pandas as pd
+from embedding_engine import get_engine
+import common_path  # puts the shared modules in common/ on sys.path
+from embedding_cache import EmbeddingCache, cached_embed
+from stream_ingest import iter_chunk_records, micro_batches
+from numpy_store import open_store
 import logging
 
 # Configure logging
@@ -22,85 +21,100 @@ def log_message(message):
     print(message)
     logging.info(message)
 
-# **Utility Functions**
-def extract_text(file_path):
-    """
-    Extract text from various file types: .txt, .pdf, .docx, .csv, .xlsx.
-    """
-    try:
-        text = ""
-        if file_path.endswith(".txt"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-        elif file_path.endswith(".pdf"):
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        elif file_path.endswith(".docx"):
-            doc = Document(file_path)
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-        elif file_path.endswith(".csv"):
-            df = pd.read_csv(file_path)
-            text = df.to_string(index=False)
-        elif file_path.endswith(".xlsx"):
-            df = pd.read_excel(file_path)
-            text = df.to_string(index=False)
-        return text
-    except Exception as e:
-        log_message(f"Error extracting text from {file_path}: {e}")
-        return ""
-
-def chunk_text(text, chunk_size=100):
-    """
-    Split text into chunks of a given size.
-    """
-    chunks = []
-    paragraphs = re.split(r'\n\s*\n', text)
-    for paragraph in paragraphs:
-        while len(paragraph) > chunk_size:
-            chunks.append(paragraph[:chunk_size])
-            paragraph = paragraph[chunk_size:]
-        if paragraph.strip():  # Avoid empty chunks
-            chunks.append(paragraph)
-    log_message(f"Chunked text into {len(chunks)} chunks.")
-    return chunks
+# Number of chunks encoded per forward pass
+EMBED_BATCH_SIZE = 64
+
+# Largest number of records sent to Chroma in a single add call
+CHROMA_MAX_BATCH = 5000
 
+# Chunks embedded and stored together while streaming a file
+STREAM_BATCH_SIZE = 256
+
+# Embeddings already computed for a chunk text are reused across files and runs; opened in __main__
+embedding_cache = None
+
+# Vector store clients, one per database path; VECTOR_BACKEND selects chroma, numpy or numpy-int8
+_clients = {}
+
+# **Utility Functions**
 def embed_chunks(chunks):
     """
-    Generate embeddings for text chunks using SentenceTransformer.
+    Generate embeddings for text chunks using the shared SentenceTransformer engine.
     """
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    embeddings = model.encode(chunks)
-    log_message(f"Generated embeddings for {len(embeddings)} chunks.")
+    engine = get_engine("all-MiniLM-L6-v2", batch_size=EMBED_BATCH_SIZE)
+    embeddings = cached_embed(embedding_cache, engine.model_name, chunks, engine.encode)
+    log_message(f"Generated embeddings for {len(embeddings)} chunks. Cache stats: {embedding_cache.stats()}")
     return embeddings
 
-def store_in_chroma(file_name, chunks, embeddings, db_path="chroma_db"):
+def get_collection(file_name, db_path="chroma_db"):
+    """The collection of a file, named after the file (without extension)."""
+    # Reuse the store client for this database path
+    if db_path not in _clients:
+        _clients[db_path] = open_store(db_path)
+    collection_name = os.path.splitext(os.path.basename(file_name))[0]
+    return collection_name, _clients[db_path].get_or_create_collection(collection_name)
+
+def store_in_chroma(file_name, chunks, embeddings, db_path="chroma_db", positions=None):
     """
-    Store chunks and embeddings in ChromaDB.
+    Store chunks and embeddings in ChromaDB and return their IDs.
+    `positions` (one dict per chunk: start_index, page, page_end) is added to the metadata;
+    chunks that are already stored get it updated if they moved.
     """
-    # Initialize ChromaDB Persistent Client
-    client = chromadb.PersistentClient(path=db_path)
-    
-    # Use the file name (without extension) as the collection name
-    collection_name = os.path.splitext(os.path.basename(file_name))[0]
-    collection = client.get_or_create_collection(collection_name)
-
-    # Add chunks and embeddings to ChromaDB
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-        # Query to check for existing documents to avoid duplication
-        existing_docs = collection.query(query_texts=[chunk], n_results=1)["documents"]
-        if not existing_docs:  # Only add if not already present
-            collection.add(
-                ids=[f"{collection_name}_chunk_{i}"],
-                metadatas=[{"source": file_name}],
-                documents=[chunk],
-                embeddings=[embedding]
+    collection_name, collection = get_collection(file_name, db_path)
+
+    # Deterministic content-hash IDs; repeated chunks within the file collapse to one
+    ids, documents, vectors, metadatas = [], [], [], []
+    seen = set()
+    positions = positions or [{} for _ in chunks]
+    for chunk, embedding, position in zip(chunks, embeddings, positions):
+        chunk_id = f"{collection_name}_{hashlib.sha1(chunk.encode('utf-8')).hexdigest()}"
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        ids.append(chunk_id)
+        documents.append(chunk)
+        vectors.append(embedding)
+        metadatas.append({"source": file_name, **position})
+
+    # One bulk existence check, then batched adds for the new chunks and upserts for moved ones
+    existing = collection.get(ids=ids, include=["metadatas"]) if ids else {"ids": [], "metadatas": []}
+    stored_metadata = dict(zip(existing["ids"], existing["metadatas"]))
+    new = [i for i, chunk_id in enumerate(ids) if chunk_id not in stored_metadata]
+    moved = [
+        i for i, chunk_id in enumerate(ids)
+        if chunk_id in stored_metadata and stored_metadata[chunk_id] != metadatas[i]
+    ]
+    for write, rows in ((collection.add, new), (collection.upsert, moved)):
+        for start in range(0, len(rows), CHROMA_MAX_BATCH):
+            batch = rows[start:start + CHROMA_MAX_BATCH]
+            write(
+                ids=[ids[i] for i in batch],
+                metadatas=[metadatas[i] for i in batch],
+                documents=[documents[i] for i in batch],
+                embeddings=[vectors[i] for i in batch]
             )
-            print(f"Added chunk {i} to collection {collection_name}: {chunk[:50]}...")
-        else:
-            print(f"Duplicate chunk {i}, not added: {chunk[:50]}...")
+    print(f"Added {len(new)} new chunks to collection {collection_name}; {len(stored_metadata)} already stored "
+          f"({len(moved)} moved).")
     print(f"Data from {file_name} successfully stored in ChromaDB as {collection_name}.")
+    return ids
+
+def remove_stale_chunks(file_name, keep_ids, db_path="chroma_db"):
+    """Delete the chunks of `file_name` that are not in `keep_ids`, i.e. left by an earlier version."""
+    _, collection = get_collection(file_name, db_path)
+    stale = []
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=CHROMA_MAX_BATCH, offset=offset)
+        if not page["ids"]:
+            break
+        stale.extend(
+            chunk_id for chunk_id, metadata in zip(page["ids"], page["metadatas"])
+            if (metadata or {}).get("source") == file_name and chunk_id not in keep_ids
+        )
+        offset += len(page["ids"])
+    for start in range(0, len(stale), CHROMA_MAX_BATCH):
+        collection.delete(ids=stale[start:start + CHROMA_MAX_BATCH])
+    return len(stale)
 
 # **Folder Monitoring**
 class FolderHandler(FileSystemEventHandler):
@@ -130,16 +144,31 @@ class FolderHandler(FileSystemEventHandler):
             self.last_file_processed_time = time.time()
             log_message(f"Processing: {file_path}")
 
-            text = extract_text(file_path)
-            log_message(f"Extracted text from {os.path.basename(file_path)}.")
-            chunks = chunk_text(text)
-            embeddings = embed_chunks(chunks)
-            store_in_chroma(file_path, chunks, embeddings, self.db_path)
+            # Stream extract -> chunk -> embed -> store in fixed-size micro-batches
+            # so memory stays flat and early chunks are searchable sooner
+            stored = 0
+            file_ids = set()
+            try:
+                records = iter_chunk_records(file_path)
+                for batch in micro_batches(records, STREAM_BATCH_SIZE):
+                    texts = [chunk for chunk, _ in batch]
+                    embeddings = embed_chunks(texts)
+                    file_ids.update(store_in_chroma(
+                        file_path, texts, embeddings, self.db_path, [position for _, position in batch]
+                    ))
+                    stored += len(batch)
+                # Only once the whole file is stored: drop chunks of earlier versions
+                removed = remove_stale_chunks(file_path, file_ids, self.db_path)
+            except Exception as e:
+                log_message(f"Error ingesting {file_path} after {stored} chunks: {e}")
+                return
+            log_message(f"Stored {stored} chunks from {os.path.basename(file_path)}; removed {removed} stale chunks.")
 
 # **Main Script**
 if __name__ == "__main__":
     folder_to_monitor = "C:/Users/srira/Desktop/GenAi2/chunking"  # Replace with your folder path
     db_path = "Chroma_db"  # Path to store the Chroma DB
+    embedding_cache = EmbeddingCache("embedding_cache.sqlite")
 
     # Ensure the folder exists
     if not os.path.exists(folder_to_monitor):
@@ -0,0 +1,66 @@
+import logging
+import threading
+import numpy as np
+
+
+class EmbeddingEngine:
+    """
+    Process-wide SentenceTransformer wrapper.
+
+    The model is loaded lazily on the first encode call and then kept warm, so
+    repeated file events only pay for encoding, not for model start-up.
+    """
+    def __init__(self, model_name="all-MiniLM-L6-v2", batch_size=64, device=None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    logging.info(f"Loading embedding model {self.model_name}")
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=None):
+        """
+        Encode texts into a float32 array of shape (len(texts), dim).
+
+        Inputs are sorted by length before batching so each batch pads to a
+        similar length; the output is returned in the original order.
+        """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        batch_size = batch_size or self.batch_size
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        sorted_texts = [texts[i] for i in order]
+
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(sorted_texts), batch_size):
+            batch = sorted_texts[start:start + batch_size]
+            encoded = self.model.encode(batch, batch_size=len(batch), convert_to_numpy=True)
+            vectors[order[start:start + len(batch)]] = encoded.astype(np.float32, copy=False)
+        return vectors
+
+
+_default_engine = None
+_default_lock = threading.Lock()
+
+
+def get_engine(model_name="all-MiniLM-L6-v2", batch_size=64):
+    """Return the shared engine for this process, creating it on first use."""
+    global _default_engine
+    with _default_lock:
+        if _default_engine is None or _default_engine.model_name != model_name:
+            _default_engine = EmbeddingEngine(model_name, batch_size=batch_size)
+        _default_engine.batch_size = batch_size
+    return _default_engine
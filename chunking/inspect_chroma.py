@@ -1,8 +1,16 @@
+import argparse
 import chromadb
+import common_path  # puts the shared modules in common/ on sys.path
+from collection_stats import database_stats, print_stats
 
-def inspect_chroma(db_path="Chroma_db"):
+def inspect_chroma(db_path="Chroma_db", stats=False):
     client = chromadb.PersistentClient(path=db_path)
 
+    # Stats mode pages through each collection instead of loading it whole
+    if stats:
+        print_stats(database_stats(client, db_path))
+        return
+
     print("Listing all stored collections and their data:")
     collection_names = client.list_collections()
     if not collection_names:
@@ -30,4 +38,8 @@ def inspect_chroma(db_path="Chroma_db"):
                 print("=" * 50)
 
 if __name__ == "__main__":
-    inspect_chroma("C:/Users/srira/Desktop/GenAi2/Chroma_db")
+    parser = argparse.ArgumentParser(description="Inspect a ChromaDB database.")
+    parser.add_argument("db_path", nargs="?", default="C:/Users/srira/Desktop/GenAi2/Chroma_db")
+    parser.add_argument("--stats", action="store_true", help="Print bounded-memory statistics instead of every record")
+    args = parser.parse_args()
+    inspect_chroma(args.db_path, stats=args.stats)
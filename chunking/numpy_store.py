@@ -0,0 +1,364 @@
+"""
+Exact-search vector store on memory-mapped NumPy files.
+
+A drop-in for the parts of the ChromaDB client and collection API that the
+ingest and query scripts use (get_or_create_collection, add, get, query,
+delete, count). Each collection is a directory holding:
+
+    vectors.bin   append-only embeddings, float32 or int8 (row-major)
+    norms.bin     float32 squared norm of each stored vector
+    scales.bin    float32 per-row scale (int8 collections only)
+    meta.sqlite   row -> id, document, metadata; tombstones; settings
+
+Opening a collection maps the files without reading them. Queries are a
+blocked matrix product over the mapped rows, split across threads, with
+`argpartition` for the top-k; distances are squared L2, as in Chroma's
+default space. Deleted rows are tombstoned and dropped by `compact()`.
+
+int8 collections take a quarter of the disk and page cache of float32 ones
+at a small recall cost; blocks are widened to float32 per query, so float32
+is the faster choice when the vectors fit in memory.
+"""
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+BLOCK_ROWS = 65536
+SQLITE_MAX_VARIABLES = 500
+INCLUDE_DEFAULT = ["documents", "metadatas"]
+
+_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="numpy-store")
+
+
+def _batches(items, size=SQLITE_MAX_VARIABLES):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _map(path, dtype, rows, dim=None):
+    """Read-only view of the first `rows` records of an append-only file."""
+    shape = (rows, dim) if dim else (rows,)
+    if rows == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class NumpyCollection:
+    def __init__(self, name, path, dtype="float32"):
+        self.name = name
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(path, "meta.sqlite"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " row INTEGER PRIMARY KEY,"
+            " id TEXT UNIQUE NOT NULL,"
+            " document TEXT,"
+            " metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tombstones (row INTEGER PRIMARY KEY)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        settings = dict(self._conn.execute("SELECT key, value FROM settings"))
+        # The dtype is fixed when the collection is created
+        self.dtype = np.dtype(settings.get("dtype", dtype))
+        if self.dtype not in (np.float32, np.int8):
+            raise ValueError(f"Unsupported dtype {self.dtype}; use float32 or int8")
+        if "dtype" not in settings:
+            self._set("dtype", self.dtype.name)
+            self._conn.commit()
+        self.dim = int(settings["dim"]) if "dim" in settings else None
+        self._rows = int(settings.get("rows", 0))
+        self._dead = np.zeros(self._rows, dtype=bool)
+        for (row,) in self._conn.execute("SELECT row FROM tombstones"):
+            self._dead[row] = True
+        self._remap()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _remap(self):
+        self._vectors = _map(self._file("vectors.bin"), self.dtype, self._rows, self.dim or 1)
+        self._norms = _map(self._file("norms.bin"), np.float32, self._rows)
+        self._scales = _map(self._file("scales.bin"), np.float32, self._rows) if self.dtype == np.int8 else None
+
+    def _append(self, name, array):
+        """Append rows after the last committed row, dropping bytes left by an interrupted add."""
+        offset = self._rows * (array.nbytes // len(array))
+        path = self._file(name)
+        with open(path, "ab") as f:
+            if os.path.getsize(path) > offset:
+                f.truncate(offset)
+            f.write(array.tobytes())
+
+    def _set(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _quantize(self, vectors):
+        """Symmetric per-row int8 quantization; returns (codes, scales)."""
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _decode(self, rows):
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows][:, None]
+        return block
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def _existing(self, ids):
+        found = {}
+        for batch in _batches(list(ids)):
+            placeholders = ",".join("?" * len(batch))
+            for chunk_id, row in self._conn.execute(
+                f"SELECT id, row FROM records WHERE id IN ({placeholders})", batch
+            ):
+                found[chunk_id] = row
+        return found
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        """Append records; IDs that already exist are skipped, as in Chroma."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("embeddings must be a 2-D array with one row per id")
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._set("dim", self.dim)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+
+            existing = self._existing(ids)
+            keep = []
+            seen = set()
+            for i, chunk_id in enumerate(ids):
+                if chunk_id not in existing and chunk_id not in seen:
+                    seen.add(chunk_id)
+                    keep.append(i)
+            if not keep:
+                return
+            vectors = vectors[keep]
+
+            # Vectors go to disk before the rows that reference them are committed
+            if self.dtype == np.int8:
+                codes, scales = self._quantize(vectors)
+                norms = ((codes.astype(np.float32) * scales[:, None]) ** 2).sum(axis=1)
+                self._append("scales.bin", scales)
+            else:
+                codes = vectors
+                norms = (vectors ** 2).sum(axis=1)
+            self._append("vectors.bin", np.ascontiguousarray(codes))
+            self._append("norms.bin", norms.astype(np.float32))
+
+            start = self._rows
+            self._conn.executemany(
+                "INSERT INTO records (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (start + n, ids[i], documents[i], json.dumps(metadatas[i]) if metadatas[i] is not None else None)
+                    for n, i in enumerate(keep)
+                ],
+            )
+            self._rows += len(keep)
+            self._set("rows", self._rows)
+            self._conn.commit()
+            self._dead = np.concatenate([self._dead, np.zeros(len(keep), dtype=bool)])
+            self._remap()
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        with self._lock:
+            self.delete(ids=list(ids))
+            self.add(ids, embeddings, documents, metadatas)
+
+    def delete(self, ids=None):
+        """Tombstone records; the space is reclaimed by `compact()`."""
+        with self._lock:
+            rows = list(self._existing(ids or []).values())
+            if not rows:
+                return
+            for batch in _batches(rows):
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(f"DELETE FROM records WHERE row IN ({placeholders})", batch)
+            self._conn.executemany("INSERT OR IGNORE INTO tombstones (row) VALUES (?)", [(r,) for r in rows])
+            self._conn.commit()
+            self._dead[rows] = True
+
+    def _lookup(self, rows):
+        """row -> (id, document, metadata) for the live rows among `rows`."""
+        found = {}
+        for batch in _batches(rows):
+            placeholders = ",".join("?" * len(batch))
+            for row, chunk_id, document, metadata in self._conn.execute(
+                f"SELECT row, id, document, metadata FROM records WHERE row IN ({placeholders})", batch
+            ):
+                found[row] = (chunk_id, document, json.loads(metadata) if metadata else None)
+        return found
+
+    def get(self, ids=None, include=INCLUDE_DEFAULT, limit=None, offset=None):
+        """Records by ID, or a page of all records in insertion order."""
+        with self._lock:
+            if ids is not None:
+                existing = self._existing(ids)
+                pairs = [(chunk_id, existing[chunk_id]) for chunk_id in ids if chunk_id in existing]
+            else:
+                pairs = self._conn.execute(
+                    "SELECT id, row FROM records ORDER BY row LIMIT ? OFFSET ?",
+                    (-1 if limit is None else limit, offset or 0),
+                ).fetchall()
+            rows = [row for _, row in pairs]
+            found = self._lookup(rows) if {"documents", "metadatas"} & set(include) else {}
+            embeddings = None
+            if "embeddings" in include:
+                embeddings = self._decode(np.asarray(rows, dtype=np.int64)) if rows else np.empty((0, self.dim or 0))
+        return {
+            "ids": [chunk_id for chunk_id, _ in pairs],
+            "documents": [found[row][1] for row in rows] if "documents" in include else None,
+            "metadatas": [found[row][2] for row in rows] if "metadatas" in include else None,
+            "embeddings": embeddings,
+        }
+
+    def _search_block(self, snapshot, start, stop, queries, query_norms, k):
+        vectors, norms, scales, dead = snapshot
+        block = np.asarray(vectors[start:stop], dtype=np.float32)
+        scores = block @ queries.T
+        if scales is not None:
+            scores *= scales[start:stop][:, None]
+        distances = norms[start:stop][:, None] - 2 * scores + query_norms[None, :]
+        distances[dead[start:stop]] = np.inf
+        top = min(k, stop - start)
+        part = np.argpartition(distances, top - 1, axis=0)[:top]
+        return part + start, np.take_along_axis(distances, part, axis=0)
+
+    def query(self, query_embeddings, n_results=10, include=["documents", "metadatas", "distances"]):
+        """Exact top-k by squared L2 distance for each query embedding."""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            snapshot = (self._vectors, self._norms, self._scales, self._dead)
+            rows = self._rows
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if rows == 0 or n_results <= 0:
+            for field in result:
+                result[field] = [[] for _ in queries] if field == "ids" or field in include else None
+            return result
+        query_norms = (queries ** 2).sum(axis=1)
+
+        futures = [
+            _pool.submit(self._search_block, snapshot, start, min(start + BLOCK_ROWS, rows), queries, query_norms, n_results)
+            for start in range(0, rows, BLOCK_ROWS)
+        ]
+        parts = [future.result() for future in futures]
+        candidates = np.concatenate([p[0] for p in parts], axis=0)
+        distances = np.concatenate([p[1] for p in parts], axis=0)
+
+        for q in range(len(queries)):
+            order = np.argsort(distances[:, q], kind="stable")[:n_results]
+            order = order[np.isfinite(distances[order, q])]
+            hit_rows = candidates[order, q].tolist()
+            with self._lock:
+                found = self._lookup(hit_rows)
+            # Rows deleted after the snapshot was taken are dropped
+            live = [i for i, row in enumerate(hit_rows) if row in found]
+            result["ids"].append([found[hit_rows[i]][0] for i in live])
+            result["documents"].append([found[hit_rows[i]][1] for i in live])
+            result["metadatas"].append([found[hit_rows[i]][2] for i in live])
+            result["distances"].append([float(distances[order[i], q]) for i in live])
+        for field in ("documents", "metadatas", "distances"):
+            if field not in include:
+                result[field] = None
+        return result
+
+    def compact(self):
+        """Rewrite the files without tombstoned rows and renumber the records."""
+        with self._lock:
+            live_rows = np.flatnonzero(~self._dead)
+            suffix = ".compact"
+            with open(self._file("vectors.bin" + suffix), "wb") as f:
+                for start in range(0, len(live_rows), BLOCK_ROWS):
+                    f.write(np.ascontiguousarray(self._vectors[live_rows[start:start + BLOCK_ROWS]]).tobytes())
+            np.asarray(self._norms[live_rows], dtype=np.float32).tofile(self._file("norms.bin" + suffix))
+            if self._scales is not None:
+                np.asarray(self._scales[live_rows], dtype=np.float32).tofile(self._file("scales.bin" + suffix))
+
+            # Ascending renumbering never collides with a row that has not moved yet
+            self._conn.executemany(
+                "UPDATE records SET row = ? WHERE row = ?",
+                [(new, int(old)) for new, old in enumerate(live_rows) if new != old],
+            )
+            self._conn.execute("DELETE FROM tombstones")
+            self._rows = len(live_rows)
+            self._set("rows", self._rows)
+
+            # Release the maps before replacing the files (required on Windows)
+            self._vectors = self._norms = self._scales = None
+            for name in ("vectors.bin", "norms.bin", "scales.bin"):
+                if os.path.exists(self._file(name + suffix)):
+                    os.replace(self._file(name + suffix), self._file(name))
+            self._conn.commit()
+            self._dead = np.zeros(self._rows, dtype=bool)
+            self._remap()
+            return self._rows
+
+
+class NumpyClient:
+    """Directory of NumpyCollections with the subset of the Chroma client API the scripts use."""
+    def __init__(self, path, dtype="float32"):
+        self.path = path
+        self.dtype = dtype
+        self._collections = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def list_collections(self):
+        return sorted(
+            name for name in os.listdir(self.path)
+            if os.path.exists(os.path.join(self.path, name, "meta.sqlite"))
+        )
+
+    def get_collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                if not os.path.exists(os.path.join(self.path, name, "meta.sqlite")):
+                    raise ValueError(f"Collection {name} does not exist.")
+                self._collections[name] = NumpyCollection(name, os.path.join(self.path, name), self.dtype)
+            return self._collections[name]
+
+    def get_or_create_collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = NumpyCollection(name, os.path.join(self.path, name), self.dtype)
+            return self._collections[name]
+
+    def delete_collection(self, name):
+        import shutil
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection._conn.close()
+                collection._vectors = collection._norms = collection._scales = None
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+
+def open_store(path, backend=None):
+    """
+    Client for `path` using the configured backend: "chroma" (default),
+    "numpy" (float32) or "numpy-int8". Set VECTOR_BACKEND to switch scripts.
+    """
+    backend = backend or os.getenv("VECTOR_BACKEND", "chroma")
+    if backend == "chroma":
+        import chromadb
+        return chromadb.PersistentClient(path=path)
+    if backend == "numpy":
+        return NumpyClient(path, dtype="float32")
+    if backend == "numpy-int8":
+        return NumpyClient(path, dtype="int8")
+    raise ValueError(f"Unknown vector backend: {backend}")
@@ -1,24 +1,52 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
+import json
+import urllib.request
+from numpy_store import open_store
+import common_path  # puts the shared modules in common/ on sys.path
+from corpus_search import CorpusSearcher
+from embedding_engine import get_engine
 
-def query_chroma(collection_name, query_text, db_path="Chroma_db"):
+# Clients are reused across calls so loops over query_chroma stay warm
+_clients = {}
+
+def get_client(db_path):
+    if db_path not in _clients:
+        _clients[db_path] = open_store(db_path)
+    return _clients[db_path]
+
+def query_service(service_url, collection_name, queries, n_results=3):
     """
-    Query ChromaDB for documents similar to the provided query text.
+    Send a batch of queries to a running query_service.py daemon.
     """
-    # Initialize ChromaDB client
-    client = chromadb.PersistentClient(path=db_path)
-    collection = client.get_collection(collection_name)
-
-    # Generate embedding for the query text using SentenceTransformer
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    query_embedding = model.encode([query_text])[0]
-
-    # Query the collection
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=3,  # Return top 3 results
-        include=["documents", "metadatas", "distances"]  # Valid fields only
+    payload = json.dumps({"collection": collection_name, "queries": queries, "n_results": n_results})
+    request = urllib.request.Request(
+        f"{service_url.rstrip('/')}/query",
+        data=payload.encode("utf-8"),
+        headers={"Content-Type": "application/json"},
     )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def query_chroma(collection_name, query_text, db_path="Chroma_db", service_url=None):
+    """
+    Query ChromaDB for documents similar to the provided query text.
+    If `service_url` is given, the warm query daemon answers instead.
+    """
+    if service_url:
+        results = query_service(service_url, collection_name, [query_text], n_results=3)
+    else:
+        # Initialize ChromaDB client
+        client = get_client(db_path)
+        collection = client.get_collection(collection_name)
+
+        # Generate embedding for the query text using the shared SentenceTransformer engine
+        query_embedding = get_engine("all-MiniLM-L6-v2").encode([query_text])[0]
+
+        # Query the collection
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=3,  # Return top 3 results
+            include=["documents", "metadatas", "distances"]  # Valid fields only
+        )
 
     # Display the query results
     print("Query Results:")
@@ -28,6 +56,28 @@ def query_chroma(collection_name, query_text, db_path="Chroma_db"):
         print(f"Distance: {results['distances'][i]}")
         print("=" * 50)
 
+# One searcher per database keeps the collection list and handles cached between calls
+_searchers = {}
+
+def query_corpus(query_text, db_path="Chroma_db", top_k=5, collections=None, pattern=None):
+    """
+    Query all collections (or those named in `collections` / matching the
+    glob `pattern`) concurrently and print the global top-k results.
+    """
+    if db_path not in _searchers:
+        _searchers[db_path] = CorpusSearcher(get_client(db_path), get_engine("all-MiniLM-L6-v2").encode)
+    response = _searchers[db_path].search(query_text, top_k=top_k, collections=collections, pattern=pattern)
+
+    print(f"Corpus Results across {len(response['latency_ms'])} collections:")
+    for i, hit in enumerate(response["results"]):
+        print(f"Result {i + 1} [{hit['collection']}]: {hit['document'][:50]}...")
+        print(f"Metadata: {hit['metadata']}")
+        print(f"Distance: {hit['distance']}")
+        print("=" * 50)
+    for name, ms in sorted(response["latency_ms"].items(), key=lambda item: -item[1]):
+        print(f"{name}: {ms:.1f} ms")
+    return response
+
 if __name__ == "__main__":
     # Replace with your query text
     query_text = "Nara Chandrababu Naidu"
@@ -0,0 +1,133 @@
+import os
+import re
+import sqlite3
+import threading
+
+PAGE_PATTERN = re.compile(r"^page_(\d+)")
+ORDINAL_PATTERN = re.compile(r"_(\d+)$")
+
+
+def parse_chunk_name(chunk_name):
+    """(page, ordinal) encoded in names like "page_3_sentence_12" or "section_4"; None where absent."""
+    page = PAGE_PATTERN.match(chunk_name)
+    ordinal = ORDINAL_PATTERN.search(chunk_name)
+    page = int(page.group(1)) if page else None
+    ordinal = int(ordinal.group(1)) if ordinal else None
+    # "page_7" is the page itself, not an ordinal within it
+    if page is not None and chunk_name == f"page_{page}":
+        ordinal = None
+    return page, ordinal
+
+
+class ChunkStore:
+    """
+    All chunks of one PDF in a single SQLite file instead of one .txt file
+    per chunk.
+
+    Rows are keyed by (strategy, chunk name) and indexed by page and
+    ordinal, so a single chunk can be read by key and a strategy can be
+    streamed in document order. `export_directory` writes the old
+    <pdf_name>/<strategy>/<chunk_name>.txt layout when files are needed.
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " strategy TEXT NOT NULL,"
+            " chunk_name TEXT NOT NULL,"
+            " page INTEGER,"
+            " ordinal INTEGER,"
+            " content TEXT NOT NULL,"
+            " PRIMARY KEY (strategy, chunk_name))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_position ON chunks (strategy, page, ordinal)")
+        self._conn.commit()
+
+    def put_many(self, strategy, chunks, overwrite=True):
+        """
+        Store (chunk_name, content) pairs for a strategy in one transaction.
+        With `overwrite=False` existing chunks are kept, as the old
+        write-if-missing text files were. Returns the number of chunks given.
+        """
+        rows = []
+        for chunk_name, content in chunks:
+            page, ordinal = parse_chunk_name(chunk_name)
+            rows.append((strategy, chunk_name, page, ordinal, content or ""))
+        verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+        with self._lock:
+            self._conn.executemany(
+                f"{verb} INTO chunks (strategy, chunk_name, page, ordinal, content) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def put(self, strategy, chunk_name, content, overwrite=True):
+        self.put_many(strategy, [(chunk_name, content)], overwrite)
+
+    def get(self, strategy, chunk_name):
+        """Content of one chunk, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM chunks WHERE strategy = ? AND chunk_name = ?", (strategy, chunk_name)
+            ).fetchone()
+        return row[0] if row else None
+
+    def strategies(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT strategy FROM chunks ORDER BY strategy")]
+
+    def count(self, strategy=None):
+        with self._lock:
+            if strategy is None:
+                return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM chunks WHERE strategy = ?", (strategy,)).fetchone()[0]
+
+    def iter_chunks(self, strategy, page=None, page_size=1000):
+        """
+        Yield (chunk_name, page, ordinal, content) in document order,
+        optionally for one page only, reading `page_size` rows at a time.
+        """
+        query = "SELECT chunk_name, page, ordinal, content FROM chunks WHERE strategy = ?"
+        params = [strategy]
+        if page is not None:
+            query += " AND page = ?"
+            params.append(page)
+        query += " ORDER BY page, ordinal, chunk_name"
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(page_size)
+            if not rows:
+                break
+            yield from rows
+
+    def export_directory(self, output_folder, pdf_name, strategies=None):
+        """Write every chunk as <output_folder>/<pdf_name>/<strategy>/<chunk_name>.txt."""
+        written = 0
+        for strategy in strategies or self.strategies():
+            folder_path = os.path.join(output_folder, pdf_name, strategy)
+            os.makedirs(folder_path, exist_ok=True)
+            for chunk_name, _, _, content in self.iter_chunks(strategy):
+                with open(os.path.join(folder_path, f"{chunk_name}.txt"), "w", encoding="utf-8") as f:
+                    f.write(content)
+                written += 1
+        return written
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def store_path(output_folder, pdf_name):
+    """Where the chunk store of one PDF lives."""
+    return os.path.join(output_folder, pdf_name, "chunks.sqlite")
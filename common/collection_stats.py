@@ -0,0 +1,134 @@
+"""
+Bounded-memory health statistics for a Chroma database.
+
+Each collection is read one page at a time, and collections are processed
+in parallel. Per collection: document count, embedding dimension, norm
+summary (min/mean/std/max plus percentiles from a fixed-size reservoir),
+duplicate-text rate and chunks per source. The database directory size
+is reported once, since Chroma does not keep collections in separate files.
+"""
+import hashlib
+import os
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+PAGE_SIZE = 1000
+NORM_RESERVOIR = 10000
+
+
+def directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _text_key(text):
+    # 8-byte digests keep the duplicate check at 8 bytes per document
+    return int.from_bytes(hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def collection_stats(collection, page_size=PAGE_SIZE, seed=0):
+    """Stats for one collection, reading `page_size` records at a time."""
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    count = collection.count()
+    dim = None
+    seen = 0
+    norm_sum = norm_sq_sum = 0.0
+    norm_min, norm_max = float("inf"), 0.0
+    reservoir = np.empty(NORM_RESERVOIR, dtype=np.float32)
+    text_keys = array("Q")
+    sources = Counter()
+    sample = None
+
+    offset = 0
+    while offset < count:
+        page = collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        offset += len(page["ids"])
+        if sample is None and page["documents"]:
+            sample = page["documents"][0]
+        text_keys.extend(_text_key(doc) for doc in page["documents"])
+        sources.update((meta or {}).get("source", "<none>") for meta in page["metadatas"])
+
+        vectors = page["embeddings"]
+        if vectors is None or not len(vectors):
+            continue
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1]
+        norms = np.linalg.norm(vectors, axis=1)
+        norm_sum += float(norms.sum())
+        norm_sq_sum += float((norms.astype(np.float64) ** 2).sum())
+        norm_min = min(norm_min, float(norms.min()))
+        norm_max = max(norm_max, float(norms.max()))
+        # Uniform reservoir sample of norms for the percentiles
+        fill = max(0, min(NORM_RESERVOIR - seen, len(norms)))
+        reservoir[seen:seen + fill] = norms[:fill]
+        positions = np.arange(seen + fill, seen + len(norms)) + 1
+        slots = rng.integers(positions)
+        keep = slots < NORM_RESERVOIR
+        reservoir[slots[keep]] = norms[fill:][keep]
+        seen += len(norms)
+
+    documents = len(text_keys)
+    unique = len(np.unique(np.frombuffer(text_keys, dtype=np.uint64))) if documents else 0
+    report = {
+        "name": collection.name,
+        "count": count,
+        "dim": dim,
+        "duplicate_rate": (documents - unique) / documents if documents else 0.0,
+        "sources": dict(sources.most_common()),
+        "sample": sample,
+        "seconds": time.perf_counter() - start,
+    }
+    if seen:
+        mean = norm_sum / seen
+        report["norms"] = {
+            "min": norm_min,
+            "mean": mean,
+            "std": max(norm_sq_sum / seen - mean ** 2, 0.0) ** 0.5,
+            "max": norm_max,
+            "percentiles": dict(zip(
+                ("p5", "p50", "p95"), np.percentile(reservoir[:min(seen, NORM_RESERVOIR)], [5, 50, 95]).tolist()
+            )),
+        }
+    return report
+
+
+def database_stats(client, db_path, page_size=PAGE_SIZE, workers=4):
+    """Stats for every collection, computed `workers` collections at a time."""
+    # Older chromadb returns Collection objects, newer returns names
+    names = [getattr(c, "name", c) for c in client.list_collections()]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reports = list(pool.map(lambda name: collection_stats(client.get_collection(name), page_size), names))
+    return {"db_path": db_path, "disk_bytes": directory_size(db_path), "collections": reports}
+
+
+def print_stats(stats, top_sources=5):
+    print(f"Database: {stats['db_path']} ({stats['disk_bytes'] / 2**20:.1f} MiB on disk, "
+          f"{len(stats['collections'])} collections)")
+    for report in stats["collections"]:
+        print(f"\nCollection: {report['name']}")
+        print(f"  Documents: {report['count']}")
+        print(f"  Embedding dimension: {report['dim']}")
+        if "norms" in report:
+            norms = report["norms"]
+            pct = norms["percentiles"]
+            print(f"  Norms: min {norms['min']:.4f}, mean {norms['mean']:.4f} (std {norms['std']:.4f}), "
+                  f"max {norms['max']:.4f}; p5 {pct['p5']:.4f}, p50 {pct['p50']:.4f}, p95 {pct['p95']:.4f}")
+        print(f"  Duplicate text rate: {report['duplicate_rate']:.2%}")
+        print(f"  Sources: {len(report['sources'])}")
+        for source, chunks in list(report["sources"].items())[:top_sources]:
+            print(f"    {source}: {chunks} chunks")
+        if report["sample"]:
+            print(f"  Sample Document: {report['sample'][:50]}...")
+        print(f"  Scanned in {report['seconds']:.2f} s")
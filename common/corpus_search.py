@@ -0,0 +1,123 @@
+import fnmatch
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CorpusSearcher:
+    """
+    Search every per-file collection in a Chroma database at once.
+
+    The query is embedded once, each selected collection is queried on a
+    thread pool, and the hits are merged into one global top-k by distance.
+    Distances are only comparable across collections built with the same
+    embedding model, which holds for each ingester's database.
+    """
+    def __init__(self, client, embed_fn, max_workers=8, collections_ttl=30.0):
+        self.client = client
+        self.embed_fn = embed_fn
+        self.max_workers = max_workers
+        self.collections_ttl = collections_ttl
+        self._names = None
+        self._names_loaded_at = 0.0
+        self._handles = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="corpus-search")
+
+    def collection_names(self, refresh=False):
+        """Collection names, re-listed at most once per `collections_ttl` seconds."""
+        with self._lock:
+            expired = time.monotonic() - self._names_loaded_at > self.collections_ttl
+            if refresh or self._names is None or expired:
+                # Older chromadb returns Collection objects, newer returns names
+                self._names = sorted(getattr(c, "name", c) for c in self.client.list_collections())
+                self._names_loaded_at = time.monotonic()
+                self._handles = {name: h for name, h in self._handles.items() if name in self._names}
+            return list(self._names)
+
+    def _collection(self, name):
+        with self._lock:
+            if name not in self._handles:
+                self._handles[name] = self.client.get_collection(name)
+            return self._handles[name]
+
+    def select(self, collections=None, pattern=None):
+        """Known collections, optionally restricted to `collections` and a glob `pattern`."""
+        names = self.collection_names()
+        if collections is not None:
+            wanted = set(collections)
+            names = [name for name in names if name in wanted]
+        if pattern:
+            names = fnmatch.filter(names, pattern)
+        return names
+
+    def _query_one(self, name, embeddings, n_results):
+        start = time.perf_counter()
+        try:
+            results = self._collection(name).query(
+                query_embeddings=embeddings,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"],
+            )
+        except Exception:
+            # The collection may have been dropped or recreated since it was opened
+            with self._lock:
+                self._handles.pop(name, None)
+            raise
+        return results, (time.perf_counter() - start) * 1000
+
+    def search_batch(self, queries, top_k=5, collections=None, pattern=None):
+        """
+        Run several queries across the selected collections.
+
+        Returns a dict with `results` (one merged top-k hit list per query),
+        `latency_ms` per collection, `errors` per failed collection and the
+        time spent embedding.
+        """
+        names = self.select(collections, pattern)
+        start = time.perf_counter()
+        embeddings = [list(map(float, e)) for e in self.embed_fn(queries)]
+        embed_ms = (time.perf_counter() - start) * 1000
+
+        futures = {name: self._pool.submit(self._query_one, name, embeddings, top_k) for name in names}
+        hits = [[] for _ in queries]
+        latency_ms = {}
+        errors = {}
+        for name, future in futures.items():
+            try:
+                results, latency_ms[name] = future.result()
+            except Exception as e:
+                logging.error(f"Search failed for collection {name}: {e}")
+                errors[name] = str(e)
+                continue
+            for q in range(len(queries)):
+                for id_, doc, meta, dist in zip(
+                    results["ids"][q], results["documents"][q], results["metadatas"][q], results["distances"][q]
+                ):
+                    hits[q].append({
+                        "collection": name,
+                        "id": id_,
+                        "document": doc,
+                        "metadata": meta,
+                        "distance": dist,
+                    })
+
+        merged = [heapq.nsmallest(top_k, query_hits, key=lambda hit: hit["distance"]) for query_hits in hits]
+        return {
+            "results": merged,
+            "latency_ms": latency_ms,
+            "errors": errors,
+            "embed_ms": embed_ms,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+
+    def search(self, query_text, top_k=5, collections=None, pattern=None):
+        """Single-query form of `search_batch`; `results` is one hit list."""
+        response = self.search_batch([query_text], top_k, collections, pattern)
+        response["results"] = response["results"][0]
+        return response
+
+    def close(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def text_hash(text):
+    """Content address of a chunk of text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, sha256 of the chunk text).
+
+    Vectors are stored as float32 blobs in SQLite. When the cache grows past
+    `max_entries`, the least recently used rows are evicted down to 90% of the
+    bound. Hit and miss counters cover the lifetime of this object.
+    """
+    def __init__(self, path="embedding_cache.sqlite", max_entries=500000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model, texts):
+        """Return a list aligned with `texts` holding cached vectors or None."""
+        hashes = [text_hash(t) for t in texts]
+        found = {}
+        with self._lock:
+            unique = list(set(hashes))
+            for start in range(0, len(unique), 500):
+                part = unique[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    hit_marks = ",".join("?" * len(rows))
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash IN ({hit_marks})",
+                        [time.time(), model, *(h for h, _ in rows)],
+                    )
+            self._conn.commit()
+            results = [found.get(h) for h in hashes]
+            hit_count = sum(r is not None for r in results)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model, texts, vectors):
+        """Store vectors for texts, evicting old entries if the bound is exceeded."""
+        now = time.time()
+        rows = [
+            (model, text_hash(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors) if v is not None
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._size += self._conn.total_changes - before
+            if self._size > self.max_entries:
+                self._evict(self._size - int(self.max_entries * 0.9))
+            self._conn.commit()
+
+    def _evict(self, count):
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN"
+            " (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (count,),
+        )
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logging.info(f"Evicted {count} entries from embedding cache {self.path}.")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def cached_embed(cache, model, texts, embed_fn):
+    """
+    Embed texts through the cache.
+
+    Only texts that miss the cache are passed to `embed_fn`, each distinct text
+    once. Returns one float32 vector (or None if `embed_fn` gave none) per input.
+    """
+    results = cache.get_many(model, texts)
+    missing = {}
+    for i, vector in enumerate(results):
+        if vector is None:
+            missing.setdefault(texts[i], []).append(i)
+    if missing:
+        todo = list(missing)
+        fresh = embed_fn(todo)
+        cache.put_many(model, todo, fresh)
+        for text, vector in zip(todo, fresh):
+            if vector is None:
+                continue
+            vector = np.asarray(vector, dtype=np.float32)
+            for i in missing[text]:
+                results[i] = vector
+    return results
+
+
+class CachedEmbeddings:
+    """
+    Drop-in wrapper for LangChain embedding models that checks the cache first.
+
+    Query embeddings are kept in a small in-memory LRU, so the stages that
+    embed the same question in one request (answer cache lookup, dense
+    retrieval, MMR) share a single forward pass.
+    """
+    def __init__(self, embeddings, cache, model_name, query_cache_size=256):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+        self.query_cache_size = query_cache_size
+        self._queries = OrderedDict()
+        self._queries_lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        vectors = cached_embed(self.cache, self.model_name, texts, self.embeddings.embed_documents)
+        return [v.tolist() for v in vectors]
+
+    def embed_query(self, text):
+        with self._queries_lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                return list(vector)
+        vector = self.embeddings.embed_query(text)
+        with self._queries_lock:
+            self._queries[text] = list(vector)
+            while len(self._queries) > self.query_cache_size:
+                self._queries.popitem(last=False)
+        return vector
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+def file_digest(file_path, block_size=1 << 20):
+    """Streaming blake2b digest of a file's content."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat_key(st):
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class FileManifest:
+    """
+    On-disk record of processed files: size, mtime_ns, inode and content digest.
+
+    A file whose stat matches its record is treated as unchanged without
+    reading it. Otherwise the file is hashed, and only a changed digest marks
+    it for processing; this survives restarts, unlike an in-memory dict.
+    """
+    def __init__(self, path="file_manifest.sqlite"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " processed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _get(self, file_path):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT size, mtime_ns, inode, digest FROM files WHERE path = ?", (file_path,)
+            ).fetchone()
+
+    def __contains__(self, file_path):
+        return self._get(file_path) is not None
+
+    def check(self, file_path):
+        """
+        Return None if the file is unchanged since it was recorded, otherwise
+        the new state to pass to `record` once the file has been processed.
+        """
+        st = os.stat(file_path)
+        row = self._get(file_path)
+        if row is not None and tuple(row[:3]) == _stat_key(st):
+            return None
+        digest = file_digest(file_path)
+        if row is not None and row[3] == digest:
+            # Touched but not modified: refresh the stat so the next check is fast
+            self.record(file_path, (*_stat_key(st), digest))
+            return None
+        return (*_stat_key(st), digest)
+
+    def record(self, file_path, state):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, digest, processed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (file_path, *state, time.time()),
+            )
+            self._conn.commit()
+
+    def remove(self, file_path):
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (file_path,))
+            self._conn.commit()
+
+    def reconcile(self, folder_path):
+        """
+        Compare the manifest with the files under `folder_path`, including
+        subfolders (the observers watch recursively), in one scan.
+
+        Returns (candidates, removed): files that are new or whose stat differs
+        from the record, and recorded files that no longer exist.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size, mtime_ns, inode FROM files").fetchall()
+        prefix = os.path.join(os.path.abspath(folder_path), "")
+        known = {
+            path: (size, mtime_ns, inode) for path, size, mtime_ns, inode in rows
+            if os.path.abspath(path).startswith(prefix)
+        }
+        candidates = []
+        folders = [folder_path]
+        while folders:
+            with os.scandir(folders.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        folders.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    file_path = entry.path
+                    record = known.pop(file_path, None)
+                    # DirEntry.stat() reports st_ino as 0 on Windows; fall back to os.stat
+                    st = entry.stat() if os.name != "nt" else os.stat(file_path)
+                    if record != _stat_key(st):
+                        candidates.append(file_path)
+        return candidates, list(known)
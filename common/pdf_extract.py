@@ -0,0 +1,196 @@
+import bisect
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Documents shorter than this are extracted in-process; the pool is not worth it.
+# Longer ones go to spawned worker processes, which re-import the calling script
+# as __mp_main__: scripts using this module must not load models, open stores or
+# require API keys at import time (keep that under `if __name__ == "__main__":`).
+PARALLEL_MIN_PAGES = 32
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn on every platform: forking a process that runs watcher and
+            # ingest threads can copy held locks into the children
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+class _PlumberFallback:
+    """Opens the document with pdfplumber on first use, for pages PyPDF2 cannot read."""
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.pdf = None
+
+    def page_text(self, number):
+        try:
+            if self.pdf is None:
+                import pdfplumber
+                self.pdf = pdfplumber.open(self.file_path)
+            return self.pdf.pages[number].extract_text() or ""
+        except Exception as e:
+            logging.warning(f"pdfplumber could not extract page {number + 1} of {self.file_path}: {e}")
+            return ""
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+
+
+def _iter_range(file_path, start, stop):
+    """Yield the text of pages [start, stop) in order."""
+    from PyPDF2 import PdfReader
+    try:
+        reader = PdfReader(file_path)
+    except Exception:
+        reader = None
+    fallback = _PlumberFallback(file_path)
+    try:
+        for number in range(start, stop):
+            text = ""
+            if reader is not None:
+                try:
+                    text = reader.pages[number].extract_text() or ""
+                except Exception:
+                    text = ""
+            if not text:
+                text = fallback.page_text(number)
+            yield text
+    finally:
+        fallback.close()
+
+
+def _extract_range(file_path, start, stop):
+    """Extract pages [start, stop); runs in a worker process for large files."""
+    return list(_iter_range(file_path, start, stop))
+
+
+def count_pages(file_path):
+    try:
+        from PyPDF2 import PdfReader
+        return len(PdfReader(file_path).pages)
+    except Exception:
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+
+
+def extract_pdf_pages(file_path, workers=None):
+    """
+    Return the text of every page of a PDF, in page order.
+
+    Large documents are split into contiguous page ranges that are extracted
+    in parallel by a shared process pool. Pages PyPDF2 cannot read fall back
+    to pdfplumber individually.
+    """
+    page_count = count_pages(file_path)
+    workers = workers or os.cpu_count() or 1
+    if page_count < PARALLEL_MIN_PAGES or workers == 1:
+        return _extract_range(file_path, 0, page_count)
+
+    step = -(-page_count // workers)
+    pool = _get_pool(workers)
+    futures = [
+        pool.submit(_extract_range, file_path, start, min(start + step, page_count))
+        for start in range(0, page_count, step)
+    ]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def iter_pdf_pages(file_path, workers=None, pages_per_task=16):
+    """
+    Yield page texts in order without holding the whole document.
+
+    Large documents are extracted in small page ranges by the process pool,
+    with only a bounded number of ranges in flight ahead of the consumer.
+    """
+    page_count = count_pages(file_path)
+    workers = workers or os.cpu_count() or 1
+    if page_count < PARALLEL_MIN_PAGES or workers == 1:
+        yield from _iter_range(file_path, 0, page_count)
+        return
+
+    pool = _get_pool(workers)
+    starts = iter(range(0, page_count, pages_per_task))
+    pending = []
+    for start in starts:
+        pending.append(pool.submit(_extract_range, file_path, start, min(start + pages_per_task, page_count)))
+        if len(pending) >= 2 * workers:
+            break
+    while pending:
+        pages = pending.pop(0).result()
+        start = next(starts, None)
+        if start is not None:
+            pending.append(pool.submit(_extract_range, file_path, start, min(start + pages_per_task, page_count)))
+        yield from pages
+
+
+def join_pages(pages, separator=""):
+    """
+    Join page texts in one pass.
+
+    Returns the text and the character offset at which each page starts, so
+    callers can map a position in the text back to its page.
+    """
+    page_starts = []
+    position = 0
+    for page in pages:
+        page_starts.append(position)
+        position += len(page) + len(separator)
+    return separator.join(pages), page_starts
+
+
+def page_number_at(page_starts, offset):
+    """1-based page number containing the character at `offset`."""
+    return max(1, bisect.bisect_right(page_starts, offset))
+
+
+def page_span(page_starts, start, length):
+    """Chunk metadata for the pages covered by text[start:start + length]."""
+    return {
+        "page": page_number_at(page_starts, start),
+        "page_end": page_number_at(page_starts, start + max(length, 1) - 1),
+    }
+
+
+def locate_chunks(text, chunks):
+    """
+    Start offset of each chunk in `text`, for splitters that only return
+    strings. Chunks are searched in order, so overlapping chunks and repeated
+    passages resolve to the right occurrence.
+    """
+    offsets = []
+    position = 0
+    for chunk in chunks:
+        found = text.find(chunk, position)
+        if found == -1:
+            # Splitters that normalise separators may not reproduce the text exactly
+            found = text.find(chunk.strip()[:50], position)
+        if found == -1:
+            found = position
+        offsets.append(found)
+        position = found + 1
+    return offsets
+
+
+def chunk_metadatas(source, text, chunks, page_starts=None):
+    """Metadata for each chunk of `text`: source, character offset and, for PDFs, the page range."""
+    metadatas = []
+    for chunk, start in zip(chunks, locate_chunks(text, chunks)):
+        metadata = {"source": source, "start_index": start}
+        if page_starts:
+            metadata.update(page_span(page_starts, start, len(chunk)))
+        metadatas.append(metadata)
+    return metadatas
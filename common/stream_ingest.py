@@ -0,0 +1,151 @@
+import re
+from itertools import islice
+from pdf_extract import iter_pdf_pages, page_span
+
+PARAGRAPH_SEPARATOR = re.compile(r'\n\s*\n')
+
+
+def iter_text_blocks(file_path, rows_per_block=1000, chars_per_block=65536):
+    """
+    Yield the text of a file in pieces: pages for PDFs, row blocks for
+    spreadsheets, paragraphs for Word/PowerPoint and fixed reads for text files.
+    Concatenating the pieces gives the document text.
+    """
+    if file_path.endswith(".txt"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            while True:
+                block = f.read(chars_per_block)
+                if not block:
+                    break
+                yield block
+    elif file_path.endswith(".pdf"):
+        yield from iter_pdf_pages(file_path)
+    elif file_path.endswith(".docx"):
+        from docx import Document
+        for paragraph in Document(file_path).paragraphs:
+            yield paragraph.text + "\n"
+    elif file_path.endswith(".csv"):
+        import pandas as pd
+        for block in pd.read_csv(file_path, chunksize=rows_per_block):
+            yield block.to_string(index=False) + "\n"
+    elif file_path.endswith(".xlsx"):
+        yield from _iter_xlsx_blocks(file_path, rows_per_block)
+    elif file_path.endswith(".pptx"):
+        from pptx import Presentation
+        for slide in Presentation(file_path).slides:
+            for shape in slide.shapes:
+                if shape.has_text_frame:
+                    for paragraph in shape.text_frame.paragraphs:
+                        yield paragraph.text + "\n"
+
+
+def _iter_xlsx_blocks(file_path, rows_per_block):
+    """Stream the first worksheet in row blocks, repeating the header in each block."""
+    import pandas as pd
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        while True:
+            block = list(islice(rows, rows_per_block))
+            if not block:
+                break
+            yield pd.DataFrame(block, columns=header).to_string(index=False) + "\n"
+    finally:
+        workbook.close()
+
+
+def _split_paragraph(start, paragraph, chunk_size):
+    chunks = []
+    while len(paragraph) > chunk_size:
+        chunks.append((start, paragraph[:chunk_size]))
+        paragraph = paragraph[chunk_size:]
+        start += chunk_size
+    if paragraph.strip():
+        chunks.append((start, paragraph))
+    return chunks
+
+
+def _paragraphs(text):
+    """Like PARAGRAPH_SEPARATOR.split(text), with the offset of each paragraph."""
+    pieces = []
+    position = 0
+    for match in PARAGRAPH_SEPARATOR.finditer(text):
+        pieces.append((position, text[position:match.start()]))
+        position = match.end()
+    pieces.append((position, text[position:]))
+    return pieces
+
+
+def iter_positioned_chunks(blocks, chunk_size=100):
+    """
+    Incremental version of chunk_text: yields the same chunks, each with its
+    character offset in the document, while consuming the text block by
+    block and keeping only the current paragraph in memory.
+    """
+    partial = ""
+    partial_start = 0
+    for block in blocks:
+        buffer = partial + block
+        # Separators followed by non-whitespace cannot grow with more input
+        cut = len(buffer.rstrip())
+        paragraphs = _paragraphs(buffer[:cut])
+        for offset, paragraph in paragraphs[:-1]:
+            yield from _split_paragraph(partial_start + offset, paragraph, chunk_size)
+        offset, partial = paragraphs[-1]
+        partial += buffer[cut:]
+        partial_start += offset
+        # Leading full-size pieces of the open paragraph are already final
+        safe = len(partial.rstrip())
+        emitted = 0
+        while len(partial) - emitted > chunk_size and emitted + chunk_size <= safe:
+            yield partial_start + emitted, partial[emitted:emitted + chunk_size]
+            emitted += chunk_size
+        partial = partial[emitted:]
+        partial_start += emitted
+    for offset, paragraph in _paragraphs(partial):
+        yield from _split_paragraph(partial_start + offset, paragraph, chunk_size)
+
+
+def iter_chunks(blocks, chunk_size=100):
+    """The chunks of iter_positioned_chunks without their offsets."""
+    for _, chunk in iter_positioned_chunks(blocks, chunk_size):
+        yield chunk
+
+
+def _record_starts(blocks, starts):
+    position = 0
+    for block in blocks:
+        starts.append(position)
+        position += len(block)
+        yield block
+
+
+def iter_chunk_records(file_path, chunk_size=100):
+    """
+    Stream (chunk, position) pairs for a file. `position` is chunk metadata:
+    the character offset (`start_index`) and, for PDFs, the page range.
+    """
+    page_starts = [] if file_path.endswith(".pdf") else None
+    blocks = iter_text_blocks(file_path)
+    if page_starts is not None:
+        # PDF blocks are pages; their offsets are known before any chunk on them is yielded
+        blocks = _record_starts(blocks, page_starts)
+    for start, chunk in iter_positioned_chunks(blocks, chunk_size):
+        position = {"start_index": start}
+        if page_starts is not None:
+            position.update(page_span(page_starts, start, len(chunk)))
+        yield chunk, position
+
+
+def micro_batches(items, size):
+    """Group an iterable into lists of at most `size` items."""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
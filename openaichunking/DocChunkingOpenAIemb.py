@@ -3,7 +3,8 @@ import re
 import time
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from PyPDF2 import PdfReader
+import common_path  # puts the shared modules in common/ on sys.path
+from pdf_extract import extract_pdf_pages, join_pages, chunk_metadatas
 from docx import Document
 from sentence_transformers import SentenceTransformer
 import chromadb
@@ -12,6 +13,8 @@ import pandas as pd
 from dotenv import load_dotenv
 import openai
 import logging
+from openai_batcher import BatchEmbedder
+from embedding_cache import EmbeddingCache, cached_embed
 
 # Configure logging
 logging.basicConfig(
@@ -27,29 +30,41 @@ def log_message(message):
 # Load environment variables from .env file
 load_dotenv()
 
-# Get OpenAI API key from .env
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Shared batching embedder for all files
+embedder = None
 
-if not OPENAI_API_KEY:
-    log_message("Error: OPENAI_API_KEY not found in .env file.")
-    raise ValueError("OPENAI_API_KEY not found in .env file.")
+# Embeddings already computed for a chunk text are reused across files and runs
+embedding_cache = None
 
-openai.api_key = OPENAI_API_KEY
+def init_openai():
+    """
+    Check the API key and create the embedder and cache (see pdf_extract.PARALLEL_MIN_PAGES).
+    """
+    global embedder, embedding_cache
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key:
+        log_message("Error: OPENAI_API_KEY not found in .env file.")
+        raise ValueError("OPENAI_API_KEY not found in .env file.")
+
+    openai.api_key = api_key
+    embedder = BatchEmbedder(model="text-embedding-ada-002")
+    embedding_cache = EmbeddingCache("embedding_cache.sqlite")
 
 # **Utility Functions**
 def extract_text(file_path):
     """
     Extract text from various file types: .txt, .pdf, .docx, .csv, .xlsx.
+    Returns the text and, for PDFs, the offset at which each page starts (else None).
     """
     try:
         text = ""
+        page_starts = None
         if file_path.endswith(".txt"):
             with open(file_path, "r", encoding="utf-8") as f:
                 text = f.read()
         elif file_path.endswith(".pdf"):
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                text += page.extract_text() or ""
+            text, page_starts = join_pages(extract_pdf_pages(file_path))
         elif file_path.endswith(".docx"):
             doc = Document(file_path)
             for paragraph in doc.paragraphs:
@@ -60,10 +75,10 @@ def extract_text(file_path):
         elif file_path.endswith(".xlsx"):
             df = pd.read_excel(file_path)
             text = df.to_string(index=False)
-        return text
+        return text, page_starts
     except Exception as e:
         log_message(f"Error extracting text from {file_path}: {e}")
-        return ""
+        return "", None
 
 def chunk_text(text, chunk_size=100):
     """
@@ -82,24 +97,17 @@ def chunk_text(text, chunk_size=100):
 
 def embed_chunks(chunks):
     """
-    Generate embeddings for text chunks using OpenAI's updated API.
+    Generate embeddings for text chunks, many chunks per OpenAI request.
     """
-    embeddings = []
-    for chunk in chunks:
-        try:
-            response = openai.Embedding.create(
-                input=chunk,
-                model="text-embedding-ada-002"
-            )
-            embeddings.append(response['data'][0]['embedding'])  # Extract the embedding
-        except Exception as e:
-            log_message(f"Error generating embedding for chunk: {chunk[:50]} - {e}")
-    log_message(f"Generated embeddings for {len(embeddings)} chunks.")
+    vectors = cached_embed(embedding_cache, embedder.model, chunks, embedder.embed)
+    embeddings = [v.tolist() if v is not None else None for v in vectors]
+    log_message(f"Generated embeddings for {sum(e is not None for e in embeddings)} chunks. Cache stats: {embedding_cache.stats()}")
     return embeddings
 
-def store_in_chroma(file_name, chunks, embeddings, db_path="Open_db"):
+def store_in_chroma(file_name, chunks, embeddings, db_path="Open_db", metadatas=None):
     """
     Store chunks and embeddings in ChromaDB.
+    `metadatas` (one per chunk) defaults to the source file only.
     """
     # Initialize ChromaDB Persistent Client
     client = chromadb.PersistentClient(path=db_path)
@@ -110,10 +118,13 @@ def store_in_chroma(file_name, chunks, embeddings, db_path="Open_db"):
 
     # Add chunks and embeddings to ChromaDB
     for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        if embedding is None:
+            log_message(f"Skipping chunk {i}: no embedding was generated.")
+            continue
         try:
             collection.add(
                 ids=[f"{collection_name}_chunk_{i}"],  # Unique ID for each chunk
-                metadatas=[{"source": file_name}],      # Metadata about the source
+                metadatas=[metadatas[i] if metadatas else {"source": file_name}],  # Source, offset, pages
                 documents=[chunk],                      # The text chunk
                 embeddings=[embedding]                  # Corresponding embedding vector
             )
@@ -151,16 +162,18 @@ class FolderHandler(FileSystemEventHandler):
             self.last_file_processed_time = time.time()
             log_message(f"OpenAIProcessing: {file_path}")
 
-            text = extract_text(file_path)
+            text, page_starts = extract_text(file_path)
             log_message(f"Extracted text from {os.path.basename(file_path)}.")
             chunks = chunk_text(text)
             embeddings = embed_chunks(chunks)
-            store_in_chroma(file_path, chunks, embeddings, self.db_path)
+            store_in_chroma(file_path, chunks, embeddings, self.db_path,
+                            metadatas=chunk_metadatas(file_path, text, chunks, page_starts))
 
 # **Main Script**
 if __name__ == "__main__":
     folder_to_monitor = "C:/Users/srira/Desktop/GenAi2/chunking"  # Replace with your folder path
     db_path = "Open_db"  # Path to store the Chroma DB
+    init_openai()
 
     # Ensure the folder exists
     if not os.path.exists(folder_to_monitor):
@@ -1,19 +1,20 @@
 import os
 import re
 import time
+import asyncio
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from PyPDF2 import PdfReader
-from docx import Document
-from pptx import Presentation
 from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
-import pandas as pd
 from dotenv import load_dotenv
 import openai
-from tenacity import retry, stop_after_attempt, wait_fixed
 import logging
+from openai_batcher import BatchEmbedder
+import common_path  # puts the shared modules in common/ on sys.path
+from embedding_cache import EmbeddingCache, cached_embed
+from async_embedder import AsyncEmbeddingPipeline
+from stream_ingest import iter_chunk_records, micro_batches
 
 # Configure logging
 logging.basicConfig(
@@ -29,14 +30,35 @@ def log_message(message):
 # Load environment variables from .env file
 load_dotenv()
 
-# Get OpenAI API key from .env
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Shared batching embedder for all files
+embedder = None
 
-if not OPENAI_API_KEY:
-    log_message("Error: OPENAI_API_KEY not found in .env file.")
-    raise ValueError("OPENAI_API_KEY not found in .env file.")
+# Embeddings already computed for a chunk text are reused across files and runs
+embedding_cache = None
 
-openai.api_key = OPENAI_API_KEY
+def init_openai():
+    """
+    Check the API key and create the embedder and cache (see pdf_extract.PARALLEL_MIN_PAGES).
+    """
+    global embedder, embedding_cache
+    api_key = os.getenv("OPENAI_API_KEY")
+
+    if not api_key:
+        log_message("Error: OPENAI_API_KEY not found in .env file.")
+        raise ValueError("OPENAI_API_KEY not found in .env file.")
+
+    openai.api_key = api_key
+    embedder = BatchEmbedder(model="text-embedding-ada-002")
+    embedding_cache = EmbeddingCache("embedding_cache.sqlite")
+
+# Async ingestion settings; match these to the account's rate limits
+USE_ASYNC_PIPELINE = os.getenv("USE_ASYNC_PIPELINE", "0") == "1"
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "4"))
+REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "3000"))
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "1000000"))
+
+# Chunks embedded and stored together while streaming a file
+STREAM_BATCH_SIZE = 256
 
 # **Utility Functions**
 def sanitize_collection_name(name):
@@ -44,84 +66,21 @@ def sanitize_collection_name(name):
     sanitized = re.sub(r'[^a-zA-Z0-9_-]', '_', name)
     return sanitized[:63].strip('_')
 
-def extract_text(file_path):
-    """
-    Extract text from various file types: .txt, .pdf, .docx, .csv, .xlsx, .pptx.
-    """
-    try:
-        text = ""
-        if file_path.endswith(".txt"):
-            with open(file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-        elif file_path.endswith(".pdf"):
-            reader = PdfReader(file_path)
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        elif file_path.endswith(".docx"):
-            doc = Document(file_path)
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-        elif file_path.endswith(".csv"):
-            df = pd.read_csv(file_path)
-            text = df.to_string(index=False)
-        elif file_path.endswith(".xlsx"):
-            df = pd.read_excel(file_path, engine="openpyxl")
-            text = df.to_string(index=False)
-        elif file_path.endswith(".pptx"):
-            presentation = Presentation(file_path)
-            for slide in presentation.slides:
-                for shape in slide.shapes:
-                    if shape.has_text_frame:
-                        for paragraph in shape.text_frame.paragraphs:
-                            text += paragraph.text + "\n"
-        return text
-    except Exception as e:
-        log_message(f"Error extracting text from {file_path}: {e}")
-        return ""
-
-def chunk_text(text, chunk_size=100):
-    """
-    Split text into chunks of a given size.
-    """
-    chunks = []
-    paragraphs = re.split(r'\n\s*\n', text)
-    for paragraph in paragraphs:
-        while len(paragraph) > chunk_size:
-            chunks.append(paragraph[:chunk_size])
-            paragraph = paragraph[chunk_size:]
-        if paragraph.strip():  # Avoid empty chunks
-            chunks.append(paragraph)
-    log_message(f"Chunked text into {len(chunks)} chunks.")
-    return chunks
-
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-def generate_embedding(chunk):
-    """
-    Generate embedding for a text chunk using OpenAI's API with retry logic.
-    """
-    response = openai.Embedding.create(
-        input=chunk,
-        model="text-embedding-ada-002"
-    )
-    return response['data'][0]['embedding']
-
 def embed_chunks(chunks):
     """
-    Generate embeddings for text chunks using OpenAI's updated API.
+    Generate embeddings for text chunks, many chunks per OpenAI request.
+    Each request is retried on its own if it fails.
     """
-    embeddings = []
-    for chunk in chunks:
-        try:
-            embedding = generate_embedding(chunk)
-            embeddings.append(embedding)
-        except Exception as e:
-            log_message(f"Error generating embedding for chunk: {chunk[:50]} - {e}")
-    log_message(f"Generated embeddings for {len(embeddings)} chunks.")
+    vectors = cached_embed(embedding_cache, embedder.model, chunks, embedder.embed)
+    embeddings = [v.tolist() if v is not None else None for v in vectors]
+    log_message(f"Generated embeddings for {sum(e is not None for e in embeddings)} chunks. Cache stats: {embedding_cache.stats()}")
     return embeddings
 
-def store_in_chroma(file_name, chunks, embeddings, db_path="2newopen_db"):
+def store_in_chroma(file_name, chunks, embeddings, db_path="2newopen_db", start_index=0, positions=None):
     """
     Store chunks and embeddings in ChromaDB.
+    `start_index` is the position of the first chunk within the file;
+    `positions` (one dict per chunk: start_index, page, page_end) is added to the metadata.
     """
     # Initialize ChromaDB Persistent Client
     client = chromadb.PersistentClient(path=db_path)
@@ -131,11 +90,14 @@ def store_in_chroma(file_name, chunks, embeddings, db_path="2newopen_db"):
     collection = client.get_or_create_collection(collection_name)
 
     # Add chunks and embeddings to ChromaDB
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_index):
+        if embedding is None:
+            log_message(f"Skipping chunk {i}: no embedding was generated.")
+            continue
         try:
             collection.add(
                 ids=[f"{collection_name}_chunk_{i}"],  # Unique ID for each chunk
-                metadatas=[{"source": file_name}],      # Metadata about the source
+                metadatas=[{"source": file_name, **(positions[i - start_index] if positions else {})}],
                 documents=[chunk],                      # The text chunk
                 embeddings=[embedding]                  # Corresponding embedding vector
             )
@@ -145,14 +107,44 @@ def store_in_chroma(file_name, chunks, embeddings, db_path="2newopen_db"):
 
     log_message(f"Data from {file_name} successfully stored in ChromaDB as {collection_name}.")
 
+def ingest_async(file_name, records, db_path="2newopen_db"):
+    """
+    Embed and store chunks with the asyncio pipeline: several rate-limited
+    embedding requests in flight, with storage running as batches complete.
+    """
+    pipeline = AsyncEmbeddingPipeline(
+        embedder,
+        max_in_flight=MAX_IN_FLIGHT_REQUESTS,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        tokens_per_minute=TOKENS_PER_MINUTE,
+        cache=embedding_cache,
+    )
+
+    # The pipeline embeds plain texts; chunk positions wait here, keyed by chunk ordinal
+    positions = {}
+
+    def texts():
+        for ordinal, (chunk, position) in enumerate(records):
+            positions[ordinal] = position
+            yield chunk
+
+    def store_batch(start_index, texts, vectors):
+        batch_positions = [positions.pop(start_index + i) for i in range(len(texts))]
+        store_in_chroma(file_name, texts, vectors, db_path, start_index=start_index, positions=batch_positions)
+
+    asyncio.run(pipeline.run(texts(), store_batch))
+    log_message(f"Async ingestion of {file_name}: {len(pipeline.batch_stats)} batches, "
+                f"{pipeline.throttled} rate-limited responses.")
+
 # **Folder Monitoring**
 class FolderHandler(FileSystemEventHandler):
     """
     Handles file events in the monitored folder.
     """
-    def __init__(self, folder_to_monitor, db_path):
+    def __init__(self, folder_to_monitor, db_path, use_async=USE_ASYNC_PIPELINE):
         self.folder_to_monitor = folder_to_monitor
         self.db_path = db_path
+        self.use_async = use_async
         self.processed_files = {}
         self.last_file_processed_time = time.time()
 
@@ -174,35 +166,30 @@ class FolderHandler(FileSystemEventHandler):
                 self.last_file_processed_time = time.time()
                 log_message(f"Processing: {file_path}")
 
-                # Attempt to extract text
-                try:
-                    text = extract_text(file_path)
-                    log_message(f"Extracted text from {os.path.basename(file_path)}.")
-                except Exception as e:
-                    log_message(f"Error extracting text from {file_path}: {e}")
-                    return  # Skip further processing for this file
-
-                # Attempt to chunk text
-                try:
-                    chunks = chunk_text(text)
-                    log_message(f"Chunked text from {os.path.basename(file_path)} into {len(chunks)} chunks.")
-                except Exception as e:
-                    log_message(f"Error chunking text from {file_path}: {e}")
-                    return  # Skip further processing for this file
+                # Chunks are produced lazily as the file is read
+                records = iter_chunk_records(file_path)
 
-                # Attempt to generate embeddings
-                try:
-                    embeddings = embed_chunks(chunks)
-                    log_message(f"Generated embeddings for {len(embeddings)} chunks from {os.path.basename(file_path)}.")
-                except Exception as e:
-                    log_message(f"Error generating embeddings for {file_path}: {e}")
-                    return  # Skip further processing for this file
+                if self.use_async:
+                    try:
+                        ingest_async(file_path, records, self.db_path)
+                    except Exception as e:
+                        log_message(f"Error in async ingestion for {file_path}: {e}")
+                    return
 
-                # Attempt to store in ChromaDB
+                # Embed and store fixed-size micro-batches so memory stays flat
+                # and early chunks become searchable before the file is done
+                stored = 0
                 try:
-                    store_in_chroma(file_path, chunks, embeddings, self.db_path)
+                    for batch in micro_batches(records, STREAM_BATCH_SIZE):
+                        texts = [chunk for chunk, _ in batch]
+                        embeddings = embed_chunks(texts)
+                        store_in_chroma(file_path, texts, embeddings, self.db_path, start_index=stored,
+                                        positions=[position for _, position in batch])
+                        stored += len(batch)
                 except Exception as e:
-                    log_message(f"Error storing data in ChromaDB for {file_path}: {e}")
+                    log_message(f"Error ingesting {file_path} after {stored} chunks: {e}")
+                    return
+                log_message(f"Stored {stored} chunks from {os.path.basename(file_path)}.")
         except Exception as e:
             log_message(f"Error processing file {file_path}: {e}")
 
@@ -211,6 +198,7 @@ class FolderHandler(FileSystemEventHandler):
 if __name__ == "__main__":
     folder_to_monitor = "C:/Users/srira/Desktop/GenAi2/openai"  # Replace with your folder path
     db_path = "2newopen_db"  # Path to store the Chroma DB
+    init_openai()
 
     # Ensure the folder exists
     if not os.path.exists(folder_to_monitor):
@@ -1,11 +1,16 @@
 import os
 import chromadb
-import json
 import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
 from dotenv import load_dotenv
 import openai
+import common_path  # puts the shared modules in common/ on sys.path
+from corpus_search import CorpusSearcher
+from openai_batcher import BatchEmbedder
+from ivfpq_index import IVFPQIndex, chroma_vector_fetcher
+import collection_io
+from collection_stats import database_stats, print_stats
 
 # Load environment variables
 load_dotenv()
@@ -16,9 +21,14 @@ openai.api_key = OPENAI_API_KEY
 
 
 # Inspect ChromaDB collections
-def inspect_chroma(db_path="Open_db"):
+def inspect_chroma(db_path="Open_db", stats=False):
     client = chromadb.PersistentClient(path=db_path)
 
+    # Stats mode pages through each collection instead of loading it whole
+    if stats:
+        print_stats(database_stats(client, db_path))
+        return
+
     print("Inspecting ChromaDB:")
     
     # Retrieve a list of collection names
@@ -87,40 +97,91 @@ def search_chroma(client, collection_name, query_text, top_k=3):
         print("=" * 50)
 
 
+# One searcher per client keeps the collection list and handles cached between calls
+_searchers = {}
+
+def search_corpus(client, query_text, top_k=5, collections=None, pattern=None):
+    """
+    Search all collections (or those named in `collections` / matching the
+    glob `pattern`) concurrently and print the global top-k results.
+    """
+    searcher = _searchers.get(id(client))
+    if searcher is None:
+        searcher = _searchers[id(client)] = CorpusSearcher(client, BatchEmbedder().embed)
+    response = searcher.search(query_text, top_k=top_k, collections=collections, pattern=pattern)
+
+    print(f"Corpus search for '{query_text}' across {len(response['latency_ms'])} collections:")
+    for i, hit in enumerate(response["results"]):
+        print(f"  Result {i + 1} [{hit['collection']}]: {hit['document'][:50]}...")
+        print(f"  Metadata: {hit['metadata']}")
+        print(f"  Distance: {hit['distance']}")
+        print("=" * 50)
+    for name, ms in sorted(response["latency_ms"].items(), key=lambda item: -item[1]):
+        print(f"  {name}: {ms:.1f} ms")
+    for name, error in response["errors"].items():
+        print(f"  {name}: failed ({error})")
+    return response
 
-    
-  
 
+# Compressed IVF-PQ indexes, loaded once per index file
+_ivfpq_indexes = {}
+
+def search_compressed(client, collection_name, query_text, index_path, top_k=3, nprobe=16):
+    """
+    Search a collection through its IVF-PQ index (see ivfpq_index.py build),
+    re-ranking the shortlist exactly with vectors fetched from ChromaDB.
+    """
+    if index_path not in _ivfpq_indexes:
+        _ivfpq_indexes[index_path] = IVFPQIndex.load(index_path)
+    collection = client.get_collection(collection_name)
+    query_embedding = BatchEmbedder().embed([query_text])[0]
+    hits = _ivfpq_indexes[index_path].search(
+        [query_embedding], k=top_k, nprobe=nprobe, fetch_vectors=chroma_vector_fetcher(collection)
+    )[0]
+    results = collection.get(ids=[chunk_id for chunk_id, _ in hits], include=["documents", "metadatas"])
+    by_id = {chunk_id: (doc, meta) for chunk_id, doc, meta in zip(results["ids"], results["documents"], results["metadatas"])}
+
+    print(f"Compressed search results for '{query_text}' in collection '{collection_name}':")
+    for i, (chunk_id, distance) in enumerate(hits):
+        doc, meta = by_id[chunk_id]
+        print(f"  Result {i + 1}: {doc[:50]}...")
+        print(f"  Metadata: {meta}")
+        print(f"  Distance: {distance}")
+        print("=" * 50)
+    return hits
 
-# Export a collection to a JSON file
+
+# Export a collection to a directory (records.jsonl, embeddings.npy, manifest.json)
 def export_collection(client, collection_name, output_path):
     """
-    Export a collection's data to a JSON file.
+    Export a collection page by page; see collection_io.py for the format
+    and `import_collection` for loading it back.
     """
     collection = client.get_collection(collection_name)
-    results = collection.get(include=["documents", "metadatas", "embeddings"])
-    
-    # Convert embeddings to lists for JSON serialization
-    embeddings = results.get("embeddings", [])
-    embeddings_as_lists = [embedding.tolist() for embedding in embeddings]
-    
-    data = {
-        "documents": results.get("documents", []),
-        "metadatas": results.get("metadatas", []),
-        "embeddings": embeddings_as_lists
-    }
-    
-    # Save to JSON
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4)
-    
-    print(f"Collection '{collection_name}' exported to {output_path}.")
+    return collection_io.export_collection(collection, output_path)
+
+
+def import_collection(client, input_path, collection_name=None):
+    """
+    Load an exported collection with its stored embeddings (no re-embedding).
+    """
+    return collection_io.import_collection(client, input_path, collection_name)
 
 
 
 # Main script
 if __name__ == "__main__":
-    db_path = "C:/Users/srira/Desktop/GenAi2/2newopen_db"
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect, search and export a ChromaDB database.")
+    parser.add_argument("--db", default="C:/Users/srira/Desktop/GenAi2/2newopen_db")
+    parser.add_argument("--stats", action="store_true", help="Only print bounded-memory collection statistics")
+    args = parser.parse_args()
+    db_path = args.db
+
+    if args.stats:
+        inspect_chroma(db_path, stats=True)
+        raise SystemExit
+
     client = chromadb.PersistentClient(path=db_path)
 
     # Inspect collections
@@ -128,8 +189,11 @@ if __name__ == "__main__":
     
     # Search example
     search_chroma(client, "industrypolicy", "growth policy", top_k=5)
+
+    # Search across every collection
+    search_corpus(client, "growth policy", top_k=5)
     
     
     
     # Export example
-    export_collection(client, "industrypolicy", "industrypolicy_backup.json")
+    export_collection(client, "industrypolicy", "industrypolicy_backup")
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import random
+import time
+import openai
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `rate_per_minute`.
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+def retry_after_seconds(error):
+    """Read a retry hint (retry-after-ms or retry-after) from an OpenAI error, if any."""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class AsyncEmbeddingPipeline:
+    """
+    Asyncio ingestion: chunking -> embedding workers -> storage.
+
+    At most `max_in_flight` embedding requests run at once, each one gated by
+    request-per-minute and token-per-minute buckets. Rate-limit and server
+    errors back off exponentially, honoring retry-after hints. Embedded
+    batches are handed to a single storage task through a bounded queue.
+    """
+    def __init__(self, embedder, max_in_flight=4, requests_per_minute=3000,
+                 tokens_per_minute=1000000, max_attempts=6, base_delay=1.0,
+                 max_delay=60.0, queue_size=8, cache=None):
+        self.embedder = embedder
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self.cache = cache
+        self.batch_stats = []
+        self.throttled = 0
+
+    async def _request(self, inputs):
+        kwargs = {"input": inputs, "model": self.embedder.model}
+        if self.embedder.api_base:
+            kwargs["api_base"] = self.embedder.api_base
+        if self.embedder.api_key:
+            kwargs["api_key"] = self.embedder.api_key
+        response = await openai.Embedding.acreate(**kwargs)
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    async def embed_batch(self, texts, tokens):
+        """Embed one batch, backing off on 429s and transient server errors."""
+        start = time.perf_counter()
+        for attempt in range(1, self.max_attempts + 1):
+            await self._requests.acquire(1)
+            await self._tokens.acquire(tokens)
+            try:
+                vectors = await self._request(texts)
+            except (openai.error.RateLimitError, openai.error.APIError,
+                    openai.error.ServiceUnavailableError, openai.error.Timeout,
+                    openai.error.APIConnectionError) as e:
+                if attempt == self.max_attempts:
+                    raise
+                if isinstance(e, openai.error.RateLimitError):
+                    self.throttled += 1
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                    delay *= random.uniform(0.5, 1.0)
+                logging.warning(f"Embedding request failed ({e}); retrying in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+                continue
+            self.batch_stats.append({
+                "items": len(texts),
+                "tokens": tokens,
+                "attempts": attempt,
+                "seconds": time.perf_counter() - start,
+            })
+            return vectors
+
+    async def _embed_with_cache(self, texts, tokens):
+        if self.cache is None:
+            return await self.embed_batch(texts, tokens)
+        # The cache is SQLite; keep its reads and writes off the event loop
+        vectors = await asyncio.to_thread(self.cache.get_many, self.embedder.model, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            todo = [texts[i] for i in missing]
+            fresh = await self.embed_batch(todo, sum(self.embedder.count_tokens(t) for t in todo))
+            await asyncio.to_thread(self.cache.put_many, self.embedder.model, todo, fresh)
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+        return [v.tolist() if hasattr(v, "tolist") else v for v in vectors]
+
+    async def run(self, chunks, store_fn):
+        """
+        Embed an iterable of chunks and pass each embedded batch to
+        `store_fn(start_index, texts, vectors)`, which runs in a worker thread.
+
+        `chunks` may be a lazy generator that extracts and splits documents;
+        it is consumed in a producer thread, so extraction never blocks the
+        requests in flight and the first batch is sent as soon as it is cut.
+        """
+        loop = asyncio.get_running_loop()
+        self._requests = TokenBucket(self.requests_per_minute)
+        self._tokens = TokenBucket(self.tokens_per_minute)
+        embed_queue = asyncio.Queue(maxsize=self.queue_size)
+        store_queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def embed_worker():
+            while True:
+                batch = await embed_queue.get()
+                if batch is None:
+                    return
+                texts = [text for _, text, _ in batch]
+                try:
+                    vectors = await self._embed_with_cache(texts, sum(t for _, _, t in batch))
+                except Exception as e:
+                    logging.error(f"Embedding batch of {len(batch)} chunks failed: {e}")
+                    vectors = [None] * len(batch)
+                await store_queue.put((batch[0][0], texts, vectors))
+
+        async def store_worker():
+            while True:
+                item = await store_queue.get()
+                if item is None:
+                    return
+                try:
+                    await asyncio.to_thread(store_fn, *item)
+                except Exception as e:
+                    logging.error(f"Storing batch starting at chunk {item[0]} failed: {e}")
+
+        workers = [asyncio.create_task(embed_worker()) for _ in range(self.max_in_flight)]
+        storer = asyncio.create_task(store_worker())
+
+        def produce():
+            for batch in self.embedder.make_batches(chunks):
+                # Blocks this thread (not the loop) while the queue is full
+                asyncio.run_coroutine_threadsafe(embed_queue.put(batch), loop).result()
+
+        try:
+            await asyncio.to_thread(produce)
+        finally:
+            # Flush what was already batched even if extraction failed part way
+            for _ in workers:
+                await embed_queue.put(None)
+            await asyncio.gather(*workers)
+            await store_queue.put(None)
+            await storer
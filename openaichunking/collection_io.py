@@ -0,0 +1,171 @@
+"""
+Streaming export and import of Chroma collections.
+
+An export directory holds:
+
+    records.jsonl    one {"id", "document", "metadata"} object per line
+    embeddings.npy   float32 matrix, row i belongs to line i of records.jsonl
+    manifest.json    collection name/metadata, row count, dimension and sha256 of both files
+
+Both directions work page by page, so memory stays at one page regardless
+of collection size, and importing never calls the embedding API.
+
+    python collection_io.py export 2newopen_db industrypolicy backups/industrypolicy
+    python collection_io.py import other_db backups/industrypolicy
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from numpy.lib.format import open_memmap
+
+PAGE_SIZE = 1000
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_collection(collection, output_dir, page_size=PAGE_SIZE):
+    """Write a collection to `output_dir`; returns the manifest."""
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    count = collection.count()
+    records_path = os.path.join(output_dir, "records.jsonl")
+    embeddings_path = os.path.join(output_dir, "embeddings.npy")
+
+    records_digest = hashlib.sha256()
+    embeddings = None
+    written = 0
+    with open(records_path, "wb") as records:
+        while written < count:
+            page = collection.get(
+                include=["documents", "metadatas", "embeddings"], limit=page_size, offset=written
+            )
+            if not page["ids"]:
+                break
+            vectors = np.asarray(page["embeddings"], dtype=np.float32)
+            if embeddings is None:
+                embeddings = open_memmap(embeddings_path, mode="w+", dtype=np.float32, shape=(count, vectors.shape[1]))
+            embeddings[written:written + len(vectors)] = vectors
+            for chunk_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                line = json.dumps({"id": chunk_id, "document": document, "metadata": metadata}, ensure_ascii=False)
+                line = (line + "\n").encode("utf-8")
+                records.write(line)
+                records_digest.update(line)
+            written += len(page["ids"])
+    if written != count:
+        raise RuntimeError(f"Collection {collection.name} changed during export ({written} of {count} rows read).")
+    if embeddings is None:
+        embeddings = open_memmap(embeddings_path, mode="w+", dtype=np.float32, shape=(0, 0))
+    dim = embeddings.shape[1]
+    embeddings.flush()
+    del embeddings
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "collection": collection.name,
+        "collection_metadata": collection.metadata,
+        "count": count,
+        "dim": dim,
+        "dtype": "float32",
+        "files": {
+            "records.jsonl": records_digest.hexdigest(),
+            "embeddings.npy": file_sha256(embeddings_path),
+        },
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+    print(f"Exported {count} records from '{collection.name}' to {output_dir} in {time.perf_counter() - start:.1f} s.")
+    return manifest
+
+
+def verify_export(input_dir):
+    """Check the files against the manifest; returns the manifest."""
+    with open(os.path.join(input_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    for name, expected in manifest["files"].items():
+        actual = file_sha256(os.path.join(input_dir, name))
+        if actual != expected:
+            raise ValueError(f"Checksum mismatch for {name}: expected {expected}, got {actual}")
+    return manifest
+
+
+def iter_export(input_dir, batch_size=PAGE_SIZE):
+    """Yield (ids, documents, metadatas, embeddings) batches from an export."""
+    embeddings = np.load(os.path.join(input_dir, "embeddings.npy"), mmap_mode="r")
+    with open(os.path.join(input_dir, "records.jsonl"), "r", encoding="utf-8") as records:
+        row = 0
+        batch = []
+        for line in records:
+            batch.append(json.loads(line))
+            if len(batch) == batch_size:
+                yield _batch(batch, embeddings, row)
+                row += len(batch)
+                batch = []
+        if batch:
+            yield _batch(batch, embeddings, row)
+
+
+def _batch(records, embeddings, row):
+    return (
+        [r["id"] for r in records],
+        [r["document"] for r in records],
+        [r["metadata"] for r in records],
+        np.asarray(embeddings[row:row + len(records)]),
+    )
+
+
+def import_collection(client, input_dir, collection_name=None, batch_size=PAGE_SIZE, verify=True):
+    """
+    Load an export into `collection_name` (default: the exported name) with
+    the stored embeddings. Upserts, so an interrupted import can be rerun.
+    """
+    start = time.perf_counter()
+    if verify:
+        manifest = verify_export(input_dir)
+    else:
+        with open(os.path.join(input_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    name = collection_name or manifest["collection"]
+    collection = client.get_or_create_collection(name, metadata=manifest.get("collection_metadata"))
+    loaded = 0
+    for ids, documents, metadatas, embeddings in iter_export(input_dir, batch_size):
+        collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings.tolist())
+        loaded += len(ids)
+    if loaded != manifest["count"]:
+        raise RuntimeError(f"Imported {loaded} records but the manifest lists {manifest['count']}.")
+    print(f"Imported {loaded} records into '{name}' in {time.perf_counter() - start:.1f} s.")
+    return collection
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Export or import a Chroma collection without re-embedding.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("db_path")
+    export_parser.add_argument("collection")
+    export_parser.add_argument("output_dir")
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("db_path")
+    import_parser.add_argument("input_dir")
+    import_parser.add_argument("--name", default=None, help="Target collection (default: the exported name)")
+    import_parser.add_argument("--no-verify", action="store_true")
+    for sub in (export_parser, import_parser):
+        sub.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=args.db_path)
+    if args.command == "export":
+        export_collection(client.get_collection(args.collection), args.output_dir, args.page_size)
+    else:
+        import_collection(client, args.input_dir, args.name, args.page_size, verify=not args.no_verify)
@@ -0,0 +1,146 @@
+"""
+Local stand-in for the OpenAI embeddings endpoint, for exercising batching,
+rate limiting and retry/backoff without an API key or network access.
+
+Requests can be answered with 429s (with a retry-after header) for the first
+`--throttle-first` calls and/or every `--fail-every`-th call; everything else
+gets deterministic fake vectors.
+
+    python fake_openai_server.py --port 8799 --throttle-first 2
+    python fake_openai_server.py --selftest    # runs AsyncEmbeddingPipeline against it
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_embedding(text, dim=8):
+    """The deterministic vector the fake endpoint returns for `text`."""
+    seed = int.from_bytes(hashlib.sha1(str(text).encode("utf-8")).digest()[:8], "little")
+    rng = random.Random(seed)
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        inputs = request.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.received.append(list(inputs))
+            number = server.requests
+            throttle = number <= server.throttle_first or (server.fail_every and number % server.fail_every == 0)
+            if throttle:
+                server.throttled += 1
+        if throttle:
+            self._send(
+                429,
+                {"error": {"message": "Rate limit reached (fake server)", "type": "requests", "code": "rate_limit_exceeded"}},
+                {"retry-after-ms": str(int(server.retry_after * 1000))},
+            )
+            return
+
+        data = [
+            {"object": "embedding", "index": index, "embedding": fake_embedding(text, server.dim)}
+            for index, text in enumerate(inputs)
+        ]
+        # Answer out of order, as the real endpoint may; callers must sort by index
+        data.reverse()
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": request.get("model"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+
+def start_fake_server(host="127.0.0.1", port=0, throttle_first=0, fail_every=0, retry_after=0.05, dim=8):
+    """
+    Start the fake endpoint in a daemon thread; returns (server, api_base).
+    `server.received` lists the inputs of every request, throttled or not.
+    """
+    server = ThreadingHTTPServer((host, port), FakeEmbeddingHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.received = []
+    server.throttled = 0
+    server.throttle_first = throttle_first
+    server.fail_every = fail_every
+    server.retry_after = retry_after
+    server.dim = dim
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def selftest(chunk_count=200):
+    """Embed `chunk_count` chunks through AsyncEmbeddingPipeline while the server throttles."""
+    from openai_batcher import BatchEmbedder
+    from async_embedder import AsyncEmbeddingPipeline
+
+    server, api_base = start_fake_server(throttle_first=3, fail_every=5)
+    embedder = BatchEmbedder(max_batch_items=16, api_base=api_base, api_key="sk-fake")
+    pipeline = AsyncEmbeddingPipeline(embedder, max_in_flight=4, base_delay=0.01, max_delay=0.2)
+    stored = {}
+
+    def store_fn(start_index, texts, vectors):
+        for offset, vector in enumerate(vectors):
+            stored[start_index + offset] = vector
+
+    chunks = (f"chunk {i}" for i in range(chunk_count))
+    asyncio.run(pipeline.run(chunks, store_fn))
+    server.shutdown()
+
+    missing = [i for i in range(chunk_count) if stored.get(i) is None]
+    retried = sum(1 for stats in pipeline.batch_stats if stats["attempts"] > 1)
+    print(f"{server.requests} requests, {server.throttled} answered 429, "
+          f"{pipeline.throttled} retried by the pipeline, {retried} batches needed more than one attempt")
+    if missing:
+        raise SystemExit(f"{len(missing)} chunks were not embedded")
+    print(f"All {chunk_count} chunks embedded.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI embeddings endpoint for local testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--throttle-first", type=int, default=0, help="Answer the first N requests with 429")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="retry-after hint in seconds")
+    parser.add_argument("--dim", type=int, default=8)
+    parser.add_argument("--selftest", action="store_true", help="Run the async pipeline against a throttling server")
+    args = parser.parse_args()
+
+    if args.selftest:
+        selftest()
+    else:
+        server, api_base = start_fake_server(
+            args.host, args.port, args.throttle_first, args.fail_every, args.retry_after, args.dim
+        )
+        print(f"Fake embeddings endpoint at {api_base} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -1,9 +1,17 @@
+import argparse
 import chromadb
+import common_path  # puts the shared modules in common/ on sys.path
+from collection_stats import database_stats, print_stats
 
-def inspect_chroma(db_path="Open_db"):
+def inspect_chroma(db_path="Open_db", stats=False):
     # Initialize ChromaDB Persistent Client
     client = chromadb.PersistentClient(path=db_path)
 
+    # Stats mode pages through each collection instead of loading it whole
+    if stats:
+        print_stats(database_stats(client, db_path))
+        return
+
     print("Inspecting ChromaDB:")
     
     # Retrieve a list of collection names
@@ -43,4 +51,8 @@ def inspect_chroma(db_path="Open_db"):
             print(f"  Sample Embedding (first 10 values): {embeddings[0][:10]}")
 
 if __name__ == "__main__":
-    inspect_chroma("C:/Users/srira/Desktop/GenAi2/2newopen_db")
+    parser = argparse.ArgumentParser(description="Inspect a ChromaDB database.")
+    parser.add_argument("db_path", nargs="?", default="C:/Users/srira/Desktop/GenAi2/2newopen_db")
+    parser.add_argument("--stats", action="store_true", help="Print bounded-memory statistics instead of every record")
+    args = parser.parse_args()
+    inspect_chroma(args.db_path, stats=args.stats)
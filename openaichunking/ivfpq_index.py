@@ -0,0 +1,283 @@
+"""
+Compressed approximate-nearest-neighbour index (IVF + product quantization)
+for the OpenAI-embedded Chroma collections.
+
+A 1536-d ada-002 vector is stored as `m` one-byte PQ codes (48 bytes with
+the default m=48, instead of 6 KB) in the inverted list of its nearest
+coarse centroid. A query scans the `nprobe` closest lists with asymmetric
+distance tables, then re-ranks a shortlist exactly using the raw vectors
+fetched from Chroma by ID, so only the codes have to stay in memory.
+
+    python ivfpq_index.py build 2newopen_db growth
+    python ivfpq_index.py eval 2newopen_db growth --nprobe 1 4 16 64
+"""
+import argparse
+import logging
+import sys
+import time
+import numpy as np
+
+PAGE_SIZE = 1000
+
+
+def _sq_distances(x, centroids):
+    """Squared L2 distances between rows of x and centroids."""
+    return (x ** 2).sum(axis=1)[:, None] - 2 * x @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+
+
+def assign(x, centroids, block_rows=8192):
+    labels = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), block_rows):
+        labels[start:start + block_rows] = _sq_distances(x[start:start + block_rows], centroids).argmin(axis=1)
+    return labels
+
+
+def kmeans(x, k, iterations=20, seed=0):
+    """Lloyd's k-means; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(x, centroids)
+        order = np.argsort(labels, kind="stable")
+        present, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+        centroids[present] = np.add.reduceat(x[order], starts, axis=0) / counts[:, None]
+        empty = np.setdiff1d(np.arange(k), present)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), size=len(empty), replace=False)]
+    return centroids.astype(np.float32)
+
+
+class IVFPQIndex:
+    def __init__(self, nlist=256, m=48, nbits=8):
+        if nbits != 8:
+            raise ValueError("Only 8-bit PQ codes are supported.")
+        self.nlist = nlist
+        self.m = m
+        self.ksub = 1 << nbits
+        self.centroids = None
+        self.codebooks = None
+        self.ids = []
+        self.codes = np.empty((0, m), dtype=np.uint8)
+        self.labels = np.empty(0, dtype=np.int32)
+        self._order = None
+        self._offsets = None
+
+    @property
+    def dim(self):
+        return None if self.centroids is None else self.centroids.shape[1]
+
+    def train(self, sample, seed=0):
+        sample = np.asarray(sample, dtype=np.float32)
+        if sample.shape[1] % self.m:
+            raise ValueError(f"Dimension {sample.shape[1]} is not divisible by m={self.m}")
+        # k-means needs a few dozen points per centroid to be meaningful
+        self.nlist = max(1, min(self.nlist, len(sample) // 39))
+        self.centroids = kmeans(sample, self.nlist, seed=seed)
+        residuals = sample - self.centroids[assign(sample, self.centroids)]
+        dsub = sample.shape[1] // self.m
+        ksub = min(self.ksub, len(sample))
+        self.codebooks = np.stack([
+            kmeans(residuals[:, j * dsub:(j + 1) * dsub], ksub, seed=seed + j)
+            for j in range(self.m)
+        ])
+        return self
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        labels = assign(vectors, self.centroids)
+        residuals = vectors - self.centroids[labels]
+        dsub = vectors.shape[1] // self.m
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = assign(residuals[:, j * dsub:(j + 1) * dsub], self.codebooks[j])
+        return labels, codes
+
+    def add(self, ids, vectors):
+        labels, codes = self.encode(vectors)
+        self.ids.extend(ids)
+        self.labels = np.concatenate([self.labels, labels.astype(np.int32)])
+        self.codes = np.concatenate([self.codes, codes])
+        self._order = None
+
+    def _lists(self):
+        if self._order is None:
+            self._order = np.argsort(self.labels, kind="stable")
+            self._offsets = np.searchsorted(self.labels[self._order], np.arange(self.nlist + 1))
+        return self._order, self._offsets
+
+    def search(self, queries, k=5, nprobe=8, shortlist=None, fetch_vectors=None):
+        """
+        Approximate top-k for each query as lists of (id, distance).
+
+        With `fetch_vectors` (ids -> array of raw vectors) the best
+        `shortlist` candidates (default 10*k) are re-ranked exactly.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        order, offsets = self._lists()
+        shortlist = max(k, shortlist or 10 * k) if fetch_vectors else k
+        nprobe = min(nprobe, self.nlist)
+        dsub = queries.shape[1] // self.m
+        rows_m = np.arange(self.m)
+        results = []
+        for query in queries:
+            probes = np.argpartition(_sq_distances(query[None], self.centroids)[0], nprobe - 1)[:nprobe]
+            candidates, approx = [], []
+            for list_no in probes:
+                members = order[offsets[list_no]:offsets[list_no + 1]]
+                if not len(members):
+                    continue
+                residual = (query - self.centroids[list_no]).reshape(self.m, 1, dsub)
+                table = ((residual - self.codebooks) ** 2).sum(axis=2)
+                candidates.append(members)
+                approx.append(table[rows_m, self.codes[members]].sum(axis=1))
+            if not candidates:
+                results.append([])
+                continue
+            candidates = np.concatenate(candidates)
+            approx = np.concatenate(approx)
+            top = np.argsort(approx)[:shortlist]
+            hit_ids = [self.ids[i] for i in candidates[top]]
+            if fetch_vectors is None:
+                results.append(list(zip(hit_ids, approx[top].tolist())))
+                continue
+            exact = ((np.asarray(fetch_vectors(hit_ids), dtype=np.float32) - query) ** 2).sum(axis=1)
+            best = np.argsort(exact)[:k]
+            results.append([(hit_ids[i], float(exact[i])) for i in best])
+        return results
+
+    def memory_bytes(self):
+        """Resident size of the index, including the Python list of chunk IDs and its strings."""
+        arrays = self.codes.nbytes + self.labels.nbytes + self.centroids.nbytes + self.codebooks.nbytes
+        ids = sys.getsizeof(self.ids) + sum(sys.getsizeof(chunk_id) for chunk_id in self.ids)
+        return arrays + ids
+
+    def save(self, path):
+        np.savez(
+            path,
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            codes=self.codes,
+            labels=self.labels,
+            ids=np.array(self.ids, dtype=str),
+            params=np.array([self.nlist, self.m]),
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        nlist, m = data["params"].tolist()
+        index = cls(nlist=nlist, m=m)
+        index.centroids = data["centroids"]
+        index.codebooks = data["codebooks"]
+        index.codes = data["codes"]
+        index.labels = data["labels"]
+        index.ids = data["ids"].tolist()
+        return index
+
+
+# **Chroma helpers**
+def iter_collection(collection, include=("embeddings",), page_size=PAGE_SIZE):
+    """Page through a collection, yielding (ids, embeddings) batches."""
+    offset = 0
+    while True:
+        page = collection.get(include=list(include), limit=page_size, offset=offset)
+        if not page["ids"]:
+            return
+        yield page["ids"], np.asarray(page["embeddings"], dtype=np.float32)
+        offset += len(page["ids"])
+
+
+def sample_collection(collection, sample_size=50000, page_size=PAGE_SIZE, seed=0):
+    """Random pages of a collection, up to `sample_size` vectors."""
+    total = collection.count()
+    pages = list(range(0, total, page_size))
+    np.random.default_rng(seed).shuffle(pages)
+    sample = []
+    collected = 0
+    for offset in pages:
+        if collected >= sample_size:
+            break
+        page = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        sample.append(np.asarray(page["embeddings"], dtype=np.float32))
+        collected += len(page["ids"])
+    return np.concatenate(sample)[:sample_size]
+
+
+def chroma_vector_fetcher(collection):
+    """ids -> raw embeddings from Chroma, in the order requested."""
+    def fetch(ids):
+        page = collection.get(ids=list(ids), include=["embeddings"])
+        by_id = dict(zip(page["ids"], page["embeddings"]))
+        return np.asarray([by_id[i] for i in ids], dtype=np.float32)
+    return fetch
+
+
+def build_from_collection(collection, nlist=256, m=48, sample_size=50000):
+    start = time.perf_counter()
+    index = IVFPQIndex(nlist=nlist, m=m).train(sample_collection(collection, sample_size))
+    trained = time.perf_counter()
+    for ids, vectors in iter_collection(collection):
+        index.add(ids, vectors)
+    logging.info(f"Built IVF-PQ index over {len(index.ids)} vectors: "
+                 f"trained in {trained - start:.1f} s, encoded in {time.perf_counter() - trained:.1f} s")
+    return index
+
+
+def exact_neighbors(collection, queries, k):
+    """Brute-force top-k ids, streamed page by page."""
+    best_ids = [[] for _ in queries]
+    best_dist = np.full((len(queries), 0), np.inf, dtype=np.float32)
+    for ids, vectors in iter_collection(collection):
+        distances = np.concatenate([best_dist, _sq_distances(queries, vectors)], axis=1)
+        pool = [best + list(ids) for best in best_ids]
+        top = np.argsort(distances, axis=1)[:, :k]
+        best_ids = [[pool[q][j] for j in top[q]] for q in range(len(queries))]
+        best_dist = np.take_along_axis(distances, top, axis=1)
+    return best_ids
+
+
+def recall_report(index, collection, k=10, nprobes=(1, 4, 16, 64), num_queries=100, seed=0):
+    """Print recall@k and latency with and without re-ranking for each nprobe."""
+    queries = sample_collection(collection, num_queries, page_size=num_queries, seed=seed + 1)
+    queries = queries + np.random.default_rng(seed).normal(scale=0.01, size=queries.shape).astype(np.float32)
+    truth = exact_neighbors(collection, queries, k)
+    fetch = chroma_vector_fetcher(collection)
+    raw_bytes = len(index.ids) * index.dim * 4
+
+    print(f"{len(index.ids)} vectors, nlist={index.nlist}, m={index.m}: "
+          f"{index.memory_bytes() / 2**20:.1f} MiB in memory vs {raw_bytes / 2**20:.1f} MiB raw")
+    print(f"{'nprobe':>7}{'recall':>9}{'ms/q':>8}{'rerank recall':>15}{'ms/q':>8}")
+    for nprobe in nprobes:
+        row = [f"{nprobe:>7}"]
+        for fetch_vectors in (None, fetch):
+            start = time.perf_counter()
+            hits = index.search(queries, k=k, nprobe=nprobe, fetch_vectors=fetch_vectors)
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = np.mean([len({i for i, _ in h} & set(t)) / k for h, t in zip(hits, truth)])
+            row.append(f"{recall:>{9 if fetch_vectors is None else 15}.3f}{ms:>8.2f}")
+        print("".join(row))
+
+
+if __name__ == "__main__":
+    import chromadb
+
+    parser = argparse.ArgumentParser(description="Build or evaluate an IVF-PQ index for a Chroma collection.")
+    parser.add_argument("command", choices=["build", "eval"])
+    parser.add_argument("db_path")
+    parser.add_argument("collection")
+    parser.add_argument("--index", default=None, help="Index file (default: <db_path>/<collection>.ivfpq.npz)")
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--m", type=int, default=48)
+    parser.add_argument("--sample-size", type=int, default=50000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    collection = chromadb.PersistentClient(path=args.db_path).get_collection(args.collection)
+    index_path = args.index or f"{args.db_path}/{args.collection}.ivfpq.npz"
+    if args.command == "build":
+        index = build_from_collection(collection, args.nlist, args.m, args.sample_size)
+        index.save(index_path)
+        print(f"Saved IVF-PQ index for {len(index.ids)} vectors to {index_path}")
+    else:
+        recall_report(IVFPQIndex.load(index_path), collection, k=args.k, nprobes=args.nprobe)
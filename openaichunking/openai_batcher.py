@@ -0,0 +1,100 @@
+import logging
+import time
+import openai
+from tenacity import Retrying, stop_after_attempt, wait_exponential
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate
+    tiktoken = None
+
+
+class BatchEmbedder:
+    """
+    Pack many chunks into each OpenAI embedding request.
+
+    Batches are cut when either the item budget or the token budget would be
+    exceeded. Each batch is retried on its own, so a transient failure does not
+    resend chunks that were already embedded. Point `api_base` at a local stub
+    server to exercise the batching without calling OpenAI.
+    """
+    def __init__(self, model="text-embedding-ada-002", max_batch_items=512,
+                 max_batch_tokens=50000, max_attempts=3, api_base=None, api_key=None):
+        self.model = model
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_attempts = max_attempts
+        self.api_base = api_base
+        self.api_key = api_key
+        self.batch_stats = []
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(self, text):
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return max(1, len(text) // 4)
+
+    def make_batches(self, texts):
+        """Yield lists of (index, text, tokens) that fit the batch budgets."""
+        batch, batch_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = self.count_tokens(text)
+            if batch and (len(batch) >= self.max_batch_items or batch_tokens + tokens > self.max_batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append((i, text, tokens))
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _request(self, inputs):
+        kwargs = {"input": inputs, "model": self.model}
+        if self.api_base:
+            kwargs["api_base"] = self.api_base
+        if self.api_key:
+            kwargs["api_key"] = self.api_key
+        response = openai.Embedding.create(**kwargs)
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    def embed_batch(self, batch):
+        """Embed one batch with retries; returns vectors in batch order."""
+        inputs = [text for _, text, _ in batch]
+        attempts = 0
+        start = time.perf_counter()
+        for attempt in Retrying(stop=stop_after_attempt(self.max_attempts),
+                                wait=wait_exponential(multiplier=1, max=20), reraise=True):
+            with attempt:
+                attempts += 1
+                vectors = self._request(inputs)
+        elapsed = time.perf_counter() - start
+        self.batch_stats.append({
+            "items": len(batch),
+            "tokens": sum(tokens for _, _, tokens in batch),
+            "attempts": attempts,
+            "seconds": elapsed,
+        })
+        logging.info(f"Embedded batch of {len(batch)} chunks in {elapsed:.3f}s ({attempts} attempt(s)).")
+        return vectors
+
+    def embed(self, texts):
+        """
+        Embed texts, returning one vector per input in input order.
+
+        Slots of a batch that still fails after all retries are left as None.
+        """
+        embeddings = [None] * len(texts)
+        for batch in self.make_batches(texts):
+            try:
+                vectors = self.embed_batch(batch)
+            except Exception as e:
+                logging.error(f"Embedding batch of {len(batch)} chunks failed: {e}")
+                continue
+            for (i, _, _), vector in zip(batch, vectors):
+                embeddings[i] = vector
+        return embeddings
@@ -1,3 +1,5 @@
+import json
+import urllib.request
 import chromadb
 import openai
 from dotenv import load_dotenv
@@ -12,26 +14,51 @@ if not OPENAI_API_KEY:
 
 openai.api_key = OPENAI_API_KEY
 
-def query_chroma(collection_name, query_text, db_path="Open_db"):
+# Clients are reused across calls so loops over query_chroma stay warm
+_clients = {}
+
+def get_client(db_path):
+    if db_path not in _clients:
+        _clients[db_path] = chromadb.PersistentClient(path=db_path)
+    return _clients[db_path]
+
+def query_service(service_url, collection_name, queries, n_results=3):
+    """
+    Send a batch of queries to a running query_service.py daemon.
+    """
+    payload = json.dumps({"collection": collection_name, "queries": queries, "n_results": n_results})
+    request = urllib.request.Request(
+        f"{service_url.rstrip('/')}/query",
+        data=payload.encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def query_chroma(collection_name, query_text, db_path="Open_db", service_url=None):
     """
     Query ChromaDB for documents similar to the provided query text.
+    If `service_url` is given, the warm query daemon answers instead.
     """
-    client = chromadb.PersistentClient(path=db_path)
-    collection = client.get_collection(collection_name)
+    if service_url:
+        results = query_service(service_url, collection_name, [query_text], n_results=3)
+    else:
+        client = get_client(db_path)
+        collection = client.get_collection(collection_name)
 
-    # Generate embedding for the query text
-    response = openai.Embedding.create(
-        input=query_text,
-        model="text-embedding-ada-002"
-    )
-    query_embedding = response['data'][0]['embedding']
+        # Generate embedding for the query text
+        response = openai.Embedding.create(
+            input=query_text,
+            model="text-embedding-ada-002"
+        )
+        query_embedding = response['data'][0]['embedding']
 
-    # Query the collection
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=3,  # Return top 3 results
-        include=["documents", "metadatas", "distances"]  # Valid fields only
-    )
+        # Query the collection
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=3,  # Return top 3 results
+            include=["documents", "metadatas", "distances"]  # Valid fields only
+        )
 
     print("Query Results:")
     for i, doc in enumerate(results["documents"]):
@@ -0,0 +1,162 @@
+"""
+Long-running query daemon for the OpenAI-embedded Chroma store.
+
+Keeps the Chroma client, opened collections and the embedding model warm so
+each request only pays for embedding and the vector search. Queries arrive in
+batches and are embedded with a single OpenAI request; repeated queries are
+answered from the embedding cache.
+
+    python query_service.py --db 2newopen_db --port 8766
+    curl -X POST localhost:8766/query -d '{"collection": "growth", "queries": ["..."], "n_results": 3}'
+    curl -X POST localhost:8766/search -d '{"queries": ["..."], "top_k": 5, "pattern": "*policy*"}'
+"""
+import argparse
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import chromadb
+import common_path  # puts the shared modules in common/ on sys.path
+from corpus_search import CorpusSearcher
+import openai
+from dotenv import load_dotenv
+from openai_batcher import BatchEmbedder
+from embedding_cache import EmbeddingCache, cached_embed
+
+
+class QueryService:
+    """Warm Chroma client, collection handles and query encoder."""
+    def __init__(self, db_path="2newopen_db", embed_fn=None):
+        self.client = chromadb.PersistentClient(path=db_path)
+        self.embed_fn = embed_fn or openai_query_embedder()
+        self._collections = {}
+        self._lock = threading.Lock()
+        self.searcher = CorpusSearcher(self.client, self.embed_fn)
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = self.client.get_collection(name)
+            return self._collections[name]
+
+    def _search(self, collection_name, embeddings, n_results):
+        return self.collection(collection_name).query(
+            query_embeddings=embeddings,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+        )
+
+    def query(self, collection_name, queries, n_results=3):
+        """Answer a batch of queries against one collection."""
+        start = time.perf_counter()
+        embeddings = [list(map(float, e)) for e in self.embed_fn(queries)]
+        embedded = time.perf_counter()
+        try:
+            results = self._search(collection_name, embeddings, n_results)
+        except Exception:
+            # The collection may have been recreated by an ingester; reopen once
+            with self._lock:
+                self._collections.pop(collection_name, None)
+            results = self._search(collection_name, embeddings, n_results)
+        done = time.perf_counter()
+        return {
+            "ids": results["ids"],
+            "documents": results["documents"],
+            "metadatas": results["metadatas"],
+            "distances": results["distances"],
+            "timings": {"embed_ms": (embedded - start) * 1000, "search_ms": (done - embedded) * 1000},
+        }
+
+
+def openai_query_embedder(model="text-embedding-ada-002", cache_path="embedding_cache.sqlite"):
+    """Batch query embedding through the shared embedding cache."""
+    embedder = BatchEmbedder(model=model)
+    cache = EmbeddingCache(cache_path)
+    return lambda queries: cached_embed(cache, model, queries, embedder.embed)
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    def address_string(self):
+        # Unix socket peers have no host/port
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path not in ("/query", "/search"):
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            queries = request["queries"]
+            if isinstance(queries, str):
+                queries = [queries]
+            service = self.server.service
+            if self.path == "/query":
+                result = service.query(request["collection"], queries, int(request.get("n_results", 3)))
+            else:
+                result = service.searcher.search_batch(
+                    queries,
+                    top_k=int(request.get("top_k", 5)),
+                    collections=request.get("collections"),
+                    pattern=request.get("pattern"),
+                )
+            self._send(200, result)
+        except Exception as e:
+            logging.error(f"Query request failed: {e}")
+            self._send(400, {"error": str(e)})
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def serve(service, host="127.0.0.1", port=8765, unix_socket=None):
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, QueryRequestHandler)
+        print(f"Query service listening on unix socket {unix_socket}")
+    else:
+        server = ThreadingHTTPServer((host, port), QueryRequestHandler)
+        print(f"Query service listening on http://{host}:{port}")
+    server.service = service
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping query service...")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve warm ChromaDB queries over HTTP.")
+    parser.add_argument("--db", default="2newopen_db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--unix-socket", default=None)
+    args = parser.parse_args()
+
+    load_dotenv()
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    if not openai.api_key:
+        raise ValueError("OPENAI_API_KEY not found in .env file.")
+
+    service = QueryService(args.db)
+    serve(service, args.host, args.port, args.unix_socket)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The scripts import each other as top-level modules; run the tests the same way
+FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if FOLDER not in sys.path:
+    sys.path.insert(0, FOLDER)
+
+import common_path  # puts the shared modules in common/ on sys.path
+
+
+@pytest.fixture
+def fake_server():
+    """A fake embeddings endpoint; returns (server, api_base)."""
+    from fake_openai_server import start_fake_server
+
+    server, api_base = start_fake_server(retry_after=0.01)
+    yield server, api_base
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+from async_embedder import AsyncEmbeddingPipeline, TokenBucket, retry_after_seconds
+from fake_openai_server import fake_embedding
+from openai_batcher import BatchEmbedder
+
+
+def run_pipeline(api_base, texts, **kwargs):
+    embedder = BatchEmbedder(max_batch_items=4, api_base=api_base, api_key="sk-fake")
+    kwargs.setdefault("base_delay", 0.01)
+    kwargs.setdefault("max_delay", 0.05)
+    pipeline = AsyncEmbeddingPipeline(embedder, **kwargs)
+    stored = {}
+
+    def store(start, batch_texts, vectors):
+        for offset, (text, vector) in enumerate(zip(batch_texts, vectors)):
+            stored[start + offset] = (text, vector)
+
+    asyncio.run(pipeline.run(iter(texts), store))
+    return pipeline, stored
+
+
+def test_run_embeds_every_chunk_through_429s(fake_server):
+    server, api_base = fake_server
+    server.throttle_first = 3
+    server.fail_every = 5
+    texts = [f"chunk {i}" for i in range(30)]
+
+    pipeline, stored = run_pipeline(api_base, texts, max_attempts=10)
+
+    assert sorted(stored) == list(range(len(texts)))
+    for i, text in enumerate(texts):
+        assert stored[i] == (text, pytest.approx(fake_embedding(text)))
+    # Every 429 was retried, and each batch was stored once after its last attempt
+    assert server.throttled >= 3
+    assert pipeline.throttled == server.throttled
+    assert len(pipeline.batch_stats) == 8
+    assert sum(s["items"] for s in pipeline.batch_stats) == len(texts)
+    assert sum(s["attempts"] - 1 for s in pipeline.batch_stats) == server.throttled
+    assert server.requests == len(pipeline.batch_stats) + server.throttled
+
+
+def test_run_honors_retry_after_hint(fake_server):
+    server, api_base = fake_server
+    server.throttle_first = 1
+    server.retry_after = 0.05
+
+    start = time.perf_counter()
+    # Without the hint the retry would wait base_delay (at least 15s with jitter)
+    pipeline, stored = run_pipeline(api_base, ["a", "b"], base_delay=30.0, max_delay=30.0)
+
+    assert time.perf_counter() - start < 5
+    assert pipeline.throttled == 1
+    assert [s["attempts"] for s in pipeline.batch_stats] == [2]
+    assert all(vector is not None for _, vector in stored.values())
+
+
+def test_run_stores_none_when_attempts_run_out(fake_server):
+    server, api_base = fake_server
+    server.throttle_first = 1000
+    texts = [f"chunk {i}" for i in range(6)]
+
+    pipeline, stored = run_pipeline(api_base, texts, max_attempts=2)
+
+    assert sorted(stored) == list(range(len(texts)))
+    assert all(vector is None for _, vector in stored.values())
+    assert pipeline.batch_stats == []
+    # The final 429 of each batch is raised, not retried
+    assert server.requests == 4
+    assert pipeline.throttled == 2
+
+
+def test_token_bucket_spends_capacity_then_waits_for_refill():
+    async def scenario():
+        bucket = TokenBucket(rate_per_minute=600, capacity=5)  # 10 tokens per second
+        start = time.perf_counter()
+        await bucket.acquire(5)
+        burst = time.perf_counter() - start
+        await bucket.acquire(2)
+        return burst, time.perf_counter() - start
+
+    burst, total = asyncio.run(scenario())
+
+    assert burst < 0.05
+    assert 0.15 <= total < 1.0
+
+
+def test_token_bucket_caps_request_at_capacity():
+    async def scenario():
+        bucket = TokenBucket(rate_per_minute=60, capacity=3)
+        start = time.perf_counter()
+        # More than the bucket can ever hold; takes the whole bucket instead of waiting forever
+        await bucket.acquire(100)
+        return time.perf_counter() - start, bucket.tokens
+
+    elapsed, left = asyncio.run(scenario())
+
+    assert elapsed < 0.05
+    assert left < 0.1
+
+
+class HeaderError(Exception):
+    def __init__(self, headers):
+        super().__init__("error")
+        self.headers = headers
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "250"}, 0.25),
+    ({"retry-after": "2"}, 2.0),
+    ({"retry-after-ms": "100", "retry-after": "7"}, 0.1),
+    ({"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"}, None),
+    ({}, None),
+    (None, None),
+])
+def test_retry_after_seconds(headers, expected):
+    assert retry_after_seconds(HeaderError(headers)) == expected
+
+
+def test_retry_after_seconds_without_headers_attribute():
+    assert retry_after_seconds(ValueError("boom")) is None
+
+
+def test_retry_after_seconds_reads_fake_server_429(fake_server):
+    server, api_base = fake_server
+    server.throttle_first = 1
+    server.retry_after = 0.25
+
+    with pytest.raises(openai.error.RateLimitError) as excinfo:
+        openai.Embedding.create(input=["a"], model="text-embedding-ada-002",
+                                api_base=api_base, api_key="sk-fake")
+
+    assert retry_after_seconds(excinfo.value) == pytest.approx(0.25)
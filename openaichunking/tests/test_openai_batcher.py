@@ -0,0 +1,90 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("tenacity")
+
+from fake_openai_server import fake_embedding
+from openai_batcher import BatchEmbedder
+
+
+def batch_sizes(embedder, texts):
+    return [len(batch) for batch in embedder.make_batches(texts)]
+
+
+def test_embed_returns_vectors_in_input_order(fake_server):
+    server, api_base = fake_server
+    embedder = BatchEmbedder(max_batch_items=4, api_base=api_base, api_key="sk-fake")
+    texts = [f"chunk {i}" for i in range(10)]
+
+    vectors = embedder.embed(texts)
+
+    # The fake server answers each batch in reverse order; indices put it back
+    assert vectors == [pytest.approx(fake_embedding(text)) for text in texts]
+    assert server.received == [texts[0:4], texts[4:8], texts[8:10]]
+
+
+def test_batches_are_cut_at_item_budget(fake_server):
+    server, api_base = fake_server
+    embedder = BatchEmbedder(max_batch_items=3, api_base=api_base, api_key="sk-fake")
+    texts = [f"chunk {i}" for i in range(7)]
+
+    assert batch_sizes(embedder, texts) == [3, 3, 1]
+    embedder.embed(texts)
+    assert server.requests == 3
+    assert [s["items"] for s in embedder.batch_stats] == [3, 3, 1]
+
+
+def test_batches_are_cut_at_token_budget(fake_server):
+    server, api_base = fake_server
+    embedder = BatchEmbedder(max_batch_items=100, max_batch_tokens=100,
+                             api_base=api_base, api_key="sk-fake")
+    texts = ["word " * n for n in (40, 40, 40, 10, 200, 5)]
+    tokens = [embedder.count_tokens(text) for text in texts]
+
+    batches = list(embedder.make_batches(texts))
+
+    # Greedy packing: a batch closes when the next chunk would overflow it
+    expected, current = [], []
+    for i, count in enumerate(tokens):
+        if current and sum(tokens[j] for j in current) + count > embedder.max_batch_tokens:
+            expected.append(current)
+            current = []
+        current.append(i)
+    expected.append(current)
+    assert [[i for i, _, _ in batch] for batch in batches] == expected
+    assert len(expected) > 1
+    for batch in batches:
+        # Only a single oversized chunk may exceed the budget, alone in its batch
+        assert len(batch) == 1 or sum(t for _, _, t in batch) <= embedder.max_batch_tokens
+
+    embedder.embed(texts)
+    assert server.requests == len(batches)
+    assert [s["tokens"] for s in embedder.batch_stats] == [sum(t for _, _, t in b) for b in batches]
+
+
+def test_only_the_failed_batch_is_retried(fake_server):
+    server, api_base = fake_server
+    server.fail_every = 3  # the first attempt of the third batch gets a 429
+    embedder = BatchEmbedder(max_batch_items=2, api_base=api_base, api_key="sk-fake")
+    texts = [f"chunk {i}" for i in range(6)]
+
+    vectors = embedder.embed(texts)
+
+    assert vectors == [pytest.approx(fake_embedding(text)) for text in texts]
+    assert [s["attempts"] for s in embedder.batch_stats] == [1, 1, 2]
+    assert server.throttled == 1
+    assert server.requests == len(embedder.batch_stats) + server.throttled
+    assert server.received == [texts[0:2], texts[2:4], texts[4:6], texts[4:6]]
+
+
+def test_batch_failing_every_attempt_leaves_none(fake_server):
+    server, api_base = fake_server
+    server.throttle_first = 1
+    embedder = BatchEmbedder(max_batch_items=2, max_attempts=1, api_base=api_base, api_key="sk-fake")
+    texts = [f"chunk {i}" for i in range(4)]
+
+    vectors = embedder.embed(texts)
+
+    assert vectors[:2] == [None, None]
+    assert vectors[2:] == [pytest.approx(fake_embedding(text)) for text in texts[2:]]
+    assert len(embedder.batch_stats) == 1